@@ -1,13 +1,14 @@
 # coding=utf-8
 
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
 from Cython.Build import cythonize
+import pysam
 
 with open('README.md') as f:
     readme = f.read()
 
-# 使用 Cython 构建所有 .pyx 文件
-cython_extensions = cythonize("src/cuteSV/*.pyx")
+# 使用 Cython 构建所有 .pyx 文件；read_sigs 直接读取 pysam 的 bam1_t，需要 htslib 头文件
+cython_extensions = cythonize([Extension("cuteSV.*", ["src/cuteSV/*.pyx"], include_dirs=pysam.get_include())])
 
 setup(
     name = "cuteSV-OL",
@@ -19,9 +20,6 @@ setup(
     license = "MIT",
     packages = find_packages("src"),
     package_dir = {"": "src"},
-    package_data={
-        "online": ["bin/pandepth"],  # 打包C工具
-    },
     data_files = [("", ["LICENSE"])],
     entry_points={
         'console_scripts': [
@@ -9,10 +9,12 @@
 '''
 
 import pysam
-import cigar
 from cuteSV.cuteSV_Description import parseArgs
-from cuteSV.prove_func import pre_mal, __dealloc__
-from multiprocessing import Pool,Manager,Queue, current_process
+from cuteSV.prove_func import __dealloc__
+from cuteSV.read_sigs import parse_signatures
+from multiprocessing import Pool,Manager,Queue, current_process, active_children
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from cuteSV.CommandRunner import *
 # from resolution_type import * 
 from cuteSV.cuteSV_resolveINV import run_inv
@@ -21,6 +23,12 @@ from cuteSV.cuteSV_resolveINDEL import run_ins, run_del
 from cuteSV.cuteSV_resolveDUP import run_dup
 from cuteSV.cuteSV_genotype import generate_output, generate_pvcf, load_valuable_chr, load_bed, Generation_VCF_header
 from cuteSV.cuteSV_forcecalling import force_calling_chrom
+from cuteSV.cuteSV_store import update_store, load_sigs
+from cuteSV.cuteSV_columns import LAYOUTS, encode, pack
+from cuteSV.cuteSV_readnames import update_read_names, ReadNames
+from cuteSV.cuteSV_cache import run_cached
+from cuteSV.cuteSV_svid import load_stable_ids, save_stable_ids, assign_stable_ids
+from cuteSV.cuteSV_checkpoint import WINDOW_ATTEMPTS, WINDOW_TIMEOUT, load_window_manifest, save_window_manifest, commit_window, rollback_window, recover_windows, report_poison
 import os
 import shutil
 import argparse
@@ -31,647 +39,6 @@ import gc
 import pickle
 import atexit
 
-dic_starnd = {1: '+', 2: '-'}
-RefChangeOp=set([0,2,7,8])
-signal = {1 << 2: 0, \
-            1 >> 1: 1, \
-            1 << 4: 2, \
-            1 << 11: 3, \
-            1 << 4 | 1 << 11: 4}
-'''
-    1 >> 1 means normal_foward read
-    1 << 2 means unmapped read
-    1 << 4 means reverse_complement read
-    1 << 11 means supplementary alignment read
-    1 << 4 | 1 << 11 means supplementary alignment with reverse_complement read
-'''
-def detect_flag(Flag):
-    back_sig = signal[Flag] if Flag in signal else 0
-    return back_sig
-
-def analysis_inv(ele_1, ele_2, read_name, candidate, SV_size):
-    if ele_1[5] == '+':
-        # +-
-        if ele_1[3] - ele_2[3] >= SV_size:
-            if ele_2[0] + 0.5 * (ele_1[3] - ele_2[3]) >= ele_1[1]:
-                candidate.append(("++", 
-                                    ele_2[3], 
-                                    ele_1[3], 
-                                    read_name,
-                                    "INV",
-                                    ele_1[4]))
-                # head-to-head
-                # 5'->5'
-        if ele_2[3] - ele_1[3] >= SV_size:
-            if ele_2[0] + 0.5 * (ele_2[3] - ele_1[3]) >= ele_1[1]:
-                candidate.append(("++", 
-                                    ele_1[3], 
-                                    ele_2[3], 
-                                    read_name,
-                                    "INV",
-                                    ele_1[4]))
-                # head-to-head
-                # 5'->5'
-    else:
-        # -+
-        if ele_2[2] - ele_1[2] >= SV_size:
-            if ele_2[0] + 0.5 * (ele_2[2] - ele_1[2]) >= ele_1[1]:
-                candidate.append(("--", 
-                                    ele_1[2], 
-                                    ele_2[2], 
-                                    read_name,
-                                    "INV",
-                                    ele_1[4]))
-                # tail-to-tail
-                # 3'->3'
-        if ele_1[2] - ele_2[2] >= SV_size:
-            if ele_2[0] + 0.5 * (ele_1[2] - ele_2[2]) >= ele_1[1]:
-                candidate.append(("--", 
-                                    ele_2[2], 
-                                    ele_1[2], 
-                                    read_name,
-                                    "INV",
-                                    ele_1[4]))
-                # tail-to-tail
-                # 3'->3'
-
-
-def analysis_bnd(ele_1, ele_2, read_name, candidate):
-    '''
-    *********Description*********
-    *	TYPE A:		N[chr:pos[	*
-    *	TYPE B:		N]chr:pos]	*
-    *	TYPE C:		[chr:pos[N	*
-    *	TYPE D:		]chr:pos]N	*
-    *****************************
-    '''
-    if ele_2[0] - ele_1[1] <= 100:
-        if ele_1[5] == '+':
-            if ele_2[5] == '+':
-                # +&+
-                if ele_1[4] < ele_2[4]:
-                    candidate.append(('A', 
-                                        ele_1[3], 
-                                        ele_2[4], 
-                                        ele_2[2], 
-                                        read_name,
-                                        "TRA",
-                                        ele_1[4]))
-                    # N[chr:pos[
-                else:
-                    candidate.append(('D', 
-                                        ele_2[2], 
-                                        ele_1[4], 
-                                        ele_1[3], 
-                                        read_name,
-                                        "TRA",
-                                        ele_2[4]))
-                    # ]chr:pos]N
-            else:
-                # +&-
-                if ele_1[4] < ele_2[4]:
-                    candidate.append(('B', 
-                                        ele_1[3], 
-                                        ele_2[4], 
-                                        ele_2[3], 
-                                        read_name,
-                                        "TRA",
-                                        ele_1[4]))
-                    # N]chr:pos]
-                else:
-                    candidate.append(('B', 
-                                        ele_2[3], 
-                                        ele_1[4], 
-                                        ele_1[3], 
-                                        read_name,
-                                        "TRA",
-                                        ele_2[4]))
-                    # N]chr:pos]
-        else:
-            if ele_2[5] == '+':
-                # -&+
-                if ele_1[4] < ele_2[4]:
-                    candidate.append(('C', 
-                                        ele_1[2], 
-                                        ele_2[4], 
-                                        ele_2[2], 
-                                        read_name,
-                                        "TRA",
-                                        ele_1[4]))
-                    # [chr:pos[N
-                else:
-                    candidate.append(('C', 
-                                        ele_2[2], 
-                                        ele_1[4], 
-                                        ele_1[2], 
-                                        read_name,
-                                        "TRA",
-                                        ele_2[4]))
-                    # [chr:pos[N
-            else:
-                # -&-
-                if ele_1[4] < ele_2[4]:
-                    candidate.append(('D', 
-                                        ele_1[2], 
-                                        ele_2[4], 
-                                        ele_2[3], 
-                                        read_name,
-                                        "TRA",
-                                        ele_1[4]))
-                    # ]chr:pos]N
-                else:
-                    candidate.append(('A', 
-                                        ele_2[3], 
-                                        ele_1[4], 
-                                        ele_1[2], 
-                                        read_name,
-                                        "TRA",
-                                        ele_2[4]))
-                    # N[chr:pos[
-
-def analysis_split_read(split_read, SV_size, RLength, read_name, candidate, MaxSize, query):
-    '''
-    read_start	read_end	ref_start	ref_end	chr	strand
-    #0			#1			#2			#3		#4	#5
-    '''
-    SP_list = sorted(split_read, key = lambda x:x[0])
-    # print(read_name)
-    # for i in SP_list:
-    #     print(i)
-
-    # detect INS involoved in a translocation
-    trigger_INS_TRA = 0	
-
-    # Store Strands of INV
-
-    if len(SP_list) == 2:
-        ele_1 = SP_list[0]
-        ele_2 = SP_list[1]
-        if ele_1[4] == ele_2[4]:
-            if ele_1[5] != ele_2[5]:
-                analysis_inv(ele_1, 
-                                ele_2, 
-                                read_name, 
-                                candidate["INV"],
-                                SV_size)
-
-            else:
-                # dup & ins & del 
-                a = 0
-                if ele_1[5] == '-':
-                    ele_1 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
-                    ele_2 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
-                    query = query[::-1]
-
-                if ele_1[3] - ele_2[2] >= SV_size:
-                    # if ele_2[1] - ele_1[1] >= ele_1[3] - ele_2[2]:
-                    if ele_2[0] - ele_1[1] >= ele_1[3] - ele_2[2]:
-                        candidate["INS"].append(((ele_1[3]+ele_2[2])/2, 
-                                        ele_2[0]+ele_1[3]-ele_2[2]-ele_1[1], 
-                                        read_name,
-                                        str(query[ele_1[1]+int((ele_1[3]-ele_2[2])/2):ele_2[0]-int((ele_1[3]-ele_2[2])/2)]),
-                                        "INS",
-                                        ele_2[4]))
-                    else:
-                        candidate["DUP"].append((ele_2[2], 
-                                            ele_1[3], 
-                                            read_name,
-                                            "DUP",
-                                            ele_2[4]))
-
-                delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
-                if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
-                    if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                        candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
-                                            delta_length, 
-                                            read_name,
-                                            str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
-                                            "INS",
-                                            ele_2[4]))
-                delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
-                if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
-                    if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                        candidate["DEL"].append((ele_1[3], 
-                                            delta_length, 
-                                            read_name,
-                                            "DEL",
-                                            ele_2[4]))
-        else:
-            trigger_INS_TRA = 1
-            analysis_bnd(ele_1, ele_2, read_name, candidate["TRA"])
-
-    else:
-        # over three splits
-        for a in range(len(SP_list[1:-1])):
-            ele_1 = SP_list[a]
-            ele_2 = SP_list[a+1]
-            ele_3 = SP_list[a+2]
-
-            if ele_1[4] == ele_2[4]:
-                if ele_2[4] == ele_3[4]:
-                    if ele_1[5] == ele_3[5] and ele_1[5] != ele_2[5]:
-                        if ele_2[5] == '-':
-                            # +-+
-                            if ele_2[0] + 0.5 * (ele_3[2] - ele_1[3]) >= ele_1[1] and ele_3[0] + 0.5 * (ele_3[2] - ele_1[3]) >= ele_2[1]:
-                                # No overlaps in split reads
-
-                                if ele_2[2] >= ele_1[3] and ele_3[2] >= ele_2[3]:
-                                    candidate["INV"].append(("++", 
-                                                        ele_1[3], 
-                                                        ele_2[3], 
-                                                        read_name,
-                                                        "INV",
-                                                        ele_1[4]))
-                                    # head-to-head
-                                    # 5'->5'
-                                    candidate["INV"].append(("--", 
-                                                        ele_2[2], 
-                                                        ele_3[2], 
-                                                        read_name,
-                                                        "INV",
-                                                        ele_1[4]))
-                                    # tail-to-tail
-                                    # 3'->3'
-                        else:
-                            # -+-
-                            if ele_1[1] <= ele_2[0] + 0.5 * (ele_1[2] - ele_3[3]) and ele_3[0] + 0.5 * (ele_1[2] - ele_3[3]) >= ele_2[1]:
-                                # No overlaps in split reads
-
-                                if ele_2[2] - ele_3[3] >= -50 and ele_1[2] - ele_2[3] >= -50:
-                                    candidate["INV"].append(("++", 
-                                                        ele_3[3], 
-                                                        ele_2[3], 
-                                                        read_name,
-                                                        "INV",
-                                                        ele_1[4]))
-                                    # head-to-head
-                                    # 5'->5'
-                                    candidate["INV"].append(("--", 
-                                                        ele_2[2], 
-                                                        ele_1[2], 
-                                                        read_name,
-                                                        "INV",
-                                                        ele_1[4]))
-                                    # tail-to-tail
-                                    # 3'->3'	
-
-                    if len(SP_list) - 3 == a:
-                        if ele_1[5] != ele_3[5]:
-                            if ele_2[5] == ele_1[5]:
-                                # ++-/--+
-                                analysis_inv(ele_2, 
-                                                ele_3, 
-                                                read_name, 
-                                                candidate["INV"], 
-                                                SV_size)
-                            else:
-                                # +--/-++
-                                analysis_inv(ele_1, 
-                                                ele_2, 
-                                                read_name, 
-                                                candidate["INV"], 
-                                                SV_size)
-
-                    if ele_1[5] == ele_3[5] and ele_1[5] == ele_2[5]:
-                        # dup & ins & del 
-                        if ele_1[5] == '-':
-                            ele_1 = [RLength-SP_list[a+2][1], RLength-SP_list[a+2][0]]+SP_list[a+2][2:]
-                            ele_2 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
-                            ele_3 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
-                            query = query[::-1]
-
-                        if ele_2[3] - ele_3[2] >= SV_size and ele_2[2] < ele_3[3]:
-                            candidate["DUP"].append((ele_3[2], 
-                                                ele_2[3], 
-                                                read_name,
-                                                "DUP",
-                                                ele_2[4]))
-
-                        if a == 0:
-                            if ele_1[3] - ele_2[2] >= SV_size:
-                                candidate["DUP"].append((ele_2[2], 
-                                                    ele_1[3], 
-                                                    read_name,
-                                                    "DUP",
-                                                    ele_2[4]))
-
-                        delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
-                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
-                            if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                                if ele_3[2] >= ele_2[3]:
-                                    candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
-                                                        delta_length, 
-                                                        read_name,
-                                                        str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
-                                                        "INS",
-                                                        ele_2[4]))
-                        delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
-                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
-                            if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                                if ele_3[2] >= ele_2[3]:
-                                    candidate["DEL"].append((ele_1[3], 
-                                                        delta_length, 
-                                                        read_name,
-                                                        "DEL",
-                                                        ele_2[4]))
-                        
-                        if len(SP_list) - 3 == a:
-                            ele_1 = ele_2
-                            ele_2 = ele_3
-
-                            delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
-                            if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
-                                if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                                    candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
-                                                        delta_length, 
-                                                        read_name,
-                                                        str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
-                                                        "INS",
-                                                        ele_2[4]))
-
-                            delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
-                            if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3] >= SV_size:
-                                if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                                    candidate["DEL"].append((ele_1[3], 
-                                                        delta_length, 
-                                                        read_name,
-                                                        "DEL",
-                                                        ele_2[4]))
-
-                    if len(SP_list) - 3 == a and ele_1[5] != ele_2[5] and ele_2[5] == ele_3[5]:
-                        ele_1 = ele_2
-                        ele_2 = ele_3
-                        ele_3 = None
-                    if ele_3 == None or (ele_1[5] == ele_2[5] and ele_2[5] != ele_3[5]):
-                        if ele_1[5] == '-':
-                            ele_1 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
-                            ele_2 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
-                            query = query[::-1]
-                        delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
-                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
-                            if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                                candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
-                                                    delta_length, 
-                                                    read_name,
-                                                    str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
-                                                    "INS",
-                                                    ele_2[4]))
-
-                        delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
-                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
-                            if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
-                                candidate["DEL"].append((ele_1[3], 
-                                                    delta_length, 
-                                                    read_name,
-                                                    "DEL",
-                                                    ele_2[4]))
-
-            else:
-                trigger_INS_TRA = 1
-                analysis_bnd(ele_1, ele_2, read_name, candidate["TRA"])
-
-                if len(SP_list) - 3 == a:
-                    if ele_2[4] != ele_3[4]:
-                        analysis_bnd(ele_2, ele_3, read_name, candidate["TRA"])
-
-    if len(SP_list) >= 3 and trigger_INS_TRA == 1:
-        if SP_list[0][4] == SP_list[-1][4]:
-            if SP_list[0][5] != SP_list[-1][5]:
-                pass
-            else:
-                if SP_list[0][5] == '+':
-                    ele_1 = SP_list[0]
-                    ele_2 = SP_list[-1]
-                else:
-                    ele_1 = [RLength-SP_list[-1][1], RLength-SP_list[-1][0]]+SP_list[-1][2:]
-                    ele_2 = [RLength-SP_list[0][1],RLength-SP_list[0][0]]+SP_list[0][2:]
-                    query = query[::-1]
-                dis_ref = ele_2[2] - ele_1[3]
-                dis_read = ele_2[0] - ele_1[1]
-                if dis_ref < 100 and dis_read - dis_ref >= SV_size and (dis_read - dis_ref <= MaxSize or MaxSize == -1):
-                    candidate["INS"].append((min(ele_2[2], ele_1[3]), 
-                                        dis_read - dis_ref, 
-                                        read_name,
-                                        str(query[ele_1[1]+int(dis_ref/2):ele_2[0]-int(dis_ref/2)]),
-                                        "INS",
-                                        ele_2[4]))	
-
-                if dis_ref <= -SV_size:
-                    candidate["DUP"].append((ele_2[2], 
-                                        ele_1[3], 
-                                        read_name,
-                                        "DUP",
-                                        ele_2[4]))
-
-def acquire_clip_pos(deal_cigar):
-    seq = list(cigar.Cigar(deal_cigar).items())
-    if seq[0][1] == 'S':
-        first_pos = seq[0][0]
-    else:
-        first_pos = 0
-    if seq[-1][1] == 'S':
-        last_pos = seq[-1][0]
-    else:
-        last_pos = 0
-
-    bias = 0
-    for i in seq:
-        if i[1] == 'M' or i[1] == 'D' or i[1] == '=' or i[1] == 'X':
-            bias += i[0]
-    return [first_pos, last_pos, bias]
-
-def organize_split_signal(primary_info, Supplementary_info, total_L, SV_size, 
-    min_mapq, max_split_parts, read_name, candidate, MaxSize, query):
-    split_read = list()
-    if len(primary_info) > 0:
-        split_read.append(primary_info)
-        min_mapq = 0
-    for i in Supplementary_info:
-        seq = i.split(',')
-        local_chr = seq[0]
-        local_start = int(seq[1])
-        local_cigar = seq[3]
-        local_strand = seq[2]
-        local_mapq = int(seq[4])
-        if local_mapq >= min_mapq:
-            local_set = acquire_clip_pos(local_cigar)
-            if local_strand == '+':
-                 split_read.append([local_set[0], total_L-local_set[1], local_start, 
-                     local_start+local_set[2], local_chr, local_strand])
-            else:
-                try:
-                    split_read.append([local_set[1], total_L-local_set[0], local_start, 
-                        local_start+local_set[2], local_chr, local_strand])
-                except:
-                    pass
-    if len(split_read) <= max_split_parts or max_split_parts == -1:
-        analysis_split_read(split_read, SV_size, total_L, read_name, candidate, MaxSize, query)
-
-def generate_combine_sigs(sigs, Chr_name, read_name, svtype, candidate, merge_dis):
-    if len(sigs) == 0:
-        pass
-    elif len(sigs) == 1:
-        if svtype == 'INS':
-            candidate.append((sigs[0][0], 
-                                            sigs[0][1], 
-                                            read_name,
-                                            sigs[0][2],
-                                            svtype,
-                                            Chr_name))
-        else:
-            candidate.append((sigs[0][0], 
-                                            sigs[0][1], 
-                                            read_name,
-                                            svtype,
-                                            Chr_name))
-    else:
-        temp_sig = sigs[0]
-        if svtype == "INS":
-            temp_sig += [sigs[0][0]]
-            for i in sigs[1:]:
-                if i[0] - temp_sig[3] <= merge_dis:
-                    temp_sig[1] += i[1]
-                    temp_sig[2] += i[2]
-                    temp_sig[3] = i[0]
-                else:
-                    candidate.append((temp_sig[0], 
-                                                        temp_sig[1], 
-                                                        read_name,
-                                                        temp_sig[2],
-                                                        svtype,
-                                                        Chr_name))
-                    temp_sig = i
-                    temp_sig.append(i[0])
-            candidate.append((temp_sig[0], 
-                                                temp_sig[1], 
-                                                read_name,
-                                                temp_sig[2],
-                                                svtype,
-                                                Chr_name))
-        else:
-            temp_sig += [sum(sigs[0])]
-            # merge_dis_bias = max([i[1]] for i in sigs)
-            for i in sigs[1:]:
-                if i[0] - temp_sig[2] <= merge_dis:
-                    temp_sig[1] += i[1]
-                    temp_sig[2] = sum(i)
-                else: 
-                    candidate.append((temp_sig[0], 
-                                                        temp_sig[1], 
-                                                        read_name,
-                                                        svtype,
-                                                        Chr_name))
-                    temp_sig = i
-                    temp_sig.append(i[0])
-            candidate.append((temp_sig[0], 
-                                                temp_sig[1], 
-                                                read_name,
-                                                svtype,
-                                                Chr_name))
-
-# OPLIST=[
-#     pysam.CBACK,
-#     pysam.CDEL,
-#     pysam.CDIFF,
-#     pysam.CEQUAL,
-#     pysam.CHARD_CLIP,
-#     pysam.CINS,
-#     pysam.CMATCH,
-#     pysam.CPAD,
-#     pysam.CREF_SKIP,
-#     pysam.CSOFT_CLIP
-# ]
-# RefChangeOp=set([0,2,7,8])
-
-# #QUERY CHANGE, REF CHANGE
-# CHANGETABLE={
-#     pysam.CMATCH:     (True,True),
-#     pysam.CINS:       (True,False),
-#     pysam.CDEL:       (False,True),
-#     pysam.CREF_SKIP:  (False,True),
-#     pysam.CPAD:       (False,False),
-#     pysam.CEQUAL:     (True,True),
-#     pysam.CDIFF:      (True,True)
-# }
-
-# CHANGEOP=[CHANGETABLE[i] if i in CHANGETABLE.keys() else (False,False) for i in range(max(OPLIST)+1)]
-# REFCHANGEOP=[CHANGETABLE[i][1] if i in CHANGETABLE.keys() else False for i in range(max(OPLIST)+1)]
-# INDELOP=[(i==pysam.CDEL or i==pysam.CINS) for i in range(max(OPLIST)+1)]
-
-def parse_read(read, candidate, Chr_name, SV_size, min_mapq, max_split_parts, min_read_len, min_siglength, merge_del_threshold, merge_ins_threshold, MaxSize):
-    if read.query_length < min_read_len:
-        return []
-    Combine_sig_in_same_read_ins = list()
-    Combine_sig_in_same_read_del = list()
-
-    #new start
-    process_signal = detect_flag(read.flag)
-    if read.mapq >= min_mapq:
-        pos_start = read.reference_start # 0-based
-        pos_end = read.reference_end
-        sig_start=pos_start
-        softclip_left = 0
-        softclip_right = 0
-        hardclip_left = 0
-        hardclip_right = 0
-        # shift_ins_read = 0
-        if read.cigar[0][0] == 4:
-            softclip_left = read.cigar[0][1]
-        elif read.cigar[0][0] == 5:
-            hardclip_left = read.cigar[0][1]
-        
-        pre_mal(read,Combine_sig_in_same_read_ins,Combine_sig_in_same_read_del, sig_start, min_siglength, -hardclip_left)
-        # shift_ins_read=-hardclip_left
-        # for op, oplen in read.cigartuples:
-        #     # calculate offset of an ins sig in read
-        #     if op != 2:#might be fixed later
-        #         shift_ins_read += oplen
-        #     if oplen >= min_siglength and INDELOP[op]:
-        #         if op==2:
-        #             Combine_sig_in_same_read_del.append([sig_start, oplen])
-        #             sig_start += oplen
-        #         else:
-        #             Combine_sig_in_same_read_ins.append([sig_start, oplen,
-        #                 str(read.query_sequence[shift_ins_read-oplen:shift_ins_read])])
-        #     else:
-        #         # if op in RefChangeOp:
-        #         if REFCHANGEOP[op]:
-        #             sig_start += oplen
-
-        
-        if read.cigar[-1][0] == 4:
-            softclip_right = read.cigar[-1][1]
-        elif read.cigar[-1][0] == 5:
-            hardclip_right = read.cigar[-1][1]
-
-        if hardclip_left != 0:
-            softclip_left = hardclip_left
-        if hardclip_right != 0:
-            softclip_right = hardclip_right
-
-    # ************Combine signals in same read********************
-    generate_combine_sigs(Combine_sig_in_same_read_ins, Chr_name, read.query_name, "INS", candidate["INS"], merge_ins_threshold)
-    generate_combine_sigs(Combine_sig_in_same_read_del, Chr_name, read.query_name, "DEL", candidate["DEL"], merge_del_threshold)
-
-    if process_signal == 1 or process_signal == 2: # 0 / 16
-        Tags = read.get_tags()
-        if read.mapq >= min_mapq:
-            if process_signal == 1:
-                primary_info = [softclip_left, read.query_length-softclip_right, pos_start, 
-                pos_end, Chr_name, dic_starnd[process_signal]]
-            else:
-                primary_info = [softclip_right, read.query_length-softclip_left, pos_start, 
-                pos_end, Chr_name, dic_starnd[process_signal]]
-        else:
-            primary_info = []
-
-        for i in Tags:
-            if i[0] == 'SA':
-                Supplementary_info = i[1].split(';')[:-1]
-                organize_split_signal(primary_info, Supplementary_info, read.query_length, 
-                    SV_size, min_mapq, max_split_parts, read.query_name, candidate, MaxSize, read.query_sequence)
-    return candidate
-
 def init_reading_process(sam_path, reference_path):
     global samfile
     
@@ -687,7 +54,7 @@ def cleanup():
 SVTYPES=["DEL", "INS", "DUP", "INV", "TRA"]
 samfile=None
 def single_pipe(sam_path, min_length, min_mapq, max_split_parts, min_read_len, temp_dir, bam_name,
-                task, min_siglength, merge_del_threshold, merge_ins_threshold, MaxSize, bed_regions):
+                task, min_siglength, merge_del_threshold, merge_ins_threshold, MaxSize, bed_regions, window_id=None):
     candidate = {}
     candidate["DEL"]=list()
     candidate["INS"]=list()
@@ -696,6 +63,7 @@ def single_pipe(sam_path, min_length, min_mapq, max_split_parts, min_read_len, t
     candidate["TRA"]=list()
     reads_info_list= list()
     Chr_name = task[0]
+    aligned_bases = 0
     global samfile
 
     for read in samfile.fetch(Chr_name, task[1], task[2]):
@@ -704,6 +72,9 @@ def single_pipe(sam_path, min_length, min_mapq, max_split_parts, min_read_len, t
             continue
         pos_start = read.reference_start # 0-based
         pos_end = read.reference_end
+        if pos_start >= task[1] and not read.is_unmapped:
+            # every read is counted by the window it starts in
+            aligned_bases += pos_end - pos_start
         in_bed = False
         if bed_regions != None:
             for bed_region in bed_regions:
@@ -715,7 +86,7 @@ def single_pipe(sam_path, min_length, min_mapq, max_split_parts, min_read_len, t
         else:
             in_bed = True
         if read.reference_start >= task[1] and in_bed:
-            parse_read(read, candidate, Chr_name, min_length, min_mapq, max_split_parts, 
+            parse_signatures(read, candidate, Chr_name, min_length, min_mapq, max_split_parts, 
                                 min_read_len, min_siglength, merge_del_threshold, 
                                 merge_ins_threshold, MaxSize)
             if read.mapq >= min_mapq:
@@ -724,141 +95,286 @@ def single_pipe(sam_path, min_length, min_mapq, max_split_parts, min_read_len, t
                     is_primary = 1
                 reads_info_list.append((pos_start, pos_end, is_primary, read.query_name, Chr_name))
     pid=current_process().pid
-    for sv_type in SVTYPES:
-        with open("%ssignatures/%s%s%s.pickle"%(temp_dir,bam_name,pid,sv_type),"ab") as f:
-            pickle.dump(candidate[sv_type],f)
-    with open("%ssignatures/%s%sreads.pickle"%(temp_dir,bam_name,pid),"ab") as f:
-        pickle.dump(reads_info_list,f)
+    dump_sigs(temp_dir, bam_name, pid, candidate, reads_info_list, {Chr_name: aligned_bases})
+    if window_id != None:
+        commit_window(temp_dir, bam_name, pid, window_id)
     # logging.info("Finished %s:%d-%d."%(Chr_name, task[1], task[2]))	
     gc.collect()
     # return (candidate, reads_info_list)
     return None
 
+def dump_sigs(temp_dir, bam_name, pid, candidate, reads_info_list, coverage):
+    # one columnar segment per type is appended (cuteSV_columns)
+    for sv_type in SVTYPES + ["reads"]:
+        sigs = reads_info_list if sv_type == "reads" else candidate[sv_type]
+        if len(sigs) != 0:
+            with open("%ssignatures/%s/%s%s.cols"%(temp_dir,bam_name,pid,sv_type),"ab") as f:
+                f.write(pack(encode(sv_type, sigs)))
+    with open("%ssignatures/%s/%scoverage.pickle"%(temp_dir,bam_name,pid),"ab") as f:
+        pickle.dump(coverage,f)
+
+# Signatures of one batch live in signatures/<bam_name>/. The marker is written
+# once the batch is complete; mode 2 ignores batches without it, so a snapshot
+# can run while later batches are still being extracted.
+BATCH_COMPLETE=".complete"
+def write_contig_info(temp_dir, contigINFO):
+    # several batches may be extracted at once, never expose a half-written file
+    contigINFO_path = f"{temp_dir}contigINFO.pickle"
+    tmp_path = "%s.%d"%(contigINFO_path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        pickle.dump(contigINFO, f)
+    os.replace(tmp_path, contigINFO_path)
+
+def init_batch_dir(temp_dir, bam_name):
+    os.makedirs("%ssignatures/%s"%(temp_dir,bam_name), exist_ok=True)
+
+def mark_batch_complete(temp_dir, bam_name):
+    with open("%ssignatures/%s/%s"%(temp_dir,bam_name,BATCH_COMPLETE), "w") as f:
+        pass
+
+def list_batch_files(sigs_dir, suffix):
+    file_list=[]
+    for entry in os.scandir(sigs_dir):
+        if entry.is_dir():
+            if not os.path.exists(os.path.join(entry.path, BATCH_COMPLETE)):
+                continue
+            for file_name in os.listdir(entry.path):
+                if file_name.endswith(suffix):
+                    file_list.append(os.path.join(entry.path, file_name))
+        elif entry.name.endswith(suffix):
+            # flat layout written by older versions
+            file_list.append(entry.path)
+    return file_list
+
+def load_coverage(file_path):
+    coverage = dict()
+    with open(file_path, "rb") as f:
+        while True:
+            try:
+                part = pickle.load(f)
+            except EOFError:
+                break
+            for chrom in part:
+                coverage[chrom] = coverage.get(chrom, 0) + part[chrom]
+    return coverage
+
+def reads_coverage(file_path):
+    '''
+    Aligned reference bases per contig recomputed from a reads.pickle of the
+    flat layout. Reads below min_mapq were not kept there and are not counted.
+    '''
+    coverage = dict()
+    with open(file_path, "rb") as f:
+        while True:
+            try:
+                part = pickle.load(f)
+            except EOFError:
+                break
+            for pos_start, pos_end, is_primary, read_name, chrom in part:
+                coverage[chrom] = coverage.get(chrom, 0) + pos_end - pos_start
+    return coverage
+
+def mean_depth(temp_dir, coverage):
+    # aligned bases / reference length, the MeanDepth of pandepth
+    with open(f"{temp_dir}contigINFO.pickle", "rb") as f:
+        contigINFO = pickle.load(f)
+    genome_length = sum(length for chrom, length in contigINFO)
+    return sum(coverage.values()) / genome_length if genome_length > 0 else 0.0
+
+def batch_coverage(temp_dir, bam_name):
+    '''
+    Aligned reference bases per contig of one batch.
+    '''
+    coverage = dict()
+    batch_dir = "%ssignatures/%s/"%(temp_dir, bam_name)
+    for file_name in os.listdir(batch_dir):
+        if file_name.endswith("coverage.pickle"):
+            for chrom, bases in load_coverage(batch_dir + file_name).items():
+                coverage[chrom] = coverage.get(chrom, 0) + bases
+    return coverage
+
+def update_coverage_summary(temp_dir):
+    '''
+    Fold the completed batches not counted yet into coverage_summary.pickle,
+    the cumulative aligned bases per contig of the run, and return it.
+    '''
+    summary_path = f"{temp_dir}coverage_summary.pickle"
+    summary = {"batches": set(), "bases": dict()}
+    if os.path.exists(summary_path):
+        with open(summary_path, "rb") as f:
+            summary = pickle.load(f)
+    sigs_dir = f"{temp_dir}signatures/"
+    batch_files = list_batch_files(sigs_dir, "coverage.pickle")
+    # batches of the flat layout of older versions have no coverage file
+    batch_files += [file_path for file_path in list_batch_files(sigs_dir, "reads.pickle") if os.path.dirname(file_path) + "/" == sigs_dir]
+    new_files = [file_path for file_path in batch_files if file_path not in summary["batches"]]
+    if len(new_files) == 0:
+        return summary
+    for file_path in new_files:
+        coverage = load_coverage(file_path) if file_path.endswith("coverage.pickle") else reads_coverage(file_path)
+        for chrom, bases in coverage.items():
+            summary["bases"][chrom] = summary["bases"].get(chrom, 0) + bases
+    summary["batches"].update(new_files)
+    with open(summary_path + ".tmp", "wb") as f:
+        pickle.dump(summary, f)
+    os.replace(summary_path + ".tmp", summary_path)
+    return summary
+
+STREAM_FLUSH_READS=20000
+def stream_pipe(reads, header, min_length, min_mapq, max_split_parts, min_read_len, temp_dir, bam_name,
+                min_siglength, merge_del_threshold, merge_ins_threshold, MaxSize, bam_path=None):
+    '''
+    Mode 1 without a BAM: collect signatures from alignment records as they
+    are produced by the aligner and append them to the signature files.
+    Every record is seen exactly once, so no task window bookkeeping is needed.
+    Returns the aligned reference bases per contig.
+    '''
+    contigINFO_path = f"{temp_dir}contigINFO.pickle"
+    if not os.path.exists(contigINFO_path):
+        write_contig_info(temp_dir, [[chrom, length] for chrom, length in zip(header.references, header.lengths)])
+    init_batch_dir(temp_dir, bam_name)
+    candidate = {sv_type: list() for sv_type in SVTYPES}
+    reads_info_list = list()
+    coverage = dict()
+    pid = current_process().pid
+    bam_out = None
+    if bam_path != None:
+        bam_out = pysam.AlignmentFile("%s.unsorted"%bam_path, "wb", header=header)
+    count = 0
+    for read in reads:
+        if bam_out != None:
+            bam_out.write(read)
+        if read.is_unmapped or read.flag == 256 or read.flag == 272:
+            continue
+        Chr_name = read.reference_name
+        pos_start = read.reference_start # 0-based
+        pos_end = read.reference_end
+        coverage[Chr_name] = coverage.get(Chr_name, 0) + pos_end - pos_start
+        parse_signatures(read, candidate, Chr_name, min_length, min_mapq, max_split_parts, 
+                            min_read_len, min_siglength, merge_del_threshold, 
+                            merge_ins_threshold, MaxSize)
+        if read.mapq >= min_mapq:
+            is_primary = 0
+            if read.flag in [0, 16]:
+                is_primary = 1
+            reads_info_list.append((pos_start, pos_end, is_primary, read.query_name, Chr_name))
+        count += 1
+        if count % STREAM_FLUSH_READS == 0:
+            dump_sigs(temp_dir, bam_name, pid, candidate, reads_info_list, dict())
+            candidate = {sv_type: list() for sv_type in SVTYPES}
+            reads_info_list = list()
+    dump_sigs(temp_dir, bam_name, pid, candidate, reads_info_list, coverage)
+    if bam_out != None:
+        bam_out.close()
+        pysam.sort("-o", bam_path, "%s.unsorted"%bam_path)
+        os.remove("%s.unsorted"%bam_path)
+        pysam.index(bam_path)
+    mark_batch_complete(temp_dir, bam_name)
+    return coverage
+
 def multi_run_wrapper(args):
     # logging.info(args)
-    return single_pipe(*args)
+    try:
+        single_pipe(*args)
+    except Exception as e:
+        logging.error("Failed on %s:%d-%d: %s"%(args[7][0], args[7][1], args[7][2], e))
+        rollback_window(args[5], args[6], current_process().pid)
+        return args[-1], "%s: %s"%(type(e).__name__, e)
+    return args[-1], None
+
+def extract_windows(args, temporary_dir, Task_list, bed_regions, manifest, done, pending, workers):
+    '''
+    Extract the windows of pending with at most workers at once. When a
+    worker process dies, or a window runs past WINDOW_TIMEOUT, the pool is
+    torn down, the signature files are rolled back to their last committed
+    windows and the windows that were running are returned.
+    '''
+    pending = list(pending)
+    running = dict()
+    lost = list()
+    timed_out = list()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_reading_process, initargs=(args.input, args.reference)) as executor:
+        while len(lost) == 0 and (len(pending) != 0 or len(running) != 0):
+            while len(pending) != 0 and len(running) < workers:
+                i = pending.pop(0)
+                # attempts are saved before dispatch, a window that kills the run is counted too
+                manifest["attempts"][i] += 1
+                save_window_manifest(temporary_dir, args.bam_name, manifest)
+                paras = (args.input, 
+                            args.min_size, 
+                            args.min_mapq, 
+                            args.max_split_parts, 
+                            args.min_read_len, 
+                            temporary_dir,
+                            args.bam_name, 
+                            Task_list[i], 
+                            args.min_siglength, 
+                            args.merge_del_threshold, 
+                            args.merge_ins_threshold, 
+                            args.max_size,
+                            None if bed_regions == None else bed_regions[i],
+                            i)
+                try:
+                    running[executor.submit(multi_run_wrapper, paras)] = (i, time.time())
+                except BrokenProcessPool:
+                    # a worker died since the last results were collected
+                    pending.insert(0, i)
+                    manifest["attempts"][i] -= 1
+                    break
+            deadline = min(started for i, started in running.values()) + WINDOW_TIMEOUT
+            finished, unfinished = wait(running, timeout=max(deadline - time.time(), 0), return_when=FIRST_COMPLETED)
+            if len(finished) == 0:
+                logging.error("A window ran for more than %d seconds, restarting the workers."%WINDOW_TIMEOUT)
+                timed_out = [i for i, started in running.values() if started + WINDOW_TIMEOUT <= time.time()]
+                for process in active_children():
+                    process.terminate()
+                # the pool breaks and fails every running window
+                finished, unfinished = wait(running)
+            for future in finished:
+                i, started = running.pop(future)
+                try:
+                    window_id, error = future.result()
+                except BrokenProcessPool:
+                    lost.append(i)
+                    continue
+                if error == None:
+                    done.add(window_id)
+                else:
+                    manifest["errors"][window_id] = error
+    if len(lost) != 0:
+        lost += [i for i, started in running.values()]
+        for i in lost:
+            manifest["errors"][i] = "timed out" if i in timed_out else "worker lost"
+        # a dead worker may have committed its window before dying
+        done.update(recover_windows(temporary_dir, args.bam_name))
+    return [i for i in lost if i not in done]
 
 #old_file_sig[]=mem_sig[DEL: -2,-1,0,1,2, INS: -2,-1,0,1,2,3, DUP: -2,-1,0,1,2, INV: -2,-1,0,1,2,3, TRA: -2,-1,0,1,2,3,4, reads: -1,0,1,2,3]
+OLD_SIGS_FORMAT = {
+    "DEL": lambda ele: "%s\t%s\t%d\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2]),
+    "INS": lambda ele: "%s\t%s\t%d\t%d\t%s\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2], ele[3]),
+    "DUP": lambda ele: "%s\t%s\t%d\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2]),
+    "INV": lambda ele: "%s\t%s\t%s\t%d\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2], ele[3]),
+    "TRA": lambda ele: "%s\t%s\t%s\t%d\t%s\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2], ele[3], ele[4]),
+    "reads": lambda ele: "%s\t%d\t%d\t%d\t%s\n"%(ele[-1], ele[0], ele[1], ele[2], ele[3]),
+}
+def sig_batch_files(temporary_dir, sv_type):
+    return list_batch_files(temporary_dir + "signatures/", (f"{sv_type}.cols", f"{sv_type}.pickle"))
+
 def process_process_sigs_type(args):
     sv_type, temporary_dir, write_old_sigs=args
-    #read
-    type_candidates=[]
-    # for pid in pids:
-    #     with open("%ssignatures/%s%s.pickle"%(temporary_dir,pid,sv_type), "rb") as f:
-    #         while True:
-    #             try:
-    #                 candidate=pickle.load(f)
-    #                 type_candidates.extend(candidate)
-    #             except EOFError:
-    #                 break
-    sigs_dir = temporary_dir + "signatures/"
-    suffix = f"{sv_type}.pickle"
-    for file_name in os.listdir(sigs_dir):
-        if file_name.endswith(suffix):
-            file_path = os.path.join(sigs_dir, file_name)
-            with open(file_path, "rb") as f:
-                while True:
-                    try:
-                        candidate=pickle.load(f)
-                        type_candidates.extend(candidate)
-                    except EOFError:
-                        break
-    #write
-    if sv_type=="DEL":
-        type_candidates.sort(key=lambda x: (x[-1], int(x[0]), x[1], x[2]))
-        type_candidates=remove_duplicates_sorted(type_candidates)
-        if write_old_sigs:
-            with open("%sDEL.sigs"%(temporary_dir),"w") as f:
-                if len(type_candidates)!=0:
-                    for ele in type_candidates:
-                        line="%s\t%s\t%d\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2])
-                        print(line, end="",file=f)
-
-    elif sv_type=="INS":
-        type_candidates.sort(key=lambda x: (x[-1], int(x[0]), x[1], x[2], x[3]))
-        type_candidates=remove_duplicates_sorted(type_candidates)
-        if write_old_sigs:
-            with open("%sINS.sigs"%(temporary_dir),"w") as f:
-                if len(type_candidates)!=0:
-                    for ele in type_candidates:
-                        line="%s\t%s\t%d\t%d\t%s\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2], ele[3])
-                        print(line, end="",file=f)
-    elif sv_type=="DUP":
-        type_candidates.sort(key=lambda x: (x[-1], int(x[0]), int(x[1]), x[2]))
-        type_candidates=remove_duplicates_sorted(type_candidates)
-        if write_old_sigs:
-            with open("%sDUP.sigs"%(temporary_dir),"w") as f:
-                if len(type_candidates)!=0:
-                    for ele in type_candidates:
-                        line="%s\t%s\t%d\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2])
-                        print(line, end="",file=f)
-    elif sv_type=="INV":
-        type_candidates.sort(key=lambda x: (x[-1], x[0], int(x[1]), x[2], x[3]))
-        type_candidates=remove_duplicates_sorted(type_candidates)
-        if write_old_sigs:
-            with open("%sINV.sigs"%(temporary_dir),"w") as f:
-                if len(type_candidates)!=0:
-                    for ele in type_candidates:
-                        line="%s\t%s\t%s\t%d\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2], ele[3])
-                        print(line, end="",file=f)
-    elif sv_type=="TRA":
-        type_candidates.sort(key=lambda x: (x[-1], x[2], x[0], int(x[1]), x[3], x[4], x[5]))
-        type_candidates=remove_duplicates_sorted(type_candidates)
-        if write_old_sigs:
-            with open("%sTRA.sigs"%(temporary_dir),"w") as f:
-                if len(type_candidates)!=0:
-                    for ele in type_candidates:
-                        line="%s\t%s\t%s\t%d\t%s\t%d\t%s\n"%(ele[-2], ele[-1], ele[0], ele[1], ele[2], ele[3], ele[4])
-                        print(line, end="",file=f)
-    elif sv_type=="reads":
-        type_candidates.sort(key=lambda x: (x[-1]))#reads file not deduped, might be resolved later
-        if write_old_sigs:
-            with open("%sreads.sigs"%(temporary_dir), "w") as f:
-                if len(type_candidates)!=0:
-                    for ele in type_candidates:
-                        line="%s\t%d\t%d\t%d\t%s\n"%(ele[-1], ele[0], ele[1], ele[2], ele[3])
-                        print(line,end="",file=f)
-    index={}
-    reads_count={}
-    with open("%s%s.pickle"%(temporary_dir,sv_type),"wb") as f:
-        chr=None
-        startl=0
-        start=0
-        if sv_type=="reads":
-            if len(type_candidates)!=0:
-                for i in range(len(type_candidates)):
-                    ele=type_candidates[i]
-                    if ele[-1]!=chr:
-                        if chr==None:
-                            chr=ele[-1]
-                        else:
-                            dump=pickle.dumps(type_candidates[startl:i])
-                            f.write(dump)
-                            index[chr]=start
-                            reads_count[chr]=i-startl
-                            start+=len(dump)
-                            chr=ele[-1]
-                            startl=i
-                pickle.dump(type_candidates[startl:],f)
-                index[chr]=start
-                reads_count[chr]=len(type_candidates)-startl
-        else:
-            if len(type_candidates)!=0:
-                for i in range(len(type_candidates)):
-                    ele=type_candidates[i]
-                    if ele[-1]!=chr:
-                        if chr==None:
-                            chr=ele[-1]
-                        else:
-                            dump=pickle.dumps(type_candidates[startl:i])
-                            f.write(dump)
-                            index[chr]=start
-                            start+=len(dump)
-                            chr=ele[-1]
-                            startl=i
-                pickle.dump(type_candidates[startl:],f)
-                index[chr]=start
-    return (sv_type,index,reads_count)
+    # only batches completed since the last snapshot are read and sorted
+    index, reads_count, digest = update_store(temporary_dir, sv_type, sig_batch_files(temporary_dir, sv_type))
+    if write_old_sigs:
+        sigs_index = {sv_type: index}
+        read_names = ReadNames(temporary_dir)
+        field = [name for name, dtype in LAYOUTS[sv_type]].index("read")
+        with open("%s%s.sigs"%(temporary_dir, sv_type),"w") as f:
+            for chr in sorted(index.keys()):
+                for ele in load_sigs(temporary_dir, sv_type, chr, sigs_index):
+                    ele = ele[:field] + (read_names.name(ele[field]),) + ele[field+1:]
+                    print(OLD_SIGS_FORMAT[sv_type](ele), end="", file=f)
+    return (sv_type,index,reads_count,digest)
 
 def write_sigs(temporary_dir, candidates, reads_info_list, prefix=""):
     index={}
@@ -959,19 +475,6 @@ def write_sigs(temporary_dir, candidates, reads_info_list, prefix=""):
         pickle.dump(index,f)
     return index
 
-def remove_duplicates_sorted(sorted):
-    if len(sorted) == 0:
-        return []
-    i=0
-    j=0
-    while i < len(sorted):
-        if sorted[i] != sorted[j]:
-            j += 1
-            sorted[j] = sorted[i]
-        i += 1
-    
-    return sorted[:j+1]
-
 def remove_duplicates(data):
     seen = set()
     result = []
@@ -1050,8 +553,7 @@ def main_ctrl(args, argv):
                     Task_list.append([i[0], pos, local_ref_len])
         bed_regions = load_bed(args.include_bed, Task_list)
         if not flag:
-            with open(f"{temporary_dir}contigINFO.pickle", "wb") as f:
-                pickle.dump(contigINFO, f)
+            write_contig_info(temporary_dir, contigINFO)
         # #'''
         # candidates={}
         # candidates["DEL"]=list()
@@ -1062,32 +564,48 @@ def main_ctrl(args, argv):
         # reads_info_list=list()
         # candidates["reads_info"]=reads_info_list
         
+        init_batch_dir(temporary_dir, args.bam_name)
+        # a rerun of an interrupted batch only processes the windows not committed yet
+        manifest = load_window_manifest(temporary_dir, args.bam_name, Task_list)
+        if manifest["tasks"] is not Task_list:
+            Task_list = manifest["tasks"]
+            bed_regions = load_bed(args.include_bed, Task_list)
+        done = recover_windows(temporary_dir, args.bam_name)
+        if len(done) != 0:
+            logging.info("Resuming: %d of %d windows already extracted."%(len(done), len(Task_list)))
         atexit.register(cleanup)
-        analysis_pools = Pool(processes=int(args.threads), initializer=init_reading_process, initargs=(args.input, args.reference))
-        results=[]#use this is faster than make a long paras list
-        for i in range(len(Task_list)):
-            paras = [(args.input, 
-                        args.min_size, 
-                        args.min_mapq, 
-                        args.max_split_parts, 
-                        args.min_read_len, 
-                        temporary_dir,
-                        args.bam_name, 
-                        Task_list[i], 
-                        args.min_siglength, 
-                        args.merge_del_threshold, 
-                        args.merge_ins_threshold, 
-                        args.max_size,
-                        None if bed_regions == None else bed_regions[i])]
-            analysis_pools.map_async(multi_run_wrapper, paras)
-        # pids = [process.pid for process in analysis_pools._pool]
-        analysis_pools.close()
-        analysis_pools.join()
+        poison = list()
+        suspects = list()
+        while True:
+            pending = list()
+            for i in range(len(Task_list)):
+                if i in done or i in poison:
+                    continue
+                if manifest["attempts"][i] >= WINDOW_ATTEMPTS:
+                    poison.append(i)
+                    continue
+                pending.append(i)
+            if len(pending) == 0:
+                break
+            # windows that were running when a worker died are retried one at
+            # a time, so the next crash only counts against its own window
+            suspects = [i for i in suspects if i in pending]
+            if len(suspects) != 0:
+                suspects = extract_windows(args, temporary_dir, Task_list, bed_regions, manifest, done, suspects, 1) + suspects
+                suspects = [i for i in dict.fromkeys(suspects) if i not in done]
+            else:
+                suspects = extract_windows(args, temporary_dir, Task_list, bed_regions, manifest, done, pending, int(args.threads))
         samfile.close()
+        if len(poison) != 0:
+            report_poison(temporary_dir, args.bam_name, manifest, poison)
+        save_window_manifest(temporary_dir, args.bam_name, manifest)
+        mark_batch_complete(temporary_dir, args.bam_name)
         __dealloc__()
     elif args.mode == "2":
     #'''
         logging.info("Rebuilding signatures of structural variants.")
+        # read IDs are given out once, before the stores of all types are updated in parallel
+        update_read_names(temporary_dir, [file_path for sv_type in SVTYPES + ["reads"] for file_path in sig_batch_files(temporary_dir, sv_type)])
         analysis_pools = Pool(processes=int(args.threads))
         paras=[]
         for sv_type in SVTYPES:
@@ -1096,10 +614,11 @@ def main_ctrl(args, argv):
         results=analysis_pools.map_async(process_process_sigs_type, paras)
         analysis_pools.close()
         analysis_pools.join()
-        sigs_index={}
+        sigs_index={"digest": {}}
         for r in results.get():
             if r!=None:
                 sigs_index[r[0]]=r[1]
+                sigs_index["digest"][r[0]]=r[3]
                 if r[0]=="reads":
                     sigs_index["reads_count"]=r[2]
         with open("%ssigindex.pickle"%temporary_dir,"wb") as f:
@@ -1136,7 +655,7 @@ def main_ctrl(args, argv):
                         args.gt_round,
                         args.remain_reads_ratio,
                         sigs_index)]
-                result.append(analysis_pools.map_async(run_del, para))
+                result.append(analysis_pools.map_async(run_cached, [(run_del, temporary_dir, "DEL", chr, para[0], sigs_index)]))
 
             # +++++INS+++++
             for chr in sigs_index["INS"]:
@@ -1153,7 +672,7 @@ def main_ctrl(args, argv):
                         args.gt_round,
                         args.remain_reads_ratio,
                         sigs_index)]
-                result.append(analysis_pools.map_async(run_ins, para))
+                result.append(analysis_pools.map_async(run_cached, [(run_ins, temporary_dir, "INS", chr, para[0], sigs_index)]))
 
             # +++++INV+++++
             for chr in sigs_index["INV"]:
@@ -1168,7 +687,7 @@ def main_ctrl(args, argv):
                         args.max_size,
                         args.gt_round,
                         sigs_index)]
-                result.append(analysis_pools.map_async(run_inv, para))
+                result.append(analysis_pools.map_async(run_cached, [(run_inv, temporary_dir, "INV", chr, para[0], sigs_index)]))
 
             # +++++DUP+++++
             for chr in sigs_index["DUP"]:
@@ -1182,7 +701,7 @@ def main_ctrl(args, argv):
                         args.max_size,
                         args.gt_round,
                         sigs_index)]
-                result.append(analysis_pools.map_async(run_dup, para))
+                result.append(analysis_pools.map_async(run_cached, [(run_dup, temporary_dir, "DUP", chr, para[0], sigs_index)]))
 
             # +++++TRA+++++
             for chr in sigs_index["TRA"]:
@@ -1195,7 +714,7 @@ def main_ctrl(args, argv):
                         args.genotype,
                         args.gt_round,
                         sigs_index)]
-                result.append(analysis_pools.map_async(run_tra, para))
+                result.append(analysis_pools.map_async(run_cached, [(run_tra, temporary_dir, "TRA", chr, para[0], sigs_index)]))
 
             analysis_pools.close()
             analysis_pools.join()
@@ -1225,6 +744,7 @@ def main_ctrl(args, argv):
                 svid["BND"] = 0
                 svid["DUP"] = 0
                 svid["INV"] = 0
+                stable_ids = load_stable_ids(temporary_dir) if args.stable_id else None
                 chroms=sorted(results.keys())
                 rusult_path = "%sresults"%temporary_dir
                 if os.path.exists(rusult_path):
@@ -1240,15 +760,24 @@ def main_ctrl(args, argv):
                 analysis_pools.close()
                 analysis_pools.join()
                 for chrom in chroms:
+                    chrom_lines = list()
                     with open("%sresults/%s.pickle"%(temporary_dir,chrom), "rb") as f:
                         while True:
                             try:
                                 lines = pickle.load(f)
+                                if args.stable_id:
+                                    # IDs are matched against the earlier snapshots per chromosome
+                                    chrom_lines.extend(lines)
+                                    continue
                                 for svtype, line in lines:
                                     file.write(line.replace("<SVID>",str(svid[svtype])))
                                     svid[svtype]+=1
                             except EOFError:
                                 break
+                    if args.stable_id:
+                        file.writelines(assign_stable_ids(chrom_lines, stable_ids))
+            if args.stable_id:
+                save_stable_ids(temporary_dir, stable_ids)
                     
 
         if args.retain_work_dir:
@@ -1256,9 +785,9 @@ def main_ctrl(args, argv):
         else:
             logging.info("Cleaning temporary files.")
             if args.Ivcf != None:
-                cmd_remove_tempfile = ("rm -r %ssignatures %s*.sigs %s*.pickle"%(temporary_dir, temporary_dir, temporary_dir))
+                cmd_remove_tempfile = ("rm -r %ssignatures %sstore %s*.sigs %s*.pickle"%(temporary_dir, temporary_dir, temporary_dir, temporary_dir))
             else:
-                cmd_remove_tempfile = ("rm -r %ssignatures %sresults %s*.sigs %s*.pickle"%(temporary_dir, temporary_dir, temporary_dir, temporary_dir))
+                cmd_remove_tempfile = ("rm -r %ssignatures %sstore %scluster_cache %sresults %s*.sigs %s*.pickle"%(temporary_dir, temporary_dir, temporary_dir, temporary_dir, temporary_dir, temporary_dir))
             exe(cmd_remove_tempfile)
 
 
@@ -106,6 +106,10 @@ def parseArgs(argv):
 		help = "Enable to report supporting read ids for each SV.",
 		action="store_true")
 	
+	parser.add_argument('--stable_id',
+		help = "Derive SV IDs from type, locus and length bucket instead of numbering them, so a call keeps its ID across runs on growing data.",
+		action="store_true")
+
 	parser.add_argument('--ignore_sequence',
 		help = "Do not output sequences for SVs.",
 		action="store_true")
@@ -0,0 +1,39 @@
+import logging
+import os
+import pickle
+
+'''
+ * Cluster result cache of mode 2.
+ * cluster_cache/<TYPE>/<chrom>.pickle keeps the last calls of one
+ * (chromosome, SV type) together with the key they were computed for: the
+ * store digests of the signature and reads segments of that chromosome and
+ * every clustering/genotyping parameter. Partitions whose key did not change
+ * since the previous snapshot reuse their calls.
+'''
+
+def cache_path(temporary_dir, sv_type, chrom):
+    return "%scluster_cache/%s/%s.pickle"%(temporary_dir, sv_type, chrom)
+
+def cluster_cache_key(sv_type, chrom, para, sigs_index):
+    # para[0] is the work dir and para[-1] the sigindex, neither decides the result
+    return (sigs_index["digest"][sv_type].get(chrom), sigs_index["digest"]["reads"].get(chrom), para[1:-1])
+
+def run_cached(args):
+    func, temporary_dir, sv_type, chrom, para, sigs_index = args
+    key = cluster_cache_key(sv_type, chrom, para, sigs_index)
+    path = cache_path(temporary_dir, sv_type, chrom)
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                cached_key, result = pickle.load(f)
+            if cached_key == key:
+                logging.info("Reused cached %s calls on %s."%(sv_type, chrom))
+                return result
+        except (EOFError, pickle.UnpicklingError):
+            pass
+    result = func(para)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open("%s.%d"%(path, os.getpid()), "wb") as f:
+        pickle.dump((key, result), f)
+    os.replace("%s.%d"%(path, os.getpid()), path)
+    return result
@@ -0,0 +1,121 @@
+import logging
+import os
+import pickle
+
+'''
+ * Window checkpoints of mode 1.
+ * Every worker appends the signatures of its task windows to its own
+ * signatures/<bam_name>/<pid><TYPE>.cols files. Once a window is fully
+ * written, the worker atomically rewrites <pid>.windows with the windows it
+ * has finished and the size of each of its files at that point. A rerun
+ * truncates the files back to those sizes, drops files of workers that never
+ * committed, and only processes the windows nobody committed.
+ * A window that fails inside a worker is rolled back to the worker's last
+ * commit at once, as are the files of all workers when one of them dies.
+ * signatures/<bam_name>/windows.pickle keeps the task windows of the batch
+ * and how often each one was dispatched; a window that failed
+ * WINDOW_ATTEMPTS times is reported in poison.txt and skipped.
+'''
+
+# dispatches of one window before it is given up
+WINDOW_ATTEMPTS = 3
+# seconds a window may run before its workers are killed and it counts as failed
+WINDOW_TIMEOUT = 1800
+SIG_SUFFIXES = ["DEL.cols", "INS.cols", "DUP.cols", "INV.cols", "TRA.cols", "reads.cols", "coverage.pickle"]
+
+# windows committed by this worker process: {manifest path: {"done": [...], "sizes": {...}}}
+_committed = dict()
+
+def batch_dir(temp_dir, bam_name):
+    return "%ssignatures/%s/"%(temp_dir, bam_name)
+
+def load_window_manifest(temp_dir, bam_name, tasks):
+    '''
+    The windows of an interrupted run are kept: the partition depends on
+    the thread count, so a rerun with other settings must not re-split.
+    '''
+    manifest_path = batch_dir(temp_dir, bam_name) + "windows.pickle"
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            return pickle.load(f)
+    return {"tasks": tasks, "attempts": [0] * len(tasks), "errors": dict()}
+
+def save_window_manifest(temp_dir, bam_name, manifest):
+    manifest_path = batch_dir(temp_dir, bam_name) + "windows.pickle"
+    with open(manifest_path + ".tmp", "wb") as f:
+        pickle.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def committed_state(path):
+    if path not in _committed:
+        _committed[path] = {"done": [], "sizes": {}}
+        if os.path.exists(path):
+            # the pid of a worker of an earlier run was reused
+            with open(path, "rb") as f:
+                _committed[path] = pickle.load(f)
+    return _committed[path]
+
+def commit_window(temp_dir, bam_name, pid, window_id):
+    path = "%s%d.windows"%(batch_dir(temp_dir, bam_name), pid)
+    state = committed_state(path)
+    state["done"].append(window_id)
+    for suffix in SIG_SUFFIXES:
+        file_path = "%s%d%s"%(batch_dir(temp_dir, bam_name), pid, suffix)
+        if os.path.exists(file_path):
+            state["sizes"][suffix] = os.path.getsize(file_path)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+def rollback_window(temp_dir, bam_name, pid):
+    '''
+    Truncate the files of a worker back to its last committed window, after
+    a window failed in it; its next commit must not take the partial data.
+    '''
+    state = committed_state("%s%d.windows"%(batch_dir(temp_dir, bam_name), pid))
+    for suffix in SIG_SUFFIXES:
+        file_path = "%s%d%s"%(batch_dir(temp_dir, bam_name), pid, suffix)
+        if not os.path.exists(file_path):
+            continue
+        if suffix not in state["sizes"]:
+            os.remove(file_path)
+        elif os.path.getsize(file_path) > state["sizes"][suffix]:
+            with open(file_path, "r+b") as f:
+                f.truncate(state["sizes"][suffix])
+
+def recover_windows(temp_dir, bam_name):
+    '''
+    Roll the signature files of a batch back to their last committed window
+    and return the ids of the committed windows.
+    '''
+    directory = batch_dir(temp_dir, bam_name)
+    done = set()
+    sizes = dict()
+    for file_name in os.listdir(directory):
+        if file_name.endswith(".windows"):
+            with open(directory + file_name, "rb") as f:
+                state = pickle.load(f)
+            done.update(state["done"])
+            sizes[file_name[:-len(".windows")]] = state["sizes"]
+    for file_name in os.listdir(directory):
+        for suffix in SIG_SUFFIXES:
+            if file_name.endswith(suffix):
+                pid = file_name[:-len(suffix)]
+                if not pid.isdigit():
+                    continue
+                if pid not in sizes or suffix not in sizes[pid]:
+                    # nothing of this file was committed
+                    os.remove(directory + file_name)
+                elif os.path.getsize(directory + file_name) > sizes[pid][suffix]:
+                    with open(directory + file_name, "r+b") as f:
+                        f.truncate(sizes[pid][suffix])
+                break
+    return done
+
+def report_poison(temp_dir, bam_name, manifest, poison):
+    with open(batch_dir(temp_dir, bam_name) + "poison.txt", "w") as f:
+        for window_id in poison:
+            chrom, start, end = manifest["tasks"][window_id]
+            error = manifest["errors"].get(window_id, "worker lost")
+            logging.warning("Skipped %s:%d-%d after %d attempts: %s"%(chrom, start, end, manifest["attempts"][window_id], error))
+            f.write("%s\t%d\t%d\t%d\t%s\n"%(chrom, start, end, manifest["attempts"][window_id], error))
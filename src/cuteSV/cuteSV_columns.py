@@ -0,0 +1,365 @@
+import hashlib
+import json
+import mmap
+import struct
+
+import numpy as np
+
+'''
+ * Columnar signature segments.
+ * A segment holds the signatures of one type as one array per tuple field.
+ * Integer fields are int64, the INS position float64 (split reads place an
+ * insertion between two alignments). String fields (read names,
+ * chromosomes, INV strands, TRA types) are dictionary encoded: a table of
+ * the distinct strings in sorted order and the smallest unsigned codes that
+ * index it, so comparing codes compares the strings. A string column can
+ * also hold IDs of a dictionary kept elsewhere and have no table, as the
+ * read names of the mode 2 store (cuteSV_readnames).
+ * Inserted sequences are kept out of line: a blob of 2-bit base codes, each
+ * sequence starting on a byte, plus the runs of other letters (N mostly),
+ * with the byte offset, length and a 64-bit fingerprint of every sequence
+ * as columns. Sorting and deduplication only look at the fingerprints, and
+ * a sequence is unpacked when it is asked for (PackedSeqs).
+ * On disk a segment is MAGIC, FORMAT_VERSION and the length of a JSON
+ * header giving the dtype and place of every array and table, then the
+ * 8-byte aligned data. Segments can be appended to one file back to back
+ * and are mapped without copying.
+'''
+
+MAGIC = b"cuteSVcl"
+FORMAT_VERSION = 2
+PREFIX = struct.Struct("<8sII")
+ALIGN = 8
+
+STRING = "str"
+PACKED = "2bit"
+LAYOUTS = {
+    "DEL": [("pos", "<i8"), ("len", "<i8"), ("read", STRING), ("svtype", STRING), ("chrom", STRING)],
+    "INS": [("pos", "<f8"), ("len", "<i8"), ("read", STRING), ("seq", PACKED), ("svtype", STRING), ("chrom", STRING)],
+    "DUP": [("start", "<i8"), ("end", "<i8"), ("read", STRING), ("svtype", STRING), ("chrom", STRING)],
+    "INV": [("strand", STRING), ("start", "<i8"), ("end", "<i8"), ("read", STRING), ("svtype", STRING), ("chrom", STRING)],
+    "TRA": [("kind", STRING), ("pos", "<i8"), ("chr2", STRING), ("pos2", "<i8"), ("read", STRING), ("svtype", STRING), ("chrom", STRING)],
+    "reads": [("start", "<i8"), ("end", "<i8"), ("primary", "<i8"), ("read", STRING), ("chrom", STRING)],
+}
+# columns deciding the order of a type, most significant first, as the
+# tuple keys of the former pickled lists; positions compare truncated
+SORT_COLUMNS = {
+    "DEL": ["chrom", "pos", "len", "read"],
+    "INS": ["chrom", "pos", "len", "read", "seq.hash"],
+    "DUP": ["chrom", "start", "end", "read"],
+    "INV": ["chrom", "strand", "start", "end", "read"],
+    "TRA": ["chrom", "chr2", "kind", "pos", "pos2", "read", "svtype"],
+}
+
+LETTERS = np.frombuffer(b"ACGT", dtype=np.uint8)
+BASE_CODES = np.zeros(256, dtype=np.uint8)
+BASE_CODES[LETTERS] = np.arange(4, dtype=np.uint8)
+IS_BASE = np.zeros(256, dtype=bool)
+IS_BASE[LETTERS] = True
+SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+BLOB_PARTS = {"bases": np.uint8, "starts": np.uint64, "lengths": np.uint32, "letters": np.uint8}
+
+def code_dtype(size):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if size <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+def new_segment(sv_type, rows, columns, tables, blobs=None):
+    return {"type": sv_type, "rows": rows, "columns": columns, "tables": tables, "blobs": blobs if blobs != None else {}}
+
+def packed_names(sv_type):
+    return [name for name, dtype in LAYOUTS[sv_type] if dtype == PACKED]
+
+def pack_seqs(seqs):
+    '''
+    Byte offsets, lengths and fingerprints of seqs and the blob holding them.
+    '''
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.uint32)
+    nbytes = (lengths.astype(np.uint64) + 3) // 4
+    offsets = np.cumsum(nbytes, dtype=np.uint64) - nbytes
+    # every sequence is padded with A to a whole byte
+    raw = np.frombuffer("".join([seq + "A" * (-len(seq) % 4) for seq in seqs]).encode(), dtype=np.uint8)
+    bases = np.bitwise_or.reduce(BASE_CODES[raw].reshape(-1, 4) << SHIFTS, axis=1).astype(np.uint8)
+    other = np.flatnonzero(~IS_BASE[raw])
+    # runs of one letter, never across the start of a sequence
+    breaks = np.ones(len(other), dtype=bool)
+    breaks[1:] = (np.diff(other) != 1) | (raw[other[1:]] != raw[other[:-1]]) | np.isin(other[1:], offsets * 4)
+    starts = np.flatnonzero(breaks)
+    blob = {"bases": bases,
+            "starts": other[starts].astype(np.uint64),
+            "lengths": np.diff(np.append(starts, len(other))).astype(np.uint32),
+            "letters": raw[other[starts]]}
+    fps = np.frombuffer(b"".join(hashlib.blake2b(seq.encode(), digest_size=8).digest() for seq in seqs), dtype=np.uint64)
+    return offsets, lengths, fps, blob
+
+def gather_seqs(blob, offsets, lengths):
+    '''
+    A blob of only the given sequences, back to back, and their new offsets.
+    '''
+    offsets = offsets.astype(np.int64)
+    lengths = lengths.astype(np.int64)
+    nbytes = (lengths + 3) // 4
+    new_offsets = np.cumsum(nbytes) - nbytes
+    bases = blob["bases"][np.repeat(offsets - new_offsets, nbytes) + np.arange(nbytes.sum())]
+    # every run is moved with the sequence it lies in
+    filled = np.flatnonzero(lengths > 0)
+    filled = filled[np.argsort(offsets[filled], kind="stable")]
+    starts = blob["starts"].astype(np.int64)
+    row = np.searchsorted(offsets[filled] * 4, starts, side="right") - 1
+    keep = row >= 0
+    row = filled[np.maximum(row, 0)] if len(filled) != 0 else row
+    keep &= starts < offsets[row] * 4 + lengths[row] if len(filled) != 0 else keep
+    moved = starts[keep] - (offsets[row[keep]] - new_offsets[row[keep]]) * 4
+    order = np.argsort(moved, kind="stable")
+    return {"bases": bases,
+            "starts": moved[order].astype(np.uint64),
+            "lengths": blob["lengths"][keep][order],
+            "letters": blob["letters"][keep][order]}, new_offsets.astype(np.uint64)
+
+def unpack_bases(blob, start, stop):
+    # letters of the bases [start, stop) of a blob, start on a byte
+    text = LETTERS[(blob["bases"][start//4:(stop+3)//4, None] >> SHIFTS) & 3].ravel()[:stop-start]
+    first = np.searchsorted(blob["starts"], start)
+    last = np.searchsorted(blob["starts"], stop)
+    for run_start, run_length, letter in zip(blob["starts"][first:last].tolist(), blob["lengths"][first:last].tolist(), blob["letters"][first:last].tolist()):
+        text[run_start-start:run_start-start+run_length] = letter
+    return text
+
+def unpack_seqs(blob, offsets, lengths):
+    blob, offsets = gather_seqs(blob, offsets, lengths)
+    text = unpack_bases(blob, 0, len(blob["bases"]) * 4).tobytes().decode()
+    return [text[offset*4:offset*4+length] for offset, length in zip(offsets.tolist(), lengths.tolist())]
+
+class PackedSeqs():
+    '''
+    Sequences of a segment by row, unpacked one at a time.
+    '''
+
+    def __init__(self, segment, name="seq"):
+        self.offsets = segment["columns"][name]
+        self.lengths = segment["columns"][name + ".len"]
+        self.blob = segment["blobs"][name]
+
+    def length(self, row):
+        return int(self.lengths[row])
+
+    def fetch(self, row, end=None):
+        '''The sequence of row, or its first end letters.'''
+        start = int(self.offsets[row]) * 4
+        stop = start + (self.length(row) if end == None else min(end, self.length(row)))
+        return unpack_bases(self.blob, start, stop).tobytes().decode()
+
+def encode(sv_type, sigs):
+    '''
+    Segment of a list of signature tuples.
+    '''
+    columns = dict()
+    tables = dict()
+    blobs = dict()
+    for i, (name, dtype) in enumerate(LAYOUTS[sv_type]):
+        values = [ele[i] for ele in sigs]
+        if dtype == STRING:
+            tables[name] = sorted(set(values))
+            index = {value: code for code, value in enumerate(tables[name])}
+            columns[name] = np.fromiter((index[value] for value in values), dtype=code_dtype(len(index)), count=len(values))
+        elif dtype == PACKED:
+            columns[name], columns[name + ".len"], columns[name + ".hash"], blobs[name] = pack_seqs(values)
+        else:
+            columns[name] = np.array(values, dtype=dtype).reshape(-1)
+    return new_segment(sv_type, len(sigs), columns, tables, blobs)
+
+def decode(segment, unpack=True):
+    '''
+    The signature tuples of a segment, as they were collected. Without
+    unpack, sequence fields hold the row to fetch from PackedSeqs.
+    '''
+    fields = list()
+    for name, dtype in LAYOUTS[segment["type"]]:
+        column = segment["columns"][name]
+        if name in segment["tables"]:
+            fields.append(np.array(segment["tables"][name], dtype=object)[column].tolist() if segment["rows"] != 0 else [])
+        elif dtype == PACKED:
+            fields.append(unpack_seqs(segment["blobs"][name], column, segment["columns"][name + ".len"]) if unpack else list(range(segment["rows"])))
+        elif dtype == "<f8":
+            # whole positions were collected as int
+            fields.append([int(value) if value.is_integer() else value for value in column.tolist()])
+        else:
+            fields.append(column.tolist())
+    return list(zip(*fields))
+
+def compact(segment):
+    # tables and blobs shrink to what is still referenced, e.g. after take()
+    columns = dict(segment["columns"])
+    tables = dict()
+    blobs = dict()
+    for name, table in segment["tables"].items():
+        used, codes = np.unique(columns[name], return_inverse=True)
+        tables[name] = [table[code] for code in used.tolist()]
+        columns[name] = codes.reshape(-1).astype(code_dtype(len(used)))
+    for name, blob in segment["blobs"].items():
+        blobs[name], columns[name] = gather_seqs(blob, columns[name], columns[name + ".len"])
+    return new_segment(segment["type"], segment["rows"], columns, tables, blobs)
+
+def pack(segment):
+    segment = compact(segment)
+    columns = list()
+    tables = dict()
+    chunks = list()
+    offset = 0
+    def add(data):
+        nonlocal offset
+        padding = -offset % ALIGN
+        chunks.append(b"\0" * padding)
+        chunks.append(data)
+        offset += padding
+        start = offset
+        offset += len(data)
+        return start
+    arrays = list(segment["columns"].items())
+    for name, blob in segment["blobs"].items():
+        arrays.extend(("%s:%s"%(name, part), blob[part]) for part in BLOB_PARTS)
+    for name, column in arrays:
+        column = np.ascontiguousarray(column)
+        columns.append({"name": name, "dtype": column.dtype.str, "offset": add(column.tobytes()), "nbytes": column.nbytes})
+    for name, table in segment["tables"].items():
+        data = "\0".join(table).encode()
+        tables[name] = {"offset": add(data), "nbytes": len(data), "count": len(table)}
+    header = json.dumps({"type": segment["type"], "rows": segment["rows"], "columns": columns, "tables": tables}).encode()
+    header += b" " * (-(PREFIX.size + len(header)) % ALIGN)
+    return PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)) + header + b"".join(chunks) + b"\0" * (-offset % ALIGN)
+
+def unpack(buffer, offset=0):
+    '''
+    The segment starting at offset of buffer and the offset following it.
+    Columns are views of buffer.
+    '''
+    magic, version, header_size = PREFIX.unpack_from(buffer, offset)
+    if magic != MAGIC:
+        raise ValueError("Not a signature segment at offset %d"%offset)
+    if version not in (1, FORMAT_VERSION):
+        raise ValueError("Signature segment version %d, expected %d"%(version, FORMAT_VERSION))
+    start = offset + PREFIX.size
+    header = json.loads(bytes(buffer[start:start+header_size]))
+    start += header_size
+    columns = dict()
+    blobs = dict()
+    end = start
+    for column in header["columns"]:
+        dtype = np.dtype(column["dtype"])
+        array = np.frombuffer(buffer, dtype=dtype, count=column["nbytes"] // dtype.itemsize, offset=start + column["offset"])
+        if ":" in column["name"]:
+            name, part = column["name"].split(":")
+            blobs.setdefault(name, dict())[part] = array
+        else:
+            columns[column["name"]] = array
+        end = max(end, start + column["offset"] + column["nbytes"])
+    tables = dict()
+    for name, table in header["tables"].items():
+        data = bytes(buffer[start+table["offset"]:start+table["offset"]+table["nbytes"]]).decode()
+        tables[name] = data.split("\0") if table["count"] != 0 else []
+        end = max(end, start + table["offset"] + table["nbytes"])
+    end += -(end - start) % ALIGN
+    if version == 1:
+        # sequences were dictionary encoded strings
+        for name in packed_names(header["type"]):
+            seqs = np.array(tables.pop(name), dtype=object)[columns[name]].tolist() if header["rows"] != 0 else []
+            columns[name], columns[name + ".len"], columns[name + ".hash"], blobs[name] = pack_seqs(seqs)
+    return new_segment(header["type"], header["rows"], columns, tables, blobs), end
+
+def map_file(path):
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def read_segments(path):
+    '''
+    All segments appended to a file.
+    '''
+    buffer = map_file(path)
+    segments = list()
+    offset = 0
+    while offset < len(buffer):
+        segment, offset = unpack(buffer, offset)
+        segments.append(segment)
+    return segments
+
+def empty(sv_type):
+    return encode(sv_type, [])
+
+def recode(segment, name, ids):
+    '''
+    Replace the codes of a string column by ids[code] and drop its table.
+    '''
+    columns = dict(segment["columns"])
+    columns[name] = ids[columns[name]]
+    tables = {key: table for key, table in segment["tables"].items() if key != name}
+    return new_segment(segment["type"], segment["rows"], columns, tables, segment["blobs"])
+
+def take(segment, rows):
+    return new_segment(segment["type"], len(rows), {name: column[rows] for name, column in segment["columns"].items()}, segment["tables"], segment["blobs"])
+
+def concat(sv_type, segments):
+    '''
+    One segment of the rows of segments in order, over merged string tables
+    and sequence blobs.
+    '''
+    segments = [segment for segment in segments if segment["rows"] != 0]
+    if len(segments) == 0:
+        return empty(sv_type)
+    if len(segments) == 1:
+        return segments[0]
+    columns = dict()
+    tables = dict()
+    blobs = dict()
+    for name in segments[0]["columns"]:
+        if name in segments[0]["tables"]:
+            tables[name] = sorted(set().union(*[segment["tables"][name] for segment in segments]))
+            merged = np.array(tables[name], dtype=object)
+            # codes of every segment are remapped onto the merged table
+            parts = [np.searchsorted(merged, np.array(segment["tables"][name], dtype=object))[segment["columns"][name]] for segment in segments]
+            columns[name] = np.concatenate(parts).astype(code_dtype(len(merged)))
+        elif name in segments[0]["blobs"]:
+            # offsets of every segment are moved behind the blobs before it
+            shifts = np.cumsum([0] + [len(segment["blobs"][name]["bases"]) for segment in segments[:-1]]).astype(np.uint64)
+            columns[name] = np.concatenate([segment["columns"][name] + shift for segment, shift in zip(segments, shifts)])
+            blobs[name] = {part: np.concatenate([segment["blobs"][name][part] for segment in segments]) for part in BLOB_PARTS}
+            blobs[name]["starts"] = np.concatenate([segment["blobs"][name]["starts"] + shift * np.uint64(4) for segment, shift in zip(segments, shifts)])
+        else:
+            columns[name] = np.concatenate([segment["columns"][name] for segment in segments])
+    return new_segment(sv_type, sum(segment["rows"] for segment in segments), columns, tables, blobs)
+
+def sort_unique(segment):
+    '''
+    Stable sort by SORT_COLUMNS, then drop rows equal to their predecessor.
+    Sequences are compared by length and fingerprint.
+    '''
+    if segment["rows"] == 0:
+        return segment
+    keys = list()
+    for name in reversed(SORT_COLUMNS[segment["type"]]):
+        column = segment["columns"][name]
+        keys.append(np.trunc(column) if column.dtype.kind == "f" else column)
+    segment = take(segment, np.lexsort(keys))
+    # rows are compared on their exact position although they were sorted on
+    # the truncated one, so equal rows split by another of the same truncated
+    # position are both kept: only adjacent duplicates are dropped, exactly
+    # as remove_duplicates_sorted did on the sorted tuple lists
+    changed = np.zeros(segment["rows"] - 1, dtype=bool)
+    for name, column in segment["columns"].items():
+        if name not in segment["blobs"]:
+            changed |= column[1:] != column[:-1]
+    return take(segment, np.flatnonzero(np.concatenate(([True], changed))))
+
+def split_chroms(segment):
+    '''
+    {chrom: segment} of the rows of every chromosome, in their order.
+    '''
+    result = dict()
+    codes = segment["columns"]["chrom"]
+    order = np.argsort(codes, kind="stable")
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    for rows in np.split(order, bounds) if segment["rows"] != 0 else []:
+        result[segment["tables"]["chrom"][codes[rows[0]]]] = take(segment, rows)
+    return result
@@ -1,4 +1,6 @@
 from cuteSV.cuteSV_genotype import cal_CIPOS, overlap_cover, assign_gt_fc
+from cuteSV.cuteSV_store import load_sigs
+from cuteSV.cuteSV_readnames import ReadNames
 from multiprocessing import Pool
 from pysam import VariantFile
 import math
@@ -103,59 +105,55 @@ def parse_record(record):
 def parse_sigs_chrom(var_type, work_dir, chrom_list, index):
     var_dict={}
     if False and var_type != 'TRA':
-        with open(work_dir + var_type + '.pickle', 'rb') as f:
-            for chrom in chrom_list:
-                if chrom not in index[var_type].keys():
-                    continue
-                f.seek(index[var_type][chrom])
-                var_dict[chrom]=pickle.load(f)
+        for chrom in chrom_list:
+            if chrom not in index[var_type].keys():
+                continue
+            var_dict[chrom]=load_sigs(work_dir, var_type, chrom, index)
     else:
-        with open(work_dir + var_type + '.pickle', 'rb') as f:
-            for chrom in chrom_list:
-                if chrom not in index[var_type].keys():
-                    continue
-                f.seek(index[var_type][chrom])
-                sigs=pickle.load(f)
-                #file_sig[]=mem_sig[DEL: -2,-1,0,1,2, INS: -2,-1,0,1,2,3, DUP: -2,-1,0,1,2, INV: -2,-1,0,1,2,3, TRA: -2,-1,0,1,2,3,4, reads: -1,0,1,2,3]
-                #from file: DEL,DUP:  1,2,3,4, INS: 1,2,3,4,5, INV:1,3,4,5, TRA[1][4]:4,3,5,6
-                #from mem: DEL,DUP: -1,0,1,2, INS: -1,0,1,2,3, INV: -1,1,2,3, TRA[-1][2]:2,1,3,4
-                if var_type == 'DEL' or var_type == 'DUP':
-                    for seq in sigs:
-                        if chrom not in var_dict:
-                            var_dict[chrom] = []
-                        var_dict[chrom].append([seq[-1], int(seq[0]), int(seq[1]), seq[2]])
-                elif var_type == 'INS':
-                    for seq in sigs:
-                        if chrom not in var_dict:
-                            var_dict[chrom] = []
-                        if len(seq) < 6:
-                            cigar = '<INS>'
-                        else:
-                            cigar = seq[3]
+        for chrom in chrom_list:
+            if chrom not in index[var_type].keys():
+                continue
+            sigs=load_sigs(work_dir, var_type, chrom, index)
+            #file_sig[]=mem_sig[DEL: -2,-1,0,1,2, INS: -2,-1,0,1,2,3, DUP: -2,-1,0,1,2, INV: -2,-1,0,1,2,3, TRA: -2,-1,0,1,2,3,4, reads: -1,0,1,2,3]
+            #from file: DEL,DUP:  1,2,3,4, INS: 1,2,3,4,5, INV:1,3,4,5, TRA[1][4]:4,3,5,6
+            #from mem: DEL,DUP: -1,0,1,2, INS: -1,0,1,2,3, INV: -1,1,2,3, TRA[-1][2]:2,1,3,4
+            if var_type == 'DEL' or var_type == 'DUP':
+                for seq in sigs:
+                    if chrom not in var_dict:
+                        var_dict[chrom] = []
+                    var_dict[chrom].append([seq[-1], int(seq[0]), int(seq[1]), seq[2]])
+            elif var_type == 'INS':
+                for seq in sigs:
+                    if chrom not in var_dict:
+                        var_dict[chrom] = []
+                    if len(seq) < 6:
                         cigar = '<INS>'
-                        var_dict[chrom].append([seq[-1], int(seq[0]), int(seq[1]), seq[2], cigar])
-                elif var_type == 'INV':
-                    for seq in sigs:
-                        if chrom not in var_dict:
-                            var_dict[chrom] = []
-                        var_dict[chrom].append([seq[-1], int(seq[1]), int(seq[2]), seq[3]])
-                else:
-                    for seq in sigs:
-                        chrom1 = seq[-1]
-                        tra_type = seq[0]
-                        pos1 = int(seq[1])
-                        chrom2 = seq[2]
-                        pos2 = int(seq[3])
-                        read_id = seq[4]
-                        if chrom1 not in var_dict:
-                            var_dict[chrom1] = dict()
-                        if chrom2 not in var_dict[chrom1]:
-                            var_dict[chrom1][chrom2] = []
-                        var_dict[chrom1][chrom2].append([chrom2, pos1, pos2, read_id])
-                    for chr1 in var_dict:
-                        for chr2 in var_dict[chr1]:
-                            var_dict[chr1][chr2].sort(key=lambda x:x[1])
-            return var_dict
+                    else:
+                        cigar = seq[3]
+                    cigar = '<INS>'
+                    var_dict[chrom].append([seq[-1], int(seq[0]), int(seq[1]), seq[2], cigar])
+            elif var_type == 'INV':
+                for seq in sigs:
+                    if chrom not in var_dict:
+                        var_dict[chrom] = []
+                    var_dict[chrom].append([seq[-1], int(seq[1]), int(seq[2]), seq[3]])
+            else:
+                for seq in sigs:
+                    chrom1 = seq[-1]
+                    tra_type = seq[0]
+                    pos1 = int(seq[1])
+                    chrom2 = seq[2]
+                    pos2 = int(seq[3])
+                    read_id = seq[4]
+                    if chrom1 not in var_dict:
+                        var_dict[chrom1] = dict()
+                    if chrom2 not in var_dict[chrom1]:
+                        var_dict[chrom1][chrom2] = []
+                    var_dict[chrom1][chrom2].append([chrom2, pos1, pos2, read_id])
+                for chr1 in var_dict:
+                    for chr2 in var_dict[chr1]:
+                        var_dict[chr1][chr2].sort(key=lambda x:x[1])
+        return var_dict
 
 def check_same_variant(sv_type, end1, end2, bias):
     if sv_type == 'INS' or sv_type == 'DEL':
@@ -574,18 +572,16 @@ def solve_fc_wrapper(args):
     return solve_fc(*args)
 def solve_fc(chrom_list, svs_dict, temporary_dir, max_cluster_bias_dict, threshold_gloab_dict, gt_round, sigs_index, read_range, svs_multi):
     reads_info = dict() # [10000, 10468, 0, 'm54238_180901_011437/52298335/ccs']
-    readsfile = open("%sreads.pickle"%(temporary_dir), 'rb')
     for chrom in chrom_list:
         try:
-            readsfile.seek(sigs_index["reads"][chrom])
-            reads_info[chrom]=pickle.load(readsfile)
+            reads_info[chrom]=load_sigs(temporary_dir, "reads", chrom, sigs_index)
         except:
             reads_info[chrom] = []
-    readsfile.close()
     sv_dict = dict()
     for sv_type in ["DEL", "DUP", "INS", "INV", "TRA"]:
         sv_dict[sv_type] = parse_sigs_chrom(sv_type, temporary_dir, chrom_list, sigs_index)
     
+    read_names = ReadNames(temporary_dir)
     gt_list = {}
     for chrom in svs_dict:
         gt_list[chrom]=[]
@@ -662,7 +658,7 @@ def solve_fc(chrom_list, svs_dict, temporary_dir, max_cluster_bias_dict, thresho
         for i in range(len(svs_dict[chrom])):
             assert len(assign_list[i]) == 6, "assign genotype error"
             record = svs_dict[chrom][i]
-            rname = ','.join(read_id_dict[i])
+            rname = read_names.join(read_id_dict[i])
             if rname == '':
                 rname = 'NULL'
             if record[7] == '<TRA>' or record[7] == '<BND>':
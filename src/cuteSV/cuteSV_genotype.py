@@ -6,6 +6,7 @@ import pysam
 import pickle
 import logging
 from cuteSV.genotype_improve import improve_overlap_cover
+from cuteSV.cuteSV_readnames import ReadNames
 
 err = 0.1
 prior = float(1/3)
@@ -273,6 +274,8 @@ def generate_output(args, semi_result, reference, chrom, temporary_dir):
     except:
         raise Exception("No corresponding contig in reference with %s."%(chrom))
     fa_file.close()
+    # calls carry read IDs, names are only looked up for RNAMES
+    read_names = ReadNames(temporary_dir) if args.report_readid else None
     lines=[]
     BATCH_SIZE=1000
     for i in semi_result:
@@ -293,7 +296,7 @@ def generate_output(args, semi_result, reference, chrom, temporary_dir):
                 CIPOS = i[5], 
                 CILEN = i[6], 
                 RE = i[4],
-                RNAMES = i[12] if args.report_readid else "NULL")
+                RNAMES = read_names.join(i[12]) if args.report_readid else "NULL")
             if action:
                 try:
                     info_list += ";AF=" + str(round(int(i[4]) / (int(i[4]) + int(i[7])), 4))
@@ -336,7 +339,7 @@ def generate_output(args, semi_result, reference, chrom, temporary_dir):
                 SVLEN = i[3], 
                 END = str(cal_end), 
                 RE = i[4],
-                RNAMES = i[10] if args.report_readid else "NULL")
+                RNAMES = read_names.join(i[10]) if args.report_readid else "NULL")
             if action:
                 try:
                     info_list += ";AF=" + str(round(int(i[4]) / (int(i[4]) + int(i[5])), 4))
@@ -372,7 +375,7 @@ def generate_output(args, semi_result, reference, chrom, temporary_dir):
                 END = str(cal_end), 
                 RE = i[4],
                 STRAND = i[7],
-                RNAMES = i[11] if args.report_readid else "NULL")
+                RNAMES = read_names.join(i[11]) if args.report_readid else "NULL")
             if action:
                 try:
                     info_list += ";AF=" + str(round(int(i[4]) / (int(i[4]) + int(i[5])), 4))
@@ -406,7 +409,7 @@ def generate_output(args, semi_result, reference, chrom, temporary_dir):
                 # CHR2 = i[3], 
                 # END = str(int(i[4]) + 1), 
                 RE = i[5],
-                RNAMES = i[11] if args.report_readid else "NULL")
+                RNAMES = read_names.join(i[11]) if args.report_readid else "NULL")
             if action:
                 try:
                     info_list += ";AF=" + str(round(int(i[5]) / (int(i[5]) + int(i[6])), 4))
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+from cuteSV.cuteSV_columns import LAYOUTS, map_file, read_segments
+
+'''
+ * Read name dictionary of mode 2.
+ * Every read name of the run is given a 32-bit ID when the batches holding
+ * it are first merged, before the signature stores are updated. The store
+ * keeps the IDs only, so clustering and genotyping compare integers; names
+ * are looked up again only to write RNAMES.
+ * store/readnames/names.bin holds the names back to back in ID order and
+ * index.npz the end offset of every name as well as the sorted 64-bit
+ * fingerprints of the names with their IDs. A fingerprint only narrows the
+ * search, the name is compared with names.bin, so colliding names get IDs
+ * of their own. manifest.pickle lists the batch files already read. IDs
+ * are only ever appended, so the IDs in the stores and the cluster cache
+ * stay valid across snapshots.
+'''
+
+def names_dir(temporary_dir):
+    return "%sstore/readnames/"%temporary_dir
+
+def fingerprints(names):
+    digests = b"".join(hashlib.blake2b(name.encode(), digest_size=8).digest() for name in names)
+    return np.frombuffer(digests, dtype=np.uint64)
+
+def load_index(temporary_dir):
+    index_path = names_dir(temporary_dir) + "index.npz"
+    if not os.path.exists(index_path):
+        return {"ends": np.empty(0, dtype=np.uint64), "fingerprints": np.empty(0, dtype=np.uint64), "ids": np.empty(0, dtype=np.uint32), "names": b""}
+    with np.load(index_path) as index:
+        result = {name: index[name] for name in index.files}
+    # names appended after the index was saved are past ends[-1] and never read
+    result["names"] = map_file(names_dir(temporary_dir) + "names.bin")
+    return result
+
+def name_bounds(index, read_ids):
+    ends = index["ends"].astype(np.int64)
+    starts = np.where(read_ids > 0, ends[np.maximum(read_ids - 1, 0)], 0)
+    return starts, ends[read_ids]
+
+def name_of(index, read_id):
+    start, end = name_bounds(index, np.array([read_id], dtype=np.int64))
+    return bytes(index["names"][int(start[0]):int(end[0])]).decode()
+
+def same_names(index, read_ids, names):
+    '''
+    Whether the stored name of every read_ids[i] is names[i].
+    '''
+    data = [name.encode() for name in names]
+    starts, ends = name_bounds(index, read_ids)
+    lengths = ends - starts
+    same = lengths == np.array([len(name) for name in data], dtype=np.int64)
+    if not same.any():
+        return same
+    # the bytes of the pairs of equal length, compared at once
+    rows = np.flatnonzero(same)
+    stored = np.frombuffer(index["names"], dtype=np.uint8)
+    query = np.frombuffer(b"".join(data[row] for row in rows.tolist()), dtype=np.uint8)
+    offsets = np.cumsum(lengths[rows]) - lengths[rows]
+    positions = np.repeat(starts[rows] - offsets, lengths[rows]) + np.arange(len(query))
+    mismatches = np.concatenate(([0], np.cumsum(stored[positions] != query)))
+    same[rows] = mismatches[offsets + lengths[rows]] == mismatches[offsets]
+    return same
+
+def lookup(index, names):
+    '''
+    IDs of names, -1 for the ones not in the dictionary.
+    '''
+    fps = fingerprints(names)
+    ids = np.full(len(fps), -1, dtype=np.int64)
+    left = np.searchsorted(index["fingerprints"], fps, side="left")
+    right = np.searchsorted(index["fingerprints"], fps, side="right")
+    hits = np.flatnonzero(right > left)
+    if len(hits) == 0:
+        return ids
+    # the first name of a fingerprint is nearly always the one looked for
+    first = index["ids"][left[hits]].astype(np.int64)
+    same = same_names(index, first, [names[i] for i in hits.tolist()])
+    ids[hits[same]] = first[same]
+    for i in hits[~same].tolist():
+        # colliding fingerprints, the other names sharing it
+        for read_id in index["ids"][left[i]+1:right[i]].tolist():
+            if name_of(index, read_id) == names[i]:
+                ids[i] = read_id
+                break
+    return ids
+
+def read_ids(index, names):
+    ids = lookup(index, names)
+    if (ids < 0).any():
+        raise ValueError("Read %s is not in the read name dictionary."%names[int(np.argmax(ids < 0))])
+    return ids.astype(np.uint32)
+
+def batch_read_names(file_path):
+    if file_path.endswith(".pickle"):
+        # batches of older versions hold pickled lists of tuples
+        sv_type = [sv_type for sv_type in LAYOUTS if file_path.endswith(sv_type + ".pickle")][0]
+        field = [name for name, dtype in LAYOUTS[sv_type]].index("read")
+        names = set()
+        with open(file_path, "rb") as f:
+            while True:
+                try:
+                    names.update(ele[field] for ele in pickle.load(f))
+                except EOFError:
+                    break
+        return names
+    return set().union(*[segment["tables"]["read"] for segment in read_segments(file_path)])
+
+def update_read_names(temporary_dir, batch_files):
+    '''
+    Give IDs to the names of the batch files not seen yet. Must run before
+    the stores of the signature types are updated from the same files.
+    '''
+    directory = names_dir(temporary_dir)
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = directory + "manifest.pickle"
+    manifest = {"batches": set()}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            manifest = pickle.load(f)
+    new_batches = [file_path for file_path in batch_files if file_path not in manifest["batches"]]
+    if len(new_batches) == 0:
+        return
+    names = set()
+    for file_path in new_batches:
+        names.update(batch_read_names(file_path))
+    names = sorted(names)
+    index = load_index(temporary_dir)
+    names = [name for name, read_id in zip(names, lookup(index, names)) if read_id < 0]
+    if len(names) != 0:
+        if len(index["ends"]) + len(names) > np.iinfo(np.uint32).max:
+            raise ValueError("More than %d read names in the work dir."%np.iinfo(np.uint32).max)
+        data = [name.encode() for name in names]
+        size = int(index["ends"][-1]) if len(index["ends"]) != 0 else 0
+        with open(directory + "names.bin", "ab") as f:
+            # names appended after the last saved index are dropped
+            f.truncate(size)
+            f.write(b"".join(data))
+        ends = np.concatenate((index["ends"], size + np.cumsum([len(name) for name in data], dtype=np.uint64)))
+        fps = np.concatenate((index["fingerprints"], fingerprints(names)))
+        ids = np.concatenate((index["ids"], np.arange(len(index["ends"]), len(ends), dtype=np.uint32)))
+        order = np.argsort(fps, kind="stable")
+        with open(directory + "index.npz.tmp", "wb") as f:
+            np.savez(f, ends=ends, fingerprints=fps[order], ids=ids[order])
+        os.replace(directory + "index.npz.tmp", directory + "index.npz")
+    manifest["batches"].update(new_batches)
+    with open(manifest_path + ".tmp", "wb") as f:
+        pickle.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+class ReadNames():
+    '''
+    Names of read IDs, read from the mapped names.bin when asked for.
+    '''
+
+    def __init__(self, temporary_dir):
+        self.index = load_index(temporary_dir)
+
+    def name(self, read_id):
+        return name_of(self.index, read_id)
+
+    def join(self, read_ids):
+        return ",".join(self.name(read_id) for read_id in read_ids)
@@ -1,6 +1,7 @@
 import numpy as np
 import logging
 from cuteSV.cuteSV_genotype import overlap_cover, assign_gt
+from cuteSV.cuteSV_store import load_sigs
 import pickle
 
 '''
@@ -22,9 +23,7 @@ def resolution_DUP(path, chr, read_count, max_cluster_bias, sv_size,
     semi_dup_cluster.append([0, 0, ''])
     candidate_single_SV = list()
 
-    with open("%s%s.pickle"%(path, "DUP"), 'rb') as f:
-        f.seek(sigs_index["DUP"][chr])
-        seqs=pickle.load(f)
+    seqs=load_sigs(path, "DUP", chr, sigs_index)
     for seq in seqs:
 
         pos_1 = int(seq[0])
@@ -128,7 +127,7 @@ def generate_dup_cluster(semi_dup_cluster, chr, read_count, max_cluster_bias,
                                             '.,.,.',
                                             '.',
                                             '.',
-                                            str(','.join(support_read))])
+                                            support_read])
 
 
 def run_dup(args):
@@ -138,10 +137,7 @@ def call_gt(temporary_dir, chr, candidate_single_SV, max_cluster_bias, sigs_inde
     # reads_list = list() # [(10000, 10468, 0, 'm54238_180901_011437/52298335/ccs'), ...]
     if chr not in sigs_index["reads"].keys():
         return []
-    readsfile = open("%sreads.pickle"%(temporary_dir), 'rb')
-    readsfile.seek(sigs_index["reads"][chr])
-    reads_list=pickle.load(readsfile)
-    readsfile.close()
+    reads_list=load_sigs(temporary_dir, "reads", chr, sigs_index)
     svs_list = list()
     for item in candidate_single_SV:
         new_cluster_bias = min(max_cluster_bias, item[3] - item[2])
@@ -177,5 +173,5 @@ def call_gt(temporary_dir, chr, candidate_single_SV, max_cluster_bias, sigs_inde
                                     str(assign_list[i][3]),
                                     str(assign_list[i][4]),
                                     str(assign_list[i][5]),
-                                    ','.join(candidate_single_SV[i][4])])
+                                    candidate_single_SV[i][4]])
     return candidate_single_SV_gt	
\ No newline at end of file
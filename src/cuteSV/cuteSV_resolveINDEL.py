@@ -1,5 +1,6 @@
 import numpy as np
 from cuteSV.cuteSV_genotype import cal_CIPOS, overlap_cover, assign_gt
+from cuteSV.cuteSV_store import load_sigs, load_packed_sigs
 import logging
 import pickle
 
@@ -49,9 +50,7 @@ def resolution_DEL(path, chr, svtype, read_count, threshold_gloab, max_cluster_b
     semi_del_cluster.append([0,0,''])
     candidate_single_SV = list()
     
-    file = open("%s%s.pickle"%(path, "DEL"), 'rb')
-    file.seek(sigs_index["DEL"][chr])
-    seqs=pickle.load(file)
+    seqs=load_sigs(path, "DEL", chr, sigs_index)
     for seq in seqs:
 
         pos = int(seq[0])
@@ -98,7 +97,6 @@ def resolution_DEL(path, chr, svtype, read_count, threshold_gloab, max_cluster_b
                                 action,
                                 gt_round,
                                 remain_reads_ratio)
-    file.close()
     if action:
         candidate_single_SV_gt = call_gt(path, chr, candidate_single_SV, max_cluster_bias, 'DEL', sigs_index)
         # logging.info("Finished %s:%s."%(chr, "DEL"))
@@ -216,7 +214,7 @@ def generate_del_cluster(semi_del_cluster, chr, svtype, read_count,
                                             '.,.,.',
                                             '.',
                                             '.',
-                                            str(','.join(allele[3]))])
+                                            allele[3]])
     
 
 def resolution_INS(path, chr, svtype, read_count, threshold_gloab, 
@@ -255,9 +253,8 @@ def resolution_INS(path, chr, svtype, read_count, threshold_gloab,
     semi_ins_cluster.append([0,0,'',''])
     candidate_single_SV = list()
 
-    with open("%s%s.pickle"%(path, "INS"), 'rb') as f:
-        f.seek(sigs_index["INS"][chr])
-        seqs=pickle.load(f)
+    # inserted sequences stay packed, seq[3] is their row in ins_seqs
+    seqs, ins_seqs = load_packed_sigs(path, "INS", chr, sigs_index)
     for seq in seqs:
 
         pos = int(seq[0])
@@ -283,7 +280,8 @@ def resolution_INS(path, chr, svtype, read_count, threshold_gloab,
                                         candidate_single_SV,
                                         action,
                                         gt_round,
-                                        remain_reads_ratio)
+                                        remain_reads_ratio,
+                                        ins_seqs)
             semi_ins_cluster = []
             semi_ins_cluster.append([pos, indel_len, read_id, ins_seq])
         else:
@@ -307,7 +305,8 @@ def resolution_INS(path, chr, svtype, read_count, threshold_gloab,
                                 candidate_single_SV,
                                 action,
                                 gt_round,
-                                remain_reads_ratio)
+                                remain_reads_ratio,
+                                ins_seqs)
     if action:
         candidate_single_SV_gt = call_gt(path, chr, candidate_single_SV, 1000, 'INS', sigs_index) # max_cluster_bias
         # logging.info("Finished %s:%s."%(chr, "INS"))
@@ -318,7 +317,7 @@ def resolution_INS(path, chr, svtype, read_count, threshold_gloab,
 
 def generate_ins_cluster(semi_ins_cluster, chr, svtype, read_count, 
     threshold_gloab, minimum_support_reads, candidate_single_SV, 
-    action, gt_round, remain_reads_ratio):
+    action, gt_round, remain_reads_ratio, ins_seqs):
         
     '''
     generate insertion
@@ -397,9 +396,9 @@ def generate_ins_cluster(semi_ins_cluster, chr, svtype, read_count,
             CILEN = cal_CIPOS(np.std(allele[1]), len(allele[1]))
             ideal_ins_seq = '<INS>'
             for pos,i in zip(allele[0],allele[4]):
-                if len(i) >= int(signalLen):
+                if ins_seqs.length(i) >= int(signalLen):
                     breakpointStart = pos
-                    ideal_ins_seq = i[0:int(signalLen)]
+                    ideal_ins_seq = ins_seqs.fetch(i, int(signalLen))
                     break
             if ideal_ins_seq == '<INS>':
                 continue
@@ -428,7 +427,7 @@ def generate_ins_cluster(semi_ins_cluster, chr, svtype, read_count,
                                             '.,.,.',
                                             ".",
                                             ".",
-                                            str(','.join(allele[3])),
+                                            allele[3],
                                             ideal_ins_seq])
 
 
@@ -442,10 +441,7 @@ def call_gt(temporary_dir, chr, candidate_single_SV, max_cluster_bias, svtype, s
     # reads_list = list() # [(10000, 10468, 0, 'm54238_180901_011437/52298335/ccs'), ...]
     if chr not in sigs_index["reads"].keys():
         return []
-    readsfile = open("%sreads.pickle"%(temporary_dir), 'rb')
-    readsfile.seek(sigs_index["reads"][chr])
-    reads_list=pickle.load(readsfile)
-    readsfile.close()
+    reads_list=load_sigs(temporary_dir, "reads", chr, sigs_index)
     svs_list = list()
     for item in candidate_single_SV:
         svs_list.append((max(item[7] - max_cluster_bias, 0), item[7] + max_cluster_bias))
@@ -473,7 +469,7 @@ def call_gt(temporary_dir, chr, candidate_single_SV, max_cluster_bias, svtype, s
                                     str(assign_list[i][3]),
                                     str(assign_list[i][4]),
                                     str(assign_list[i][5]),
-                                    ','.join(candidate_single_SV[i][8])])
+                                    candidate_single_SV[i][8]])
         if svtype == 'INS':
             candidate_single_SV_gt[i].append(candidate_single_SV[i][9])
     return candidate_single_SV_gt
\ No newline at end of file
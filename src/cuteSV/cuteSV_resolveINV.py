@@ -1,6 +1,7 @@
 import numpy as np
 import logging
 from cuteSV.cuteSV_genotype import overlap_cover, assign_gt
+from cuteSV.cuteSV_store import load_sigs
 import pickle
 
 def resolution_INV(path, chr, svtype, read_count, max_cluster_bias, sv_size, 
@@ -39,9 +40,7 @@ def resolution_INV(path, chr, svtype, read_count, max_cluster_bias, sv_size,
 
     # Load inputs & cluster breakpoint from each signature read 
 
-    with open("%s%s.pickle"%(path, "INV"), 'rb') as f:
-        f.seek(sigs_index["INV"][chr])
-        seqs=pickle.load(f)
+    seqs=load_sigs(path, "INV", chr, sigs_index)
     for seq in seqs:
 
         strand = seq[0]
@@ -153,7 +152,7 @@ def generate_semi_inv_cluster(semi_inv_cluster, chr, svtype, read_count, sv_size
                                                         '.,.,.',
                                                         ".",
                                                         ".",
-                                                        str(','.join(list(temp_id.keys())))])
+                                                        list(temp_id.keys())])
                         # print(chr, svtype, str(int(breakpoint_1)), str(int(inv_len)), str(max_count_id), str(DR), str(GT), strand)
 
             temp_id = dict()
@@ -199,7 +198,7 @@ def generate_semi_inv_cluster(semi_inv_cluster, chr, svtype, read_count, sv_size
                                                 '.,.,.',
                                                 ".",
                                                 ".",
-                                                str(','.join(list(temp_id.keys())))])
+                                                list(temp_id.keys())])
                 # print(chr, svtype, str(int(breakpoint_1)), str(int(inv_len)), str(max_count_id), str(DR), str(GT), strand)
 
 def run_inv(args):
@@ -210,10 +209,7 @@ def call_gt(temporary_dir, chr, candidate_single_SV, max_cluster_bias, sigs_inde
     
     if chr not in sigs_index["reads"].keys():
         return []
-    readsfile = open("%sreads.pickle"%(temporary_dir), 'rb')
-    readsfile.seek(sigs_index["reads"][chr])
-    reads_list=pickle.load(readsfile)
-    readsfile.close()
+    reads_list=load_sigs(temporary_dir, "reads", chr, sigs_index)
     svs_list = list()
     for item in candidate_single_SV:
         svs_list.append((max(item[2] - max_cluster_bias/2, 0), item[2] + max_cluster_bias/2))
@@ -248,5 +244,5 @@ def call_gt(temporary_dir, chr, candidate_single_SV, max_cluster_bias, sigs_inde
                                     str(assign_list[i][3]),
                                     str(assign_list[i][4]),
                                     str(assign_list[i][5]),
-                                    ','.join(candidate_single_SV[i][6])])
+                                    candidate_single_SV[i][6]])
     return candidate_single_SV_gt
\ No newline at end of file
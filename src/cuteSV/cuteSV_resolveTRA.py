@@ -1,6 +1,7 @@
 import numpy as np
 import logging
 from cuteSV.cuteSV_genotype import cal_GL, threshold_ref_count, count_coverage
+from cuteSV.cuteSV_store import load_sigs
 import pickle
 
 '''
@@ -33,9 +34,7 @@ def resolution_TRA(path, chr_1, read_count, overlap_size, max_cluster_bias, bam_
 	semi_tra_cluster = list()
 	semi_tra_cluster.append([0,0,'','N'])
 	candidate_single_SV = list()
-	with open("%s%s.pickle"%(path, "TRA"), 'rb') as f:
-		f.seek(sigs_index["TRA"][chr_1])
-		seqs=pickle.load(f)
+	seqs=load_sigs(path, "TRA", chr_1, sigs_index)
 	chr_2=seqs[0][2]
 	for seq in seqs:
 		if seq[2]!=chr_2:
@@ -182,7 +181,7 @@ def generate_semi_tra_cluster(semi_tra_cluster, chr_1, chr_2, read_count, overla
 										str(GL),
 										str(GQ),
 										str(QUAL),
-										str(','.join(set(temp[0][2])))])
+										list(set(temp[0][2]))])
 
 			if action:
 				import time
@@ -209,7 +208,7 @@ def generate_semi_tra_cluster(semi_tra_cluster, chr_1, chr_2, read_count, overla
 										str(GL),
 										str(GQ),
 										str(QUAL),
-										str(','.join(set(temp[1][2])))])
+										list(set(temp[1][2]))])
 	else:
 		if len(set(temp[0][2])) >= len(semi_tra_cluster)*overlap_size:
 			# print("%s\tTRA\t%d\t%s\t%d\t%d"%(chr_1, int(temp[0][0]/temp[0][2]), chr_2, int(temp[0][1]/temp[0][2]), len(read_tag)))
@@ -251,7 +250,7 @@ def generate_semi_tra_cluster(semi_tra_cluster, chr_1, chr_2, read_count, overla
 										str(GL),
 										str(GQ),
 										str(QUAL),
-										str(','.join(set(temp[0][2])))])
+										list(set(temp[0][2]))])
 
 
 def run_tra(args):
@@ -264,9 +263,7 @@ def call_gt(bam_path, pos_1, pos_2, chr_1, chr_2, read_id_list, max_cluster_bias
 		chr_length_list = pickle.load(f)
 	chr_length_dict = {item[0]: item[1] for item in chr_length_list}
 
-	readsfile = open("%sreads.pickle"%(path), 'rb')
-	readsfile.seek(sigs_index["reads"][chr_1])
-	reads_list=pickle.load(readsfile)
+	reads_list=load_sigs(path, "reads", chr_1, sigs_index)
 
 	querydata = set()
 	search_start = max(int(pos_1) - max_cluster_bias, 0)
@@ -314,5 +311,4 @@ def call_gt(bam_path, pos_1, pos_2, chr_1, chr_2, read_id_list, max_cluster_bias
 		GT, GL, GQ, QUAL = cal_GL(DR, len(read_id_list))
 
 	# bamfile.close()
-	readsfile.close()
 	return len(read_id_list), DR, GT, GL, GQ, QUAL
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import pickle
+import shutil
+
+from cuteSV.cuteSV_columns import PackedSeqs, encode, decode, pack, unpack, map_file, read_segments, concat, recode, sort_unique, split_chroms
+from cuteSV.cuteSV_readnames import load_index, read_ids
+
+'''
+ * Persistent signature store of mode 2.
+ * store/<TYPE>/<chrom>.cols holds a sequence of columnar runs (see
+ * cuteSV_columns), each one sorted and deduplicated. Reads are kept as
+ * their ID in the read name dictionary (cuteSV_readnames), which breaks
+ * ties of the sort order. INS sequences are kept as 2-bit codes out of
+ * line and compared by their fingerprint.
+ * store/<TYPE>/manifest.pickle records the batch files already merged and
+ * the (offset, count, size) of every run, so a snapshot only sorts the
+ * signatures of the batches that arrived since the last one.
+ * Runs of similar size are compacted, keeping O(log n) runs per chromosome.
+ * Every chromosome also carries a digest chained over the runs appended to
+ * it, unchanged by compaction, so callers can tell which ones got new data.
+ * The store only caches what signatures/ already holds: if an update is
+ * interrupted or the store was written in another format, the store of that
+ * type is dropped and rebuilt.
+'''
+
+# layout of the runs, a store of another version is rebuilt
+STORE_VERSION = 3
+# a run is merged into its predecessor while the predecessor is at most this many times larger
+COMPACT_RATIO = 2
+
+def store_dir(temporary_dir, sv_type):
+    return "%sstore/%s/"%(temporary_dir, sv_type)
+
+def load_manifest(temporary_dir, sv_type):
+    manifest_path = store_dir(temporary_dir, sv_type) + "manifest.pickle"
+    if not os.path.exists(manifest_path):
+        return {"version": STORE_VERSION, "batches": set(), "runs": {}, "digest": {}}
+    with open(manifest_path, "rb") as f:
+        return pickle.load(f)
+
+def save_manifest(temporary_dir, sv_type, manifest):
+    manifest_path = store_dir(temporary_dir, sv_type) + "manifest.pickle"
+    with open(manifest_path + ".tmp", "wb") as f:
+        pickle.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def merge_runs(sv_type, runs):
+    if sv_type == "reads" or len(runs) == 1:
+        # reads are not deduped, batch order is kept
+        return concat(sv_type, runs)
+    # a stable sort keeps the run order on equal keys, as a merge of the runs would
+    return sort_unique(concat(sv_type, runs))
+
+def read_runs(buffer, runs):
+    return [unpack(buffer, offset)[0] for offset, count in runs]
+
+def read_batch(file_path, sv_type):
+    if file_path.endswith(".pickle"):
+        # batches of older versions hold pickled lists of tuples
+        sigs = list()
+        with open(file_path, "rb") as f:
+            while True:
+                try:
+                    sigs.extend(pickle.load(f))
+                except EOFError:
+                    break
+        return [encode(sv_type, sigs)]
+    return read_segments(file_path)
+
+def append_run(path, sv_type, runs, sigs):
+    '''
+    Append one sorted run to a chromosome file. Trailing runs that are not
+    much larger than the new one are merged with it and rewritten in place.
+    '''
+    end = runs[-1][0] + runs[-1][2] if len(runs) != 0 else 0
+    merge_from = len(runs)
+    count = sigs["rows"]
+    while merge_from > 0 and runs[merge_from-1][1] <= COMPACT_RATIO * count:
+        merge_from -= 1
+        count += runs[merge_from][1]
+    if merge_from < len(runs):
+        # the tail is rewritten in place, so it is read rather than mapped
+        with open(path, "rb") as f:
+            f.seek(runs[merge_from][0])
+            tail = read_runs(f.read(end - runs[merge_from][0]), [(offset - runs[merge_from][0], count) for offset, count, size in runs[merge_from:]])
+        sigs = merge_runs(sv_type, tail + [sigs])
+        end = runs[merge_from][0]
+    dump = pack(sigs)
+    with open(path, "ab") as f:
+        f.truncate(end)
+        f.write(dump)
+    return runs[:merge_from] + [(end, sigs["rows"], len(dump))]
+
+def update_store(temporary_dir, sv_type, batch_files):
+    '''
+    Merge the batch files not seen yet into the store of one signature type.
+    Returns the per-chromosome run lists, signature counts and digests used
+    as sigindex.
+    '''
+    type_dir = store_dir(temporary_dir, sv_type)
+    dirty_path = type_dir + ".dirty"
+    if os.path.exists(dirty_path):
+        # interrupted while rewriting runs, the store is rebuilt from the batch files
+        shutil.rmtree(type_dir)
+    os.makedirs(type_dir, exist_ok=True)
+    manifest = load_manifest(temporary_dir, sv_type)
+    if manifest.get("version") != STORE_VERSION:
+        shutil.rmtree(type_dir)
+        os.makedirs(type_dir)
+        manifest = load_manifest(temporary_dir, sv_type)
+    new_batches = [file_path for file_path in batch_files if file_path not in manifest["batches"]]
+    if len(new_batches) != 0:
+        new_sigs = list()
+        for file_path in new_batches:
+            new_sigs.extend(read_batch(file_path, sv_type))
+        with open(dirty_path, "w") as f:
+            pass
+        new_sigs = concat(sv_type, new_sigs)
+        if new_sigs["rows"] != 0:
+            new_sigs = recode(new_sigs, "read", read_ids(load_index(temporary_dir), new_sigs["tables"]["read"]))
+        for chrom, sigs in split_chroms(new_sigs).items():
+            if sv_type != "reads":
+                sigs = sort_unique(sigs)
+            path = "%s%s.cols"%(type_dir, chrom)
+            manifest["runs"][chrom] = append_run(path, sv_type, manifest["runs"].get(chrom, []), sigs)
+            digest = hashlib.sha1(manifest["digest"].get(chrom, "").encode())
+            digest.update(pack(sigs))
+            manifest["digest"][chrom] = digest.hexdigest()
+        manifest["batches"].update(new_batches)
+        save_manifest(temporary_dir, sv_type, manifest)
+        os.remove(dirty_path)
+    index = dict()
+    reads_count = dict()
+    for chrom in manifest["runs"]:
+        index[chrom] = [(offset, count) for offset, count, size in manifest["runs"][chrom]]
+        reads_count[chrom] = sum(count for offset, count, size in manifest["runs"][chrom])
+    return index, reads_count, manifest["digest"]
+
+def load_columns(temporary_dir, sv_type, chrom, sigs_index):
+    '''
+    Sorted, deduplicated signatures of one chromosome, as a single segment.
+    '''
+    if chrom not in sigs_index[sv_type]:
+        return concat(sv_type, [])
+    path = "%s%s.cols"%(store_dir(temporary_dir, sv_type), chrom)
+    return merge_runs(sv_type, read_runs(map_file(path), sigs_index[sv_type][chrom]))
+
+def load_sigs(temporary_dir, sv_type, chrom, sigs_index):
+    '''
+    Sorted, deduplicated signatures of one chromosome, as a single list.
+    '''
+    if chrom not in sigs_index[sv_type]:
+        return []
+    return decode(load_columns(temporary_dir, sv_type, chrom, sigs_index))
+
+def load_packed_sigs(temporary_dir, sv_type, chrom, sigs_index):
+    '''
+    As load_sigs, with the row of every sequence in place of the sequence
+    and the PackedSeqs to fetch it from.
+    '''
+    if chrom not in sigs_index[sv_type]:
+        return [], None
+    segment = load_columns(temporary_dir, sv_type, chrom, sigs_index)
+    return decode(segment, unpack=False), PackedSeqs(segment)
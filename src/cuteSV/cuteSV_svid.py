@@ -0,0 +1,130 @@
+import bisect
+import math
+import os
+import pickle
+import re
+
+'''
+ * Stable SV IDs.
+ * With --stable_id a call is named after its type, chromosome, a bin of its
+ * position and a bucket of its length, cuteSV.<TYPE>.<CHR>_<BIN>_<BUCKET>,
+ * instead of its rank in the output. Calls sharing a bin and bucket get a
+ * .2, .3, ... suffix. For BND the bucket is the chromosome and position bin
+ * of the mate.
+ * Every ID given out is kept in <work_dir>stable_ids.pickle with the last
+ * position and length (or mate) of its call. A call of a later snapshot
+ * within MATCH_DIST bp of a known call of the same type and of a similar
+ * length takes its ID back, nearest pairs first, so refined breakpoints,
+ * a bin edge crossed or new calls in the same bin do not rename it. Only
+ * the calls left over get new IDs.
+'''
+
+# positions of a call within POS_BIN bp share an ID
+POS_BIN = 500
+# length buckets per doubling of the SV length
+LEN_BUCKETS = 4
+# a call matches a known one this close, or with a mate this close for BND
+MATCH_DIST = 500
+# and at least this similar in length
+MIN_LEN_RATIO = 0.7
+
+BND_MATE = re.compile(r"[\[\]]([^\[\]:]+):(\d+)[\[\]]")
+SVLEN = re.compile(r"(?:^|;)SVLEN=([^;]+)")
+
+def length_bucket(svlen):
+    svlen = abs(int(float(svlen)))
+    return int(math.log2(svlen) * LEN_BUCKETS) if svlen > 0 else 0
+
+def stable_svid(svtype, chrom, pos, info, alt):
+    if svtype == "BND":
+        mate = BND_MATE.search(alt)
+        bucket = "%s_%d"%(mate.group(1), int(mate.group(2)) // POS_BIN) if mate else "NA"
+    else:
+        svlen = SVLEN.search(info)
+        bucket = str(length_bucket(svlen.group(1))) if svlen else "NA"
+    return "cuteSV.%s.%s_%d_%s"%(svtype, chrom, int(pos) // POS_BIN, bucket)
+
+def call_shape(svtype, info, alt):
+    # what a call is matched on besides its position
+    if svtype == "BND":
+        mate = BND_MATE.search(alt)
+        return (mate.group(1), int(mate.group(2))) if mate else None
+    svlen = SVLEN.search(info)
+    return abs(int(float(svlen.group(1)))) if svlen else None
+
+def shape_distance(svtype, shape, known_shape):
+    '''
+    How far apart two calls are besides their position, None if they are
+    not the same call.
+    '''
+    if shape == None or known_shape == None:
+        return 0 if shape == known_shape else None
+    if svtype == "BND":
+        if shape[0] != known_shape[0] or abs(shape[1] - known_shape[1]) > MATCH_DIST:
+            return None
+        return abs(shape[1] - known_shape[1])
+    if min(shape, known_shape) < MIN_LEN_RATIO * max(shape, known_shape):
+        return None
+    return abs(shape - known_shape)
+
+def load_stable_ids(temporary_dir):
+    path = "%sstable_ids.pickle"%temporary_dir
+    if not os.path.exists(path):
+        return dict()
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def save_stable_ids(temporary_dir, known):
+    path = "%sstable_ids.pickle"%temporary_dir
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(known, f)
+    os.replace(path + ".tmp", path)
+
+def assign_stable_ids(lines, known):
+    '''
+    Replace the <SVID> placeholder of the (svtype, record) lines of one
+    chromosome. known, {(svtype, chrom): [[pos, shape, ID]]}, holds the
+    calls of the earlier snapshots and is updated in place.
+    '''
+    calls = list()
+    groups = dict()
+    for row, (svtype, line) in enumerate(lines):
+        fields = line.split("\t", 8)
+        calls.append(fields)
+        groups.setdefault((svtype, fields[0]), list()).append(row)
+    ids = [None] * len(lines)
+    for (svtype, chrom), rows in groups.items():
+        previous = known.setdefault((svtype, chrom), list())
+        previous.sort(key = lambda x:x[0])
+        known_pos = [ele[0] for ele in previous]
+        pairs = list()
+        for row in rows:
+            pos = int(calls[row][1])
+            shape = call_shape(svtype, calls[row][7], calls[row][4])
+            for i in range(bisect.bisect_left(known_pos, pos - MATCH_DIST), bisect.bisect_right(known_pos, pos + MATCH_DIST)):
+                distance = shape_distance(svtype, shape, previous[i][1])
+                if distance != None:
+                    pairs.append((abs(pos - known_pos[i]) + distance, row, i))
+        # nearest pairs first, every call and known ID used once
+        pairs.sort()
+        matched = set()
+        for distance, row, i in pairs:
+            if ids[row] == None and i not in matched:
+                matched.add(i)
+                ids[row] = previous[i][2]
+                previous[i][0] = int(calls[row][1])
+                previous[i][1] = call_shape(svtype, calls[row][7], calls[row][4])
+        taken = set(ele[2] for ele in previous)
+        for row in rows:
+            if ids[row] != None:
+                continue
+            svid = stable_svid(svtype, chrom, calls[row][1], calls[row][7], calls[row][4])
+            ordinal = 1
+            while (svid if ordinal == 1 else "%s.%d"%(svid, ordinal)) in taken:
+                ordinal += 1
+            ids[row] = svid if ordinal == 1 else "%s.%d"%(svid, ordinal)
+            taken.add(ids[row])
+            previous.append([int(calls[row][1]), call_shape(svtype, calls[row][7], calls[row][4]), ids[row]])
+    for row, fields in enumerate(calls):
+        fields[2] = ids[row]
+    return ["\t".join(fields) for fields in calls]
@@ -0,0 +1,704 @@
+# cython: language_level=3
+from pysam.libcalignedsegment cimport AlignedSegment
+from pysam.libchtslib cimport bam1_t, bam_get_cigar, bam_get_seq, bam_get_qname, bam_get_aux, bam_get_l_aux, bam_seqi, bam_cigar_op, bam_cigar_oplen
+from libc.stdint cimport uint8_t, uint32_t, int32_t
+from libc.string cimport memcpy
+from libc.stdlib cimport malloc, free
+cimport cython
+
+'''
+ * Compiled signature extraction of mode 1.
+ * parse_signatures() is parse_read() of cuteSV.py working on the bam1_t
+ * record behind a pysam AlignedSegment: the CIGAR, SEQ and SA fields are
+ * read in place, without read.cigartuples, read.query_sequence or
+ * read.get_tags() allocating Python objects for every read. Only the
+ * inserted sequences and, for split reads, the query are decoded.
+ * It emits the same INS/DEL/DUP/INV/TRA candidate tuples as parse_read().
+'''
+
+cdef const char *SEQ_NT16 = "=ACMGRSVTWYHKDBN"
+dic_starnd = {1: '+', 2: '-'}
+
+cdef int detect_flag(int flag):
+    if flag == 0:
+        return 1
+    if flag == 16:
+        return 2
+    return 0
+
+cdef bint is_ref_change(int op):
+    # M, D, N, =, X
+    return op == 0 or op == 2 or op == 3 or op == 7 or op == 8
+
+cdef object query_sequence(bam1_t *b):
+    cdef int l_qseq = b.core.l_qseq
+    if l_qseq == 0:
+        return None
+    return query_slice(b, 0, l_qseq)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef str query_slice(bam1_t *b, int start, int end):
+    cdef int l_qseq = b.core.l_qseq
+    cdef uint8_t *seq = bam_get_seq(b)
+    cdef char *buf
+    cdef int i
+    if start < 0 or end < start:
+        # python slicing semantics for the odd cases
+        query = query_sequence(b)
+        return query[start:end]
+    if end > l_qseq:
+        end = l_qseq
+    if start > end:
+        start = end
+    buf = <char*>malloc(end - start + 1)
+    try:
+        for i in range(start, end):
+            buf[i - start] = SEQ_NT16[bam_seqi(seq, i)]
+        return buf[:end - start].decode('ascii')
+    finally:
+        free(buf)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef object find_sa(bam1_t *b):
+    '''
+    Value of the SA:Z tag, or None. Walks the aux block directly instead of
+    building the list of every tag.
+    '''
+    cdef uint8_t *s = bam_get_aux(b)
+    cdef uint8_t *end = s + bam_get_l_aux(b)
+    cdef uint8_t *value
+    cdef char tag_type
+    cdef char sub_type
+    cdef int32_t count
+    cdef int size
+    cdef bint is_sa
+    while s + 3 <= end:
+        is_sa = s[0] == b'S' and s[1] == b'A'
+        tag_type = <char>s[2]
+        value = s + 3
+        if tag_type == b'Z' or tag_type == b'H':
+            s = value
+            while s < end and s[0] != 0:
+                s += 1
+            if is_sa and tag_type == b'Z':
+                return (<char*>value)[:s - value].decode()
+            s += 1
+            continue
+        if tag_type == b'A' or tag_type == b'c' or tag_type == b'C':
+            size = 1
+        elif tag_type == b's' or tag_type == b'S':
+            size = 2
+        elif tag_type == b'i' or tag_type == b'I' or tag_type == b'f':
+            size = 4
+        elif tag_type == b'd':
+            size = 8
+        elif tag_type == b'B':
+            sub_type = <char>value[0]
+            memcpy(&count, value + 1, 4)
+            if sub_type == b'c' or sub_type == b'C':
+                size = 5 + count
+            elif sub_type == b's' or sub_type == b'S':
+                size = 5 + 2 * count
+            else:
+                size = 5 + 4 * count
+        else:
+            return None
+        s = value + size
+    return None
+
+# SA CIGAR strings remembered per worker; every record of a split read
+# carries the CIGARs of its siblings, so each one is seen several times
+CLIP_CACHE_SIZE = 4096
+cdef dict clip_cache = dict()
+
+cdef tuple parse_clip_pos(str deal_cigar):
+    '''
+    (left soft clip, right soft clip, aligned reference length) of a CIGAR
+    string of the SA tag, in one pass over the string.
+    '''
+    cdef long first_pos = 0
+    cdef long last_pos = 0
+    cdef long bias = 0
+    cdef long oplen = 0
+    cdef bint first = True
+    cdef Py_UCS4 c
+    for c in deal_cigar:
+        if c >= '0' and c <= '9':
+            oplen = oplen * 10 + (<long>c - 48)
+            continue
+        if first and c == 'S':
+            first_pos = oplen
+        first = False
+        last_pos = oplen if c == 'S' else 0
+        if c == 'M' or c == 'D' or c == '=' or c == 'X':
+            bias += oplen
+        oplen = 0
+    return (first_pos, last_pos, bias)
+
+cdef tuple acquire_clip_pos(str deal_cigar):
+    # least recently used entries are evicted first
+    clip_pos = clip_cache.pop(deal_cigar, None)
+    if clip_pos is None:
+        clip_pos = parse_clip_pos(deal_cigar)
+        if len(clip_cache) >= CLIP_CACHE_SIZE:
+            del clip_cache[next(iter(clip_cache))]
+    clip_cache[deal_cigar] = clip_pos
+    return clip_pos
+
+def organize_split_signal(primary_info, Supplementary_info, total_L, SV_size, 
+    min_mapq, max_split_parts, read_name, candidate, MaxSize, query):
+    split_read = list()
+    if len(primary_info) > 0:
+        split_read.append(primary_info)
+        min_mapq = 0
+    for i in Supplementary_info:
+        seq = i.split(',')
+        local_chr = seq[0]
+        local_start = int(seq[1])
+        local_cigar = seq[3]
+        local_strand = seq[2]
+        local_mapq = int(seq[4])
+        if local_mapq >= min_mapq:
+            local_set = acquire_clip_pos(local_cigar)
+            if local_strand == '+':
+                 split_read.append([local_set[0], total_L-local_set[1], local_start, 
+                     local_start+local_set[2], local_chr, local_strand])
+            else:
+                split_read.append([local_set[1], total_L-local_set[0], local_start, 
+                    local_start+local_set[2], local_chr, local_strand])
+    if len(split_read) <= max_split_parts or max_split_parts == -1:
+        analysis_split_read(split_read, SV_size, total_L, read_name, candidate, MaxSize, query)
+
+cdef void combine_ins_sigs(list sigs, str Chr_name, str read_name, list candidate, int merge_dis):
+    cdef int i
+    cdef long start, length, last
+    if len(sigs) == 0:
+        return
+    start, length, seq = sigs[0]
+    last = start
+    for i in range(1, len(sigs)):
+        if sigs[i][0] - last <= merge_dis:
+            length += sigs[i][1]
+            seq += sigs[i][2]
+            last = sigs[i][0]
+        else:
+            candidate.append((start, length, read_name, seq, "INS", Chr_name))
+            start, length, seq = sigs[i]
+            last = start
+    candidate.append((start, length, read_name, seq, "INS", Chr_name))
+
+cdef void combine_del_sigs(list sigs, str Chr_name, str read_name, list candidate, int merge_dis):
+    cdef int i
+    cdef long start, length, last
+    if len(sigs) == 0:
+        return
+    start, length = sigs[0]
+    # the first deletion is compared by its end, later groups by their start,
+    # as generate_combine_sigs() does
+    last = start + length
+    for i in range(1, len(sigs)):
+        if sigs[i][0] - last <= merge_dis:
+            length += sigs[i][1]
+            last = sigs[i][0] + sigs[i][1]
+        else:
+            candidate.append((start, length, read_name, "DEL", Chr_name))
+            start, length = sigs[i]
+            last = start
+    candidate.append((start, length, read_name, "DEL", Chr_name))
+
+cpdef parse_signatures(AlignedSegment read, dict candidate, str Chr_name, int SV_size, int min_mapq, int max_split_parts, 
+                       int min_read_len, int min_siglength, int merge_del_threshold, int merge_ins_threshold, int MaxSize):
+    cdef bam1_t *b = read._delegate
+    cdef uint32_t *cigar = bam_get_cigar(b)
+    cdef int n_cigar = b.core.n_cigar
+    cdef int l_qseq = b.core.l_qseq
+    cdef int process_signal = detect_flag(b.core.flag)
+    cdef bint mapped = b.core.qual >= min_mapq
+    cdef int k, op, oplen
+    cdef long pos_start = b.core.pos
+    cdef long pos_end = b.core.pos
+    cdef long ref_length = 0
+    cdef long sig_start = pos_start
+    cdef long shift_ins_read = 0
+    cdef int softclip_left = 0
+    cdef int softclip_right = 0
+    cdef int hardclip_left = 0
+    cdef int hardclip_right = 0
+    if l_qseq < min_read_len:
+        return []
+    Combine_sig_in_same_read_ins = list()
+    Combine_sig_in_same_read_del = list()
+    if mapped and n_cigar != 0:
+        op = bam_cigar_op(cigar[0])
+        if op == 4:
+            softclip_left = bam_cigar_oplen(cigar[0])
+        elif op == 5:
+            hardclip_left = bam_cigar_oplen(cigar[0])
+        shift_ins_read = -hardclip_left
+        for k in range(n_cigar):
+            op = bam_cigar_op(cigar[k])
+            oplen = bam_cigar_oplen(cigar[k])
+            if is_ref_change(op):
+                ref_length += oplen
+            if op != 2:
+                shift_ins_read += oplen
+            if oplen >= min_siglength and (op == 1 or op == 2):
+                if op == 2:
+                    Combine_sig_in_same_read_del.append([sig_start, oplen])
+                    sig_start += oplen
+                else:
+                    Combine_sig_in_same_read_ins.append([sig_start, oplen, query_slice(b, shift_ins_read - oplen, shift_ins_read)])
+            elif is_ref_change(op):
+                sig_start += oplen
+        # bam_endpos(): unmapped records and records without reference bases span one base
+        if ref_length != 0 and not b.core.flag & 4:
+            pos_end = pos_start + ref_length
+        else:
+            pos_end = pos_start + 1
+        op = bam_cigar_op(cigar[n_cigar - 1])
+        if op == 4:
+            softclip_right = bam_cigar_oplen(cigar[n_cigar - 1])
+        elif op == 5:
+            hardclip_right = bam_cigar_oplen(cigar[n_cigar - 1])
+        if hardclip_left != 0:
+            softclip_left = hardclip_left
+        if hardclip_right != 0:
+            softclip_right = hardclip_right
+
+    read_name = bam_get_qname(b).decode()
+    combine_ins_sigs(Combine_sig_in_same_read_ins, Chr_name, read_name, candidate["INS"], merge_ins_threshold)
+    combine_del_sigs(Combine_sig_in_same_read_del, Chr_name, read_name, candidate["DEL"], merge_del_threshold)
+
+    if process_signal == 1 or process_signal == 2:
+        sa = find_sa(b)
+        if sa is None:
+            return candidate
+        if mapped:
+            if process_signal == 1:
+                primary_info = [softclip_left, l_qseq-softclip_right, pos_start, 
+                pos_end, Chr_name, dic_starnd[process_signal]]
+            else:
+                primary_info = [softclip_right, l_qseq-softclip_left, pos_start, 
+                pos_end, Chr_name, dic_starnd[process_signal]]
+        else:
+            primary_info = []
+        organize_split_signal(primary_info, sa.split(';')[:-1], l_qseq, 
+            SV_size, min_mapq, max_split_parts, read_name, candidate, MaxSize, query_sequence(b))
+    return candidate
+
+
+def analysis_inv(ele_1, ele_2, read_name, candidate, SV_size):
+    if ele_1[5] == '+':
+        # +-
+        if ele_1[3] - ele_2[3] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_1[3] - ele_2[3]) >= ele_1[1]:
+                candidate.append(("++", 
+                                    ele_2[3], 
+                                    ele_1[3], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # head-to-head
+                # 5'->5'
+        if ele_2[3] - ele_1[3] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_2[3] - ele_1[3]) >= ele_1[1]:
+                candidate.append(("++", 
+                                    ele_1[3], 
+                                    ele_2[3], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # head-to-head
+                # 5'->5'
+    else:
+        # -+
+        if ele_2[2] - ele_1[2] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_2[2] - ele_1[2]) >= ele_1[1]:
+                candidate.append(("--", 
+                                    ele_1[2], 
+                                    ele_2[2], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # tail-to-tail
+                # 3'->3'
+        if ele_1[2] - ele_2[2] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_1[2] - ele_2[2]) >= ele_1[1]:
+                candidate.append(("--", 
+                                    ele_2[2], 
+                                    ele_1[2], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # tail-to-tail
+                # 3'->3'
+
+
+def analysis_bnd(ele_1, ele_2, read_name, candidate):
+    '''
+    *********Description*********
+    *	TYPE A:		N[chr:pos[	*
+    *	TYPE B:		N]chr:pos]	*
+    *	TYPE C:		[chr:pos[N	*
+    *	TYPE D:		]chr:pos]N	*
+    *****************************
+    '''
+    if ele_2[0] - ele_1[1] <= 100:
+        if ele_1[5] == '+':
+            if ele_2[5] == '+':
+                # +&+
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('A', 
+                                        ele_1[3], 
+                                        ele_2[4], 
+                                        ele_2[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # N[chr:pos[
+                else:
+                    candidate.append(('D', 
+                                        ele_2[2], 
+                                        ele_1[4], 
+                                        ele_1[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # ]chr:pos]N
+            else:
+                # +&-
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('B', 
+                                        ele_1[3], 
+                                        ele_2[4], 
+                                        ele_2[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # N]chr:pos]
+                else:
+                    candidate.append(('B', 
+                                        ele_2[3], 
+                                        ele_1[4], 
+                                        ele_1[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # N]chr:pos]
+        else:
+            if ele_2[5] == '+':
+                # -&+
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('C', 
+                                        ele_1[2], 
+                                        ele_2[4], 
+                                        ele_2[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # [chr:pos[N
+                else:
+                    candidate.append(('C', 
+                                        ele_2[2], 
+                                        ele_1[4], 
+                                        ele_1[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # [chr:pos[N
+            else:
+                # -&-
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('D', 
+                                        ele_1[2], 
+                                        ele_2[4], 
+                                        ele_2[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # ]chr:pos]N
+                else:
+                    candidate.append(('A', 
+                                        ele_2[3], 
+                                        ele_1[4], 
+                                        ele_1[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # N[chr:pos[
+
+def analysis_split_read(split_read, SV_size, RLength, read_name, candidate, MaxSize, query):
+    '''
+    read_start	read_end	ref_start	ref_end	chr	strand
+    #0			#1			#2			#3		#4	#5
+    '''
+    SP_list = sorted(split_read, key = lambda x:x[0])
+    # print(read_name)
+    # for i in SP_list:
+    #     print(i)
+
+    # detect INS involoved in a translocation
+    trigger_INS_TRA = 0	
+
+    # Store Strands of INV
+
+    if len(SP_list) == 2:
+        ele_1 = SP_list[0]
+        ele_2 = SP_list[1]
+        if ele_1[4] == ele_2[4]:
+            if ele_1[5] != ele_2[5]:
+                analysis_inv(ele_1, 
+                                ele_2, 
+                                read_name, 
+                                candidate["INV"],
+                                SV_size)
+
+            else:
+                # dup & ins & del 
+                a = 0
+                if ele_1[5] == '-':
+                    ele_1 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
+                    ele_2 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
+                    query = query[::-1]
+
+                if ele_1[3] - ele_2[2] >= SV_size:
+                    # if ele_2[1] - ele_1[1] >= ele_1[3] - ele_2[2]:
+                    if ele_2[0] - ele_1[1] >= ele_1[3] - ele_2[2]:
+                        candidate["INS"].append(((ele_1[3]+ele_2[2])/2, 
+                                        ele_2[0]+ele_1[3]-ele_2[2]-ele_1[1], 
+                                        read_name,
+                                        str(query[ele_1[1]+int((ele_1[3]-ele_2[2])/2):ele_2[0]-int((ele_1[3]-ele_2[2])/2)]),
+                                        "INS",
+                                        ele_2[4]))
+                    else:
+                        candidate["DUP"].append((ele_2[2], 
+                                            ele_1[3], 
+                                            read_name,
+                                            "DUP",
+                                            ele_2[4]))
+
+                delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                    if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                        candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                            delta_length, 
+                                            read_name,
+                                            str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                            "INS",
+                                            ele_2[4]))
+                delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                    if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                        candidate["DEL"].append((ele_1[3], 
+                                            delta_length, 
+                                            read_name,
+                                            "DEL",
+                                            ele_2[4]))
+        else:
+            trigger_INS_TRA = 1
+            analysis_bnd(ele_1, ele_2, read_name, candidate["TRA"])
+
+    else:
+        # over three splits
+        for a in range(len(SP_list[1:-1])):
+            ele_1 = SP_list[a]
+            ele_2 = SP_list[a+1]
+            ele_3 = SP_list[a+2]
+
+            if ele_1[4] == ele_2[4]:
+                if ele_2[4] == ele_3[4]:
+                    if ele_1[5] == ele_3[5] and ele_1[5] != ele_2[5]:
+                        if ele_2[5] == '-':
+                            # +-+
+                            if ele_2[0] + 0.5 * (ele_3[2] - ele_1[3]) >= ele_1[1] and ele_3[0] + 0.5 * (ele_3[2] - ele_1[3]) >= ele_2[1]:
+                                # No overlaps in split reads
+
+                                if ele_2[2] >= ele_1[3] and ele_3[2] >= ele_2[3]:
+                                    candidate["INV"].append(("++", 
+                                                        ele_1[3], 
+                                                        ele_2[3], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # head-to-head
+                                    # 5'->5'
+                                    candidate["INV"].append(("--", 
+                                                        ele_2[2], 
+                                                        ele_3[2], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # tail-to-tail
+                                    # 3'->3'
+                        else:
+                            # -+-
+                            if ele_1[1] <= ele_2[0] + 0.5 * (ele_1[2] - ele_3[3]) and ele_3[0] + 0.5 * (ele_1[2] - ele_3[3]) >= ele_2[1]:
+                                # No overlaps in split reads
+
+                                if ele_2[2] - ele_3[3] >= -50 and ele_1[2] - ele_2[3] >= -50:
+                                    candidate["INV"].append(("++", 
+                                                        ele_3[3], 
+                                                        ele_2[3], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # head-to-head
+                                    # 5'->5'
+                                    candidate["INV"].append(("--", 
+                                                        ele_2[2], 
+                                                        ele_1[2], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # tail-to-tail
+                                    # 3'->3'	
+
+                    if len(SP_list) - 3 == a:
+                        if ele_1[5] != ele_3[5]:
+                            if ele_2[5] == ele_1[5]:
+                                # ++-/--+
+                                analysis_inv(ele_2, 
+                                                ele_3, 
+                                                read_name, 
+                                                candidate["INV"], 
+                                                SV_size)
+                            else:
+                                # +--/-++
+                                analysis_inv(ele_1, 
+                                                ele_2, 
+                                                read_name, 
+                                                candidate["INV"], 
+                                                SV_size)
+
+                    if ele_1[5] == ele_3[5] and ele_1[5] == ele_2[5]:
+                        # dup & ins & del 
+                        if ele_1[5] == '-':
+                            ele_1 = [RLength-SP_list[a+2][1], RLength-SP_list[a+2][0]]+SP_list[a+2][2:]
+                            ele_2 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
+                            ele_3 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
+                            query = query[::-1]
+
+                        if ele_2[3] - ele_3[2] >= SV_size and ele_2[2] < ele_3[3]:
+                            candidate["DUP"].append((ele_3[2], 
+                                                ele_2[3], 
+                                                read_name,
+                                                "DUP",
+                                                ele_2[4]))
+
+                        if a == 0:
+                            if ele_1[3] - ele_2[2] >= SV_size:
+                                candidate["DUP"].append((ele_2[2], 
+                                                    ele_1[3], 
+                                                    read_name,
+                                                    "DUP",
+                                                    ele_2[4]))
+
+                        delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                if ele_3[2] >= ele_2[3]:
+                                    candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                                        delta_length, 
+                                                        read_name,
+                                                        str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                                        "INS",
+                                                        ele_2[4]))
+                        delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                if ele_3[2] >= ele_2[3]:
+                                    candidate["DEL"].append((ele_1[3], 
+                                                        delta_length, 
+                                                        read_name,
+                                                        "DEL",
+                                                        ele_2[4]))
+                        
+                        if len(SP_list) - 3 == a:
+                            ele_1 = ele_2
+                            ele_2 = ele_3
+
+                            delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                            if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                                if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                    candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                                        delta_length, 
+                                                        read_name,
+                                                        str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                                        "INS",
+                                                        ele_2[4]))
+
+                            delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                            if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3] >= SV_size:
+                                if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                    candidate["DEL"].append((ele_1[3], 
+                                                        delta_length, 
+                                                        read_name,
+                                                        "DEL",
+                                                        ele_2[4]))
+
+                    if len(SP_list) - 3 == a and ele_1[5] != ele_2[5] and ele_2[5] == ele_3[5]:
+                        ele_1 = ele_2
+                        ele_2 = ele_3
+                        ele_3 = None
+                    if ele_3 == None or (ele_1[5] == ele_2[5] and ele_2[5] != ele_3[5]):
+                        if ele_1[5] == '-':
+                            ele_1 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
+                            ele_2 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
+                            query = query[::-1]
+                        delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                                    delta_length, 
+                                                    read_name,
+                                                    str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                                    "INS",
+                                                    ele_2[4]))
+
+                        delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                candidate["DEL"].append((ele_1[3], 
+                                                    delta_length, 
+                                                    read_name,
+                                                    "DEL",
+                                                    ele_2[4]))
+
+            else:
+                trigger_INS_TRA = 1
+                analysis_bnd(ele_1, ele_2, read_name, candidate["TRA"])
+
+                if len(SP_list) - 3 == a:
+                    if ele_2[4] != ele_3[4]:
+                        analysis_bnd(ele_2, ele_3, read_name, candidate["TRA"])
+
+    if len(SP_list) >= 3 and trigger_INS_TRA == 1:
+        if SP_list[0][4] == SP_list[-1][4]:
+            if SP_list[0][5] != SP_list[-1][5]:
+                pass
+            else:
+                if SP_list[0][5] == '+':
+                    ele_1 = SP_list[0]
+                    ele_2 = SP_list[-1]
+                else:
+                    ele_1 = [RLength-SP_list[-1][1], RLength-SP_list[-1][0]]+SP_list[-1][2:]
+                    ele_2 = [RLength-SP_list[0][1],RLength-SP_list[0][0]]+SP_list[0][2:]
+                    query = query[::-1]
+                dis_ref = ele_2[2] - ele_1[3]
+                dis_read = ele_2[0] - ele_1[1]
+                if dis_ref < 100 and dis_read - dis_ref >= SV_size and (dis_read - dis_ref <= MaxSize or MaxSize == -1):
+                    candidate["INS"].append((min(ele_2[2], ele_1[3]), 
+                                        dis_read - dis_ref, 
+                                        read_name,
+                                        str(query[ele_1[1]+int(dis_ref/2):ele_2[0]-int(dis_ref/2)]),
+                                        "INS",
+                                        ele_2[4]))	
+
+                if dis_ref <= -SV_size:
+                    candidate["DUP"].append((ele_2[2], 
+                                        ele_1[3], 
+                                        read_name,
+                                        "DUP",
+                                        ele_2[4]))
@@ -0,0 +1,262 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pysam
+
+from online.fastq import write_fastq
+
+try:
+    import mappy
+except ImportError:
+    mappy = None
+
+# reads handed to the mappy thread pool at once, per thread
+CHUNK_READS = 512
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
+
+class AlignmentError(Exception):
+    pass
+
+
+def reverse_complement(seq):
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+class Minimap2Aligner():
+    """
+    Launches minimap2 piped into samtools sort for every FASTQ, so the
+    index is reloaded from disk on each call. Reads are fed through stdin.
+    """
+    name = "minimap2"
+
+    def __init__(self, mmi_path, platform, threads):
+        self.mmi_path = mmi_path
+        self.platform = platform
+        self.threads = threads
+
+    def align_to_bam(self, reads, bam_path, threads=None):
+        """
+        Align and sort into bam_path. Returns the seconds spent until
+        minimap2 finished ("align") and until the sort finished ("sort").
+        """
+        threads = threads or self.threads
+        start = time.time()
+        aligner = subprocess.Popen(['minimap2', '-t', str(threads), '-ax', self.platform, self.mmi_path, '-'],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        sorter = subprocess.Popen(['samtools', 'sort', '-o', bam_path], stdin=aligner.stdout)
+        # only samtools reads the alignments, so it sees EOF when minimap2 exits
+        aligner.stdout.close()
+        try:
+            write_fastq(reads, aligner.stdin)
+        except BrokenPipeError:
+            # minimap2 exited early, its exit code is checked below
+            pass
+        except BaseException:
+            # e.g. an unreadable fastq: nobody would ever close stdin, stop both processes
+            for proc in (aligner, sorter):
+                proc.kill()
+                proc.wait()
+            raise
+        finally:
+            try:
+                aligner.stdin.close()
+            except BrokenPipeError:
+                pass
+        align_code = aligner.wait()
+        aligned = time.time()
+        sort_code = sorter.wait()
+        if align_code != 0:
+            raise AlignmentError(f"minimap2 exited with code {align_code}")
+        if sort_code != 0:
+            raise AlignmentError(f"samtools sort exited with code {sort_code}")
+        return {"align": aligned - start, "sort": time.time() - aligned}
+
+    def stream(self, reads, threads=None):
+        """
+        Return (header, records) where records iterates the SAM output of
+        minimap2 as it is produced, without sorting or touching the disk.
+        """
+        threads = threads or self.threads
+        proc = subprocess.Popen(['minimap2', '-t', str(threads), '-ax', self.platform, self.mmi_path, '-'],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+        failure = list()
+
+        def feed():
+            try:
+                write_fastq(reads, proc.stdin)
+            except (BrokenPipeError, ValueError):
+                pass
+            except BaseException as e:
+                # minimap2 would wait for the rest of the reads forever
+                failure.append(e)
+                proc.kill()
+            finally:
+                try:
+                    proc.stdin.close()
+                except (BrokenPipeError, ValueError):
+                    pass
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            samfile = pysam.AlignmentFile(proc.stdout, "r")
+        except (OSError, ValueError) as e:
+            proc.kill()
+            proc.wait()
+            feeder.join()
+            if len(failure) != 0:
+                raise AlignmentError(f"failed to feed reads to minimap2: {failure[0]}") from failure[0]
+            raise AlignmentError(f"failed to read minimap2 output: {e}") from e
+
+        def records():
+            try:
+                yield from samfile
+            finally:
+                samfile.close()
+                proc.stdout.close()
+                returncode = proc.wait()
+                feeder.join()
+            if len(failure) != 0:
+                raise AlignmentError(f"failed to feed reads to minimap2: {failure[0]}") from failure[0]
+            if returncode != 0:
+                raise AlignmentError(f"minimap2 exited with code {returncode}")
+        return samfile.header, records()
+
+
+class MappyAligner():
+    """
+    Keeps the minimap2 index resident in the owning process through mappy,
+    so each FASTQ only pays for the alignment itself. Processes forked after
+    the index is loaded share its pages copy-on-write.
+    """
+    name = "mappy"
+
+    def __init__(self, mmi_path, reference, platform, threads):
+        self.threads = threads
+        self.aligner = mappy.Aligner(mmi_path, preset=platform, n_threads=threads)
+        if not self.aligner:
+            raise AlignmentError(f"failed to load minimap2 index {mmi_path}")
+        with pysam.FastaFile(reference) as fa_file:
+            references = list(fa_file.references)
+            lengths = list(fa_file.lengths)
+        self.header = pysam.AlignmentHeader.from_references(references, lengths)
+        self.tid = {name: i for i, name in enumerate(references)}
+        self.local = threading.local()
+
+    def map_read(self, read):
+        """
+        Align one (name, seq, qual) record and return its primary and
+        supplementary alignments as minimap2 -a would write them.
+        Secondary and unmapped records are dropped since cuteSV ignores them.
+        """
+        name, seq, qual = read
+        buf = getattr(self.local, "buf", None)
+        if buf is None:
+            buf = self.local.buf = mappy.ThreadBuffer()
+        hits = [hit for hit in self.aligner.map(seq, buf=buf) if hit.is_primary]
+        if len(hits) == 0:
+            return []
+        length = len(seq)
+        clips = []
+        sa_items = []
+        for hit in hits:
+            if hit.strand == 1:
+                clip = (hit.q_st, length - hit.q_en)
+            else:
+                clip = (length - hit.q_en, hit.q_st)
+            clips.append(clip)
+            sa_cigar = "%s%s%s"%("%dS"%clip[0] if clip[0] else "", hit.cigar_str, "%dS"%clip[1] if clip[1] else "")
+            sa_items.append("%s,%d,%s,%s,%d,%d;"%(hit.ctg, hit.r_st + 1, '+' if hit.strand == 1 else '-', sa_cigar, hit.mapq, hit.NM))
+        rc_seq = None
+        records = []
+        for i, hit in enumerate(hits):
+            supplementary = i > 0
+            record = pysam.AlignedSegment(self.header)
+            record.query_name = name
+            record.flag = (16 if hit.strand == -1 else 0) | (2048 if supplementary else 0)
+            record.reference_id = self.tid[hit.ctg]
+            record.reference_start = hit.r_st
+            record.mapping_quality = hit.mapq
+            if hit.strand == 1:
+                read_seq, read_qual = seq, qual
+            else:
+                if rc_seq is None:
+                    rc_seq = reverse_complement(seq)
+                read_seq, read_qual = rc_seq, qual[::-1] if qual else qual
+            clip_op = 5 if supplementary else 4
+            cigar = [(op, oplen) for oplen, op in hit.cigar]
+            if clips[i][0]:
+                cigar.insert(0, (clip_op, clips[i][0]))
+            if clips[i][1]:
+                cigar.append((clip_op, clips[i][1]))
+            if supplementary:
+                # minimap2 hard clips supplementary alignments
+                read_seq = read_seq[clips[i][0]:length - clips[i][1]]
+                read_qual = read_qual[clips[i][0]:length - clips[i][1]] if read_qual else read_qual
+            record.query_sequence = read_seq
+            if read_qual:
+                record.query_qualities = pysam.qualitystring_to_array(read_qual)
+            record.cigartuples = cigar
+            record.set_tag("NM", hit.NM)
+            if len(hits) > 1:
+                record.set_tag("SA", "".join(sa_items[:i] + sa_items[i+1:]))
+            records.append(record)
+        return records
+
+    def iter_mapped(self, reads, threads=None):
+        threads = threads or self.threads
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            chunk = []
+            for read in reads:
+                chunk.append(read)
+                if len(chunk) >= CHUNK_READS * threads:
+                    yield from executor.map(self.map_read, chunk)
+                    chunk = []
+            if len(chunk) != 0:
+                yield from executor.map(self.map_read, chunk)
+
+    def stream(self, reads, threads=None):
+        records = (record for records in self.iter_mapped(reads, threads) for record in records)
+        return self.header, records
+
+    def align_to_bam(self, reads, bam_path, threads=None):
+        threads = threads or self.threads
+        unsorted_path = f"{bam_path}.unsorted"
+        start = time.time()
+        try:
+            with pysam.AlignmentFile(unsorted_path, "wb", header=self.header) as out:
+                for records in self.iter_mapped(reads, threads):
+                    for record in records:
+                        out.write(record)
+            aligned = time.time()
+            pysam.sort("-@", str(threads), "-o", bam_path, unsorted_path)
+            return {"align": aligned - start, "sort": time.time() - aligned}
+        except (OSError, ValueError, KeyError, pysam.utils.SamtoolsError) as e:
+            raise AlignmentError(str(e)) from e
+        finally:
+            if os.path.exists(unsorted_path):
+                os.remove(unsorted_path)
+
+
+def build_aligner(backend, mmi_path, reference, platform, threads):
+    """
+    Create the alignment backend. mappy falls back to the minimap2
+    subprocess when it is not installed or cannot load the index.
+    """
+    if backend == "mappy":
+        if mappy is None:
+            logging.warning("mappy is not installed, falling back to the minimap2 subprocess backend.")
+        else:
+            try:
+                start = time.time()
+                aligner = MappyAligner(mmi_path, reference, platform, threads)
+                logging.info("Loaded minimap2 index %s into mappy in %0.2f seconds."%(mmi_path, time.time() - start))
+                return aligner
+            except AlignmentError as e:
+                logging.warning(f"{e}, falling back to the minimap2 subprocess backend.")
+    return Minimap2Aligner(mmi_path, platform, threads)
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import sys
-import bisect
 import gzip
+import os
+import pickle
+
+import numpy as np
 
 def parse_info(info):
     """
@@ -78,20 +81,84 @@ def load_highfreq_file(highfreq_file, af_threshold, mode):
         highfreq[chrom].sort(key=lambda x: x[0])
     return total_hight_variants,highfreq
 
-def compare_vcf_highfreq_mapping(vcf_file, highfreq_file, output_file, af_threshold, mode,
-                                 pos_tolerance=1000, length_lower_ratio=0.9, length_upper_ratio=1.1):
-    # 加载高频变异数据
-    total_hight_variants,highfreq_data = load_highfreq_file(highfreq_file, af_threshold, mode)
-    # 对于每个染色体构建位置列表（用于二分查找）
-    highfreq_positions = {}
+# version of the target index layout, bumped on changes to invalidate disk caches
+TARGET_INDEX_VERSION = 1
+# target indexes kept in memory: {cache key: (total, index)}
+_target_indexes = {}
+# incremental evaluation state: {mapping file: calls of the last snapshot and the targets they hit}
+_recall_states = {}
+
+
+def build_target_index(highfreq_data):
+    """
+    Turn the result of load_highfreq_file into compact arrays per chromosome,
+    {chrom: {"pos", "svlen", "abs_svlen", "type", "id", "af"}}, sorted by POS.
+    type is the index of the SVTYPE in the "types" list; records with ID "."
+    are named chrom_pos_type_len.
+    """
+    types = []
+    type_code = {}
+    index = {"types": types, "chroms": {}}
     for chrom, records in highfreq_data.items():
-        positions = [rec[0] for rec in records]
-        highfreq_positions[chrom] = positions
-    
-    high_set = set()
-    with open(vcf_file, 'r') as fin, open(output_file, 'w') as fout:
-        # 写入映射关系文件的表头
-        fout.write("CHROM\tInput_VCF_ID\tInput_VCF_POS\tInput_VCF_SVLEN\tHighfreq_ID\tPOS\tSVLEN\tAF\n")
+        codes = []
+        for rec in records:
+            if rec[2] not in type_code:
+                type_code[rec[2]] = len(types)
+                types.append(rec[2])
+            codes.append(type_code[rec[2]])
+        svlen = np.array([rec[3] for rec in records], dtype=np.int64)
+        index["chroms"][chrom] = {
+            "pos": np.array([rec[0] for rec in records], dtype=np.int64),
+            "svlen": svlen,
+            "abs_svlen": np.abs(svlen),
+            "type": np.array(codes, dtype=np.int16),
+            "id": [rec[1] if rec[1] != "." else f'{chrom}_{rec[0]}_{rec[2]}_{rec[3]}' for rec in records],
+            "af": [rec[4] for rec in records] if len(records) != 0 and len(records[0]) > 4 else None,
+        }
+    return index
+
+
+def target_index_key(highfreq_file, af_threshold, mode):
+    stat = os.stat(highfreq_file)
+    return (os.path.abspath(highfreq_file), stat.st_mtime_ns, stat.st_size, af_threshold, mode, TARGET_INDEX_VERSION)
+
+
+def load_target_index(highfreq_file, af_threshold, mode, cache_dir=None):
+    """
+    Parse the target set once per session: look in memory first, then in a
+    disk cache keyed by the file's mtime and size, sv_freq and mode, and only
+    parse the VCF again when both miss.
+    """
+    key = target_index_key(highfreq_file, af_threshold, mode)
+    if key in _target_indexes:
+        return _target_indexes[key]
+    cache_path = os.path.join(cache_dir, "target_index.pickle") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_key, cached = pickle.load(f)
+            if cached_key == key:
+                _target_indexes[key] = cached
+                return cached
+        except (EOFError, pickle.UnpicklingError):
+            pass
+    total_hight_variants, highfreq_data = load_highfreq_file(highfreq_file, af_threshold, mode)
+    result = (total_hight_variants, build_target_index(highfreq_data))
+    if cache_path:
+        with open(cache_path + ".tmp", 'wb') as f:
+            pickle.dump((key, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".tmp", cache_path)
+    _target_indexes[key] = result
+    return result
+
+
+def load_calls(vcf_file):
+    """
+    Read the VCF to evaluate, returns [(chrom, input_id, pos, svtype, svlen)]
+    in file order.
+    """
+    calls = []
+    with open(vcf_file, 'r') as fin:
         for line in fin:
             if line.startswith('#'):
                 continue
@@ -106,51 +173,195 @@ def compare_vcf_highfreq_mapping(vcf_file, highfreq_file, output_file, af_thresh
                 pos = int(parts[1])
             except ValueError:
                 continue
-            input_id = parts[2]
-            info_field = parts[7]
-            info_dict = parse_info(info_field)
-            svtype = info_dict.get('SVTYPE', '')
+            info_dict = parse_info(parts[7])
             try:
                 svlen = int(info_dict.get('SVLEN', '0'))
             except ValueError:
                 svlen = 0
-            abs_svlen = abs(svlen)
-            
-            # 若当前染色体在高频数据中存在候选
-            if chrom in highfreq_data:
-                pos_list = highfreq_positions[chrom]
-                records_list = highfreq_data[chrom]
-                # 利用二分查找确定候选记录的起始位置
-                left_index = bisect.bisect_left(pos_list, pos - pos_tolerance)
-                for i in range(left_index, len(records_list)):
-                    if mode == 2:
-                        candidate_pos, candidate_id, candidate_svtype, candidate_svlen, af = records_list[i]
-                    else:
-                        candidate_pos, candidate_id, candidate_svtype, candidate_svlen = records_list[i]
-                    if candidate_pos > pos + pos_tolerance:
-                        break
-                    if svtype != candidate_svtype:
-                        continue
-                    candidate_abs_svlen = abs(candidate_svlen)
-                    lower_bound = length_lower_ratio * candidate_abs_svlen
-                    upper_bound = length_upper_ratio * candidate_abs_svlen
-                    if lower_bound <= abs_svlen <= upper_bound:
-                        if candidate_id == ".":
-                            candidate_id = f'{chrom}_{candidate_pos}_{candidate_svtype}_{candidate_svlen}'
-                        high_set.add(candidate_id)
-                        if mode == 2:
-                            fout.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(chrom, input_id, pos, svlen, candidate_id, candidate_pos, candidate_svlen, af))
-                        else:
-                            fout.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(chrom, input_id, pos, svlen, candidate_id, candidate_pos, candidate_svlen))
-                        # mapping_lines += 1
-            # if candidate_found:
-                # variants_with_match += 1
+            calls.append((chrom, parts[2], pos, info_dict.get('SVTYPE', ''), svlen))
+    return calls
+
+
+def match_calls(calls, target_index, pos_tolerance, length_lower_ratio, length_upper_ratio):
+    """
+    Batch matching: the [pos-tol, pos+tol] windows of all calls of a
+    chromosome come from one searchsorted, are expanded into (call,
+    candidate) pairs and filtered with SVTYPE and length ratio masks.
+    Returns [(call index, chrom, candidate index)] sorted by call and
+    candidate index, the order of the former per-call bisect loop.
+    """
+    type_code = {svtype: code for code, svtype in enumerate(target_index["types"])}
+    targets = target_index["chroms"]
+    by_chrom = {}
+    for call_idx, (chrom, input_id, pos, svtype, svlen) in enumerate(calls):
+        if chrom in targets and svtype in type_code:
+            if chrom not in by_chrom:
+                by_chrom[chrom] = ([], [], [], [])
+            by_chrom[chrom][0].append(call_idx)
+            by_chrom[chrom][1].append(pos)
+            by_chrom[chrom][2].append(abs(svlen))
+            by_chrom[chrom][3].append(type_code[svtype])
+
+    matched_calls = []
+    matched_chroms = []
+    matched_targets = []
+    for chrom, (call_idx, pos, abs_svlen, code) in by_chrom.items():
+        target = targets[chrom]
+        call_idx = np.array(call_idx, dtype=np.int64)
+        pos = np.array(pos, dtype=np.int64)
+        left = np.searchsorted(target["pos"], pos - pos_tolerance, side='left')
+        right = np.searchsorted(target["pos"], pos + pos_tolerance, side='right')
+        counts = right - left
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        # expand the candidate window of every call
+        pair_call = np.repeat(np.arange(len(pos)), counts)
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        pair_target = np.repeat(left, counts) + np.arange(total) - offsets
+        call_abs_svlen = np.array(abs_svlen, dtype=np.int64)[pair_call]
+        candidate_abs_svlen = target["abs_svlen"][pair_target]
+        mask = (target["type"][pair_target] == np.array(code, dtype=np.int16)[pair_call]) \
+            & (length_lower_ratio * candidate_abs_svlen <= call_abs_svlen) \
+            & (call_abs_svlen <= length_upper_ratio * candidate_abs_svlen)
+        matched_calls.append(call_idx[pair_call[mask]])
+        matched_targets.append(pair_target[mask])
+        matched_chroms.extend([chrom] * int(mask.sum()))
+    if len(matched_calls) == 0:
+        return []
+    matched_calls = np.concatenate(matched_calls)
+    matched_targets = np.concatenate(matched_targets)
+    order = np.lexsort((matched_targets, matched_calls))
+    return [(call_idx, matched_chroms[i], target_idx) for call_idx, i, target_idx in
+            zip(matched_calls[order].tolist(), order.tolist(), matched_targets[order].tolist())]
+
+
+def compare_vcf_highfreq_mapping(vcf_file, highfreq_file, output_file, af_threshold, mode,
+                                 pos_tolerance=1000, length_lower_ratio=0.9, length_upper_ratio=1.1, cache_dir=None):
+    # load the high-frequency variants (kept in memory / cached on disk)
+    total_hight_variants, target_index = load_target_index(highfreq_file, af_threshold, mode, cache_dir)
+    calls = load_calls(vcf_file)
+    matches = match_calls(calls, target_index, pos_tolerance, length_lower_ratio, length_upper_ratio)
+
+    high_set = set()
+    with open(output_file, 'w') as fout:
+        # 写入映射关系文件的表头
+        fout.write("CHROM\tInput_VCF_ID\tInput_VCF_POS\tInput_VCF_SVLEN\tHighfreq_ID\tPOS\tSVLEN\tAF\n")
+        for call_idx, chrom, i in matches:
+            target = target_index["chroms"][chrom]
+            chrom, input_id, pos, svtype, svlen = calls[call_idx]
+            candidate_id = target["id"][i]
+            high_set.add(candidate_id)
+            if mode == 2:
+                fout.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(chrom, input_id, pos, svlen, candidate_id, target["pos"][i], target["svlen"][i], target["af"][i]))
+            else:
+                fout.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(chrom, input_id, pos, svlen, candidate_id, target["pos"][i], target["svlen"][i]))
 
         detection_rate = (len(high_set) / total_hight_variants * 100) if total_hight_variants > 0 else 0
         print("Detection number: {}, Total high-frequency variance: {}, Detection rate: {:.2f}%\n".format(len(high_set), total_hight_variants, detection_rate))
         fout.write("Detection number: {}, Total high-frequency variance: {}, Detection rate: {:.2f}%\n".format(len(high_set), total_hight_variants, detection_rate))
     return detection_rate
 
+def recall_state_path(output_file):
+    return output_file + ".state.pickle"
+
+
+def load_recall_state(output_file):
+    """
+    Load the incremental evaluation state saved next to the mapping file.
+    The mapping file is truncated to its length when the state was saved,
+    dropping an append that did not finish; returns None when the state is
+    missing or does not fit the mapping file.
+    """
+    state_path = recall_state_path(output_file)
+    if not os.path.exists(state_path) or not os.path.exists(output_file):
+        return None
+    try:
+        with open(state_path, 'rb') as f:
+            state = pickle.load(f)
+    except (EOFError, pickle.UnpicklingError):
+        return None
+    if os.path.getsize(output_file) < state["size"]:
+        return None
+    os.truncate(output_file, state["size"])
+    return state
+
+
+def save_recall_state(output_file, state):
+    state["size"] = os.path.getsize(output_file)
+    state_path = recall_state_path(output_file)
+    with open(state_path + ".tmp", 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def update_vcf_highfreq_mapping(vcf_file, highfreq_file, output_file, af_threshold, mode,
+                                pos_tolerance=1000, length_lower_ratio=0.9, length_upper_ratio=1.1, cache_dir=None):
+    """
+    Incremental version of compare_vcf_highfreq_mapping. Keeps the calls of
+    the last snapshot (keyed by chrom, pos, svtype, svlen) and how many calls
+    hit every target, matches only the new calls and retracts the calls that
+    are gone. Only the changes are appended to the mapping file: new
+    mappings as usual, retracted ones prefixed with "-", and every snapshot
+    ends with a Detection number line. The state stays in memory and is
+    saved next to the mapping file (<mapping file>.state.pickle), so another
+    process can carry on. Returns (detection_rate, stats).
+    """
+    total_hight_variants, target_index = load_target_index(highfreq_file, af_threshold, mode, cache_dir)
+    key = (target_index_key(highfreq_file, af_threshold, mode), pos_tolerance, length_lower_ratio, length_upper_ratio)
+    state = _recall_states.get(output_file)
+    if state is None:
+        # state left by another process, e.g. the main process taking the final snapshot
+        state = load_recall_state(output_file)
+    if state is None or state["key"] != key:
+        # first snapshot or changed parameters: evaluate from scratch and rewrite the mapping file
+        state = {"key": key, "calls": {}, "refcount": {}}
+        with open(output_file, 'w') as fout:
+            fout.write("CHROM\tInput_VCF_ID\tInput_VCF_POS\tInput_VCF_SVLEN\tHighfreq_ID\tPOS\tSVLEN\tAF\n")
+    _recall_states[output_file] = state
+
+    current = dict()
+    for call in load_calls(vcf_file):
+        call_key = (call[0], call[2], call[3], call[4])
+        if call_key not in current:
+            current[call_key] = call
+    added = [call for call_key, call in current.items() if call_key not in state["calls"]]
+    removed = [call_key for call_key in state["calls"] if call_key not in current]
+    matches = match_calls(added, target_index, pos_tolerance, length_lower_ratio, length_upper_ratio)
+
+    refcount = state["refcount"]
+    with open(output_file, 'a') as fout:
+        for call_key in removed:
+            lines, target_ids = state["calls"].pop(call_key)
+            for line in lines:
+                fout.write("-" + line)
+            for candidate_id in target_ids:
+                refcount[candidate_id] -= 1
+                if refcount[candidate_id] == 0:
+                    del refcount[candidate_id]
+        for call in added:
+            state["calls"][(call[0], call[2], call[3], call[4])] = ([], [])
+        for call_idx, chrom, i in matches:
+            target = target_index["chroms"][chrom]
+            chrom, input_id, pos, svtype, svlen = added[call_idx]
+            candidate_id = target["id"][i]
+            if mode == 2:
+                line = "{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(chrom, input_id, pos, svlen, candidate_id, target["pos"][i], target["svlen"][i], target["af"][i])
+            else:
+                line = "{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(chrom, input_id, pos, svlen, candidate_id, target["pos"][i], target["svlen"][i])
+            lines, target_ids = state["calls"][(chrom, pos, svtype, svlen)]
+            lines.append(line)
+            target_ids.append(candidate_id)
+            refcount[candidate_id] = refcount.get(candidate_id, 0) + 1
+            fout.write(line)
+
+        detection_rate = (len(refcount) / total_hight_variants * 100) if total_hight_variants > 0 else 0
+        print("Detection number: {}, Total high-frequency variance: {}, Detection rate: {:.2f}%\n".format(len(refcount), total_hight_variants, detection_rate))
+        fout.write("Detection number: {}, Total high-frequency variance: {}, Detection rate: {:.2f}%\n".format(len(refcount), total_hight_variants, detection_rate))
+    save_recall_state(output_file, state)
+    stats = {"detected": len(refcount), "calls": len(current), "added": len(added), "removed": len(removed)}
+    return detection_rate, stats
+
 if __name__ == '__main__':
     if len(sys.argv) != 5:
         print("用法: {} <input_vcf> <target_vcf> <result_txt> <af_threshold>".format(sys.argv[0]))
@@ -0,0 +1,82 @@
+import os
+import pickle
+
+'''
+ * Changes between two snapshots of a sample.
+ * The records of the last snapshot are kept in <work_dir>snapshot_calls.pickle
+ * by their stable ID (cuteSV --stable_id). Every new snapshot writes a delta
+ * VCF next to its full VCF with the records that are new, changed or gone,
+ * marked by the DELTA INFO field; retracted records are the ones of the
+ * previous snapshot.
+'''
+
+NEW = "NEW"
+UPDATED = "UPDATED"
+RETRACTED = "RETRACTED"
+DELTA_HEADER = '##INFO=<ID=DELTA,Number=1,Type=String,Description="Change since the previous snapshot: NEW, UPDATED or RETRACTED">\n'
+
+
+def load_snapshot(vcf_path):
+    """Header lines and {ID: record} of a snapshot VCF."""
+    header = list()
+    records = dict()
+    with open(vcf_path, 'r') as f:
+        for line in f:
+            if line.startswith('#'):
+                header.append(line)
+                continue
+            records[line.split('\t', 3)[2]] = line
+    return header, records
+
+
+def with_delta(record, change):
+    fields = record.rstrip('\n').split('\t')
+    fields[7] = f"{fields[7]};DELTA={change}"
+    return '\t'.join(fields) + '\n'
+
+
+def record_order(header):
+    # records follow the contig order of the header, then the position
+    contigs = [line[len("##contig=<ID="):].split(',', 1)[0] for line in header if line.startswith("##contig=<ID=")]
+    rank = {contig: i for i, contig in enumerate(contigs)}
+    return lambda record: (rank.get(record.split('\t', 1)[0], len(rank)), record.split('\t', 1)[0], int(record.split('\t', 2)[1]))
+
+
+def write_delta(vcf_path, delta_path, state_path):
+    """
+    Write the delta of vcf_path against the previous snapshot of the sample
+    to delta_path and make vcf_path the previous snapshot. Returns the
+    number of new, updated and retracted records.
+    """
+    previous = dict()
+    if os.path.exists(state_path):
+        with open(state_path, 'rb') as f:
+            previous = pickle.load(f)
+    header, records = load_snapshot(vcf_path)
+    changes = list()
+    counts = {NEW: 0, UPDATED: 0, RETRACTED: 0}
+    for svid, record in records.items():
+        if svid not in previous:
+            change = NEW
+        elif previous[svid] != record:
+            change = UPDATED
+        else:
+            continue
+        counts[change] += 1
+        changes.append(with_delta(record, change))
+    for svid, record in previous.items():
+        if svid not in records:
+            counts[RETRACTED] += 1
+            changes.append(with_delta(record, RETRACTED))
+    changes.sort(key=record_order(header))
+    with open(delta_path + ".tmp", 'w') as f:
+        # the DELTA field is declared with the other INFO fields, before #CHROM
+        f.writelines(header[:-1])
+        f.write(DELTA_HEADER)
+        f.writelines(header[-1:])
+        f.writelines(changes)
+    os.replace(delta_path + ".tmp", delta_path)
+    with open(state_path + ".tmp", 'wb') as f:
+        pickle.dump(records, f)
+    os.replace(state_path + ".tmp", state_path)
+    return counts
@@ -0,0 +1,96 @@
+import gzip
+import logging
+import os
+
+
+def open_fastq(fq_path):
+    if fq_path.endswith('.gz'):
+        return gzip.open(fq_path, 'rt', encoding='utf-8', errors='replace')
+    return open(fq_path, 'r', encoding='utf-8', errors='replace')
+
+
+class FastqValidator():
+    """
+    Streams (name, seq, qual) records out of a fastq, one record in memory
+    at a time. Records may span several sequence and quality lines. Anything
+    that does not form a valid record is copied to quarantine_path (created
+    on the first bad record) and parsing resumes at the next '@' line.
+    """
+
+    def __init__(self, fq_path, quarantine_path):
+        self.fq_path = fq_path
+        self.quarantine_path = quarantine_path
+        self.quarantine = None
+        self.records = 0
+        self.bases = 0
+        self.quarantined = 0
+
+    def reject(self, lines):
+        if self.quarantine is None:
+            os.makedirs(os.path.dirname(self.quarantine_path), exist_ok=True)
+            self.quarantine = open(self.quarantine_path, 'w')
+        self.quarantine.writelines(lines)
+        self.quarantined += 1
+
+    def __iter__(self):
+        try:
+            with open_fastq(self.fq_path) as f:
+                line = f.readline()
+                while line:
+                    if not line.startswith('@'):
+                        skipped = [line]
+                        line = f.readline()
+                        while line and not line.startswith('@'):
+                            skipped.append(line)
+                            line = f.readline()
+                        self.reject(skipped)
+                        continue
+                    record = [line]
+                    name = line[1:].split(None, 1)[0] if len(line) > 1 else ""
+                    seq = list()
+                    # sequence lines up to the '+' separator
+                    line = f.readline()
+                    while line and not line.startswith('+') and not line.startswith('@'):
+                        record.append(line)
+                        seq.append(line.strip())
+                        line = f.readline()
+                    if not line.startswith('+') or name == "":
+                        # a new header or EOF before the separator
+                        self.reject(record)
+                        continue
+                    record.append(line)
+                    seq = "".join(seq)
+                    qual = list()
+                    qual_len = 0
+                    # quality lines until they cover the sequence; '@' is a valid quality
+                    # character, so an '@' line is only taken as the next header when it
+                    # would overrun the sequence length
+                    line = f.readline()
+                    while line and qual_len < len(seq):
+                        if line.startswith('@') and qual_len + len(line.strip()) > len(seq):
+                            break
+                        record.append(line)
+                        qual.append(line.strip())
+                        qual_len += len(qual[-1])
+                        line = f.readline()
+                    if qual_len != len(seq) or len(seq) == 0:
+                        self.reject(record)
+                        continue
+                    self.records += 1
+                    self.bases += len(seq)
+                    yield name, seq, "".join(qual)
+        except (OSError, EOFError) as e:
+            # truncated or corrupt compressed stream, keep what was read so far
+            logging.warning(f"{self.fq_path}: {e}")
+            self.reject([f"# unreadable from here: {e}\n"])
+        finally:
+            if self.quarantine is not None:
+                self.quarantine.close()
+                self.quarantine = None
+            if self.quarantined != 0:
+                logging.warning(f"{self.fq_path}: {self.quarantined} malformed records moved to {self.quarantine_path}")
+
+
+def write_fastq(reads, handle):
+    for name, seq, qual in reads:
+        handle.write(f"@{name}\n{seq}\n+\n{qual}\n".encode())
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+import numpy as np
+
+# snapshots needed before the curve is trusted
+MIN_POINTS = 3
+# snapshots used to estimate the sequencing throughput
+THROUGHPUT_WINDOW = 5
+
+
+def load_history(history_path):
+    """
+    (depth, detect_rate, bases, time) rows of depth_performance_rate.txt.
+    Rows written before bases and time were recorded are skipped.
+    """
+    history = []
+    if not os.path.exists(history_path):
+        return history
+    with open(history_path, 'r') as f:
+        for line in f:
+            parts = line.strip().split(',')
+            if len(parts) < 8:
+                continue
+            try:
+                history.append((float(parts[0]), float(parts[1]), float(parts[6]), float(parts[7])))
+            except ValueError:
+                continue
+    return history
+
+
+def fit_saturation(depths, rates):
+    """
+    Least squares fit of rate = rmax * depth / (k + depth). For a fixed k the
+    best rmax has a closed form, so k is searched on a log grid that is then
+    refined around the best point. Returns (rmax, k) or None.
+    """
+    depths = np.asarray(depths, dtype=np.float64)
+    rates = np.asarray(rates, dtype=np.float64)
+    keep = depths > 0
+    depths = depths[keep]
+    rates = rates[keep]
+    if len(depths) < MIN_POINTS or rates.max() <= 0:
+        return None
+    best = None
+    low, high = np.log10(depths.min() / 100), np.log10(depths.max() * 100)
+    for _ in range(3):
+        ks = np.logspace(low, high, 200)
+        x = depths[None, :] / (ks[:, None] + depths[None, :])
+        rmax = (x * rates).sum(axis=1) / (x * x).sum(axis=1)
+        error = ((rmax[:, None] * x - rates) ** 2).sum(axis=1)
+        i = int(np.argmin(error))
+        best = (float(rmax[i]), float(ks[i]))
+        step = (high - low) / 199
+        low, high = np.log10(ks[i]) - step, np.log10(ks[i]) + step
+    return best
+
+
+def depth_for_rate(fit, target_rate):
+    rmax, k = fit
+    if target_rate <= 0:
+        return 0.0
+    if target_rate >= rmax:
+        return float('inf')
+    return k * target_rate / (rmax - target_rate)
+
+
+def forecast(history, target_rate):
+    """
+    Fit the detection rate history and project when target_rate is reached.
+    gain_per_gb is the slope of the curve at the current depth, in detection
+    rate points per extra gigabase sequenced.
+    """
+    if len(history) < MIN_POINTS:
+        return None
+    depths, rates, bases, times = (np.array(column) for column in zip(*history))
+    fit = fit_saturation(depths, rates)
+    if fit is None:
+        return None
+    rmax, k = fit
+    depth = float(depths[-1])
+    # depth gained per sequenced base, i.e. 1 / genome length
+    depth_per_base = depth / bases[-1] if bases[-1] > 0 else 0.0
+    gain_per_gb = rmax * k / (k + depth) ** 2 * depth_per_base * 1e9
+    target_depth = depth_for_rate(fit, target_rate)
+    recent = slice(-THROUGHPUT_WINDOW, None)
+    elapsed = times[recent][-1] - times[recent][0]
+    throughput = (bases[recent][-1] - bases[recent][0]) / elapsed if elapsed > 0 else 0.0
+    eta = None
+    if target_depth != float('inf') and throughput > 0 and depth_per_base > 0:
+        eta = max(0.0, (target_depth - depth) / depth_per_base / throughput)
+    return {
+        "time": time.time(),
+        "points": len(history),
+        "rmax": rmax,
+        "k": k,
+        "depth": depth,
+        "detect_rate": float(rates[-1]),
+        "target_rate": target_rate,
+        "target_depth": None if target_depth == float('inf') else target_depth,
+        "bases_per_second": float(throughput),
+        "eta_seconds": None if eta is None else float(eta),
+        "gain_per_gb": float(gain_per_gb),
+    }
+
+
+def write_forecast(work_dir, result):
+    forecast_path = f"{work_dir}forecast.json"
+    with open(forecast_path + ".tmp", "w") as f:
+        json.dump(result, f)
+    os.replace(forecast_path + ".tmp", forecast_path)
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+ALIGNED = "aligned"
+EXTRACTED = "extracted"
+CLUSTERED = "clustered"
+FAILED = "failed"
+STATES = (QUEUED, ALIGNED, EXTRACTED, CLUSTERED, FAILED)
+
+
+class TaskJournal():
+    """
+    State of every fastq of a run in an SQLite database in the work dir:
+    queued -> aligned -> extracted -> clustered, or failed, each with the
+    time it was reached, and the sample the file belongs to, plus the
+    number of snapshots taken of every sample. Every stage process and
+    thread opens its own connection, so the journal can be handed to
+    forked stage processes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS tasks ("
+                         "name TEXT PRIMARY KEY, sample TEXT NOT NULL DEFAULT '', state TEXT NOT NULL, "
+                         + ", ".join(f"{state}_at REAL" for state in STATES) + ")")
+            conn.execute("CREATE TABLE IF NOT EXISTS snapshots (sample TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+
+    def connect(self):
+        # a connection must not cross fork() or threads
+        if getattr(self.local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return self.local.conn
+
+    def add(self, names, sample=""):
+        """Register new files as queued, files already known keep their state."""
+        now = time.time()
+        with self.connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO tasks (name, sample, state, queued_at) VALUES (?, ?, ?, ?)",
+                             [(name, sample, QUEUED, now) for name in names])
+
+    def mark(self, names, state):
+        now = time.time()
+        with self.connect() as conn:
+            conn.executemany(f"UPDATE tasks SET state = ?, {state}_at = ? WHERE name = ?",
+                             [(state, now, name) for name in names])
+
+    def states(self):
+        """{name: (state, sample)} of every file of the run."""
+        return {name: (state, sample) for name, state, sample in self.connect().execute("SELECT name, state, sample FROM tasks")}
+
+    def samples(self):
+        return set(sample for sample, in self.connect().execute("SELECT DISTINCT sample FROM tasks"))
+
+    def next_snapshot(self, sample=""):
+        """Number the next snapshot of a sample: 1, 2, ... across restarts of the run."""
+        with self.connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO snapshots (sample, count) VALUES (?, 0)", (sample,))
+            conn.execute("UPDATE snapshots SET count = count + 1 WHERE sample = ?", (sample,))
+            return conn.execute("SELECT count FROM snapshots WHERE sample = ?", (sample,)).fetchone()[0]
+
+    def migrate(self, finished_path, task_list_path):
+        """
+        Import a work dir written before the journal existed: files listed
+        in finished.txt were extracted, the rest of all_task.txt was queued.
+        """
+        if os.path.exists(task_list_path):
+            with open(task_list_path, 'r') as f:
+                # all_task.txt also holds "end observer at ..." lines
+                self.add([line.strip() for line in f if line.strip() and " " not in line.strip()])
+        if os.path.exists(finished_path):
+            with open(finished_path, 'r') as f:
+                finished = [line.strip() for line in f if line.strip()]
+            self.add(finished)
+            self.mark(finished, EXTRACTED)
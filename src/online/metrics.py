@@ -0,0 +1,101 @@
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+'''
+ * Per-stage metrics of the online pipeline.
+ * Every stage process appends one JSON line per file to
+ * <work_dir>metrics.jsonl and rewrites <work_dir>metrics/<stage>_<pid>.prom
+ * in the Prometheus text exposition format, so the directory can be handed
+ * to the node_exporter textfile collector.
+'''
+
+PREFIX = "cutesv_ol"
+
+
+def peak_rss_bytes(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+@contextmanager
+def timed(timings, step):
+    start = time.time()
+    try:
+        yield
+    finally:
+        timings[step] = timings.get(step, 0.0) + time.time() - start
+
+
+class StageMetrics():
+
+    def __init__(self, work_dir, stage):
+        self.stage = stage
+        self.pid = os.getpid()
+        self.jsonl_path = f"{work_dir}metrics.jsonl"
+        self.prom_path = f"{work_dir}metrics/{stage}_{self.pid}.prom"
+        os.makedirs(os.path.dirname(self.prom_path), exist_ok=True)
+        self.files = 0
+        self.queue_wait = 0.0
+        self.seconds = dict()
+        self.reads = 0
+        self.bases = 0
+        self.reads_per_sec = 0.0
+
+    def record(self, task, queue_wait, timings, reads=0, bases=0, **extra):
+        # waiting for threads is not work on the file
+        busy = sum(seconds for step, seconds in timings.items() if step != "thread_wait")
+        reads_per_sec = reads / busy if busy > 0 else 0.0
+        entry = {
+            "time": time.time(),
+            "stage": self.stage,
+            "pid": self.pid,
+            "task": task,
+            "queue_wait": queue_wait,
+            "seconds": timings,
+            "reads": reads,
+            "bases": bases,
+            "reads_per_sec": reads_per_sec,
+            "peak_rss": peak_rss_bytes(),
+            "children_peak_rss": peak_rss_bytes(resource.RUSAGE_CHILDREN),
+        }
+        entry.update(extra)
+        # one write per line, appends from several processes do not interleave
+        with open(self.jsonl_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.files += 1
+        self.queue_wait += queue_wait
+        for step, seconds in timings.items():
+            self.seconds[step] = self.seconds.get(step, 0.0) + seconds
+        self.reads += reads
+        self.bases += bases
+        self.reads_per_sec = reads_per_sec
+        self.write_prom(entry)
+
+    def write_prom(self, entry):
+        labels = f'stage="{self.stage}",pid="{self.pid}"'
+        lines = list()
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for extra_labels, value in samples:
+                lines.append(f"{PREFIX}_{name}{{{labels}{extra_labels}}} {value}")
+
+        metric("files_total", "counter", "Files processed by the stage.", [("", self.files)])
+        metric("queue_wait_seconds_total", "counter", "Time files spent queued before the stage.", [("", self.queue_wait)])
+        metric("step_seconds_total", "counter", "Time spent in each step of the stage.",
+               [(f',step="{step}"', seconds) for step, seconds in sorted(self.seconds.items())])
+        metric("reads_total", "counter", "Reads processed by the stage.", [("", self.reads)])
+        metric("bases_total", "counter", "Bases processed by the stage.", [("", self.bases)])
+        metric("reads_per_second", "gauge", "Reads per second of the last file.", [("", self.reads_per_sec)])
+        metric("peak_rss_bytes", "gauge", "Peak resident set size of the stage process.", [("", entry["peak_rss"])])
+        metric("children_peak_rss_bytes", "gauge", "Peak resident set size of the stage's largest subprocess.", [("", entry["children_peak_rss"])])
+        metric("last_update_timestamp_seconds", "gauge", "Time of the last file processed by the stage.", [("", entry["time"])])
+        with open(self.prom_path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(self.prom_path + ".tmp", self.prom_path)
@@ -1,19 +1,35 @@
 import argparse
 import logging
-from pathlib import Path
 import os
 import multiprocessing
+import queue
+import re
+import shutil
+import signal
 import subprocess
 import sys
+import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import time
 import json
-import datetime
-from online.compare_model import compare_vcf_highfreq_mapping
+from online.compare_model import update_vcf_highfreq_mapping
+from online.delta import write_delta
+from online.forecast import forecast, load_history, write_forecast
+from online.aligner import build_aligner, AlignmentError
+from online.scheduler import ThreadBudget, ALIGN, EXTRACT, CLUSTER
+from online.fastq import FastqValidator
+from online.readfilter import ReadIdFilter
+from online.metrics import StageMetrics, timed
+from online.journal import TaskJournal, QUEUED, ALIGNED, EXTRACTED, CLUSTERED, FAILED
+from cuteSV.cuteSV import stream_pipe, batch_coverage, mean_depth, update_coverage_summary
+from cuteSV.cuteSV_Description import parseArgs as parseCuteSVArgs
 import glob
-import gzip
-import pkg_resources
+
+# attempts to align one fastq before it is given up
+MAX_RETRIES = 3
+# seconds one mode 1 extraction may run before it is killed and counts as failed
+EXTRACT_TIMEOUT = 7200
 
 def parseArgs(argv):
     parser = argparse.ArgumentParser(prog="cuteSV_ONLINE", 
@@ -40,6 +56,17 @@ def parseArgs(argv):
 		type = str, 
 		help ="Minimizer index for the reference in minimap2.",
         default='')
+    parser.add_argument('--aligner', 
+		type = str, 
+		choices = ["mappy", "minimap2"],
+		help = "Alignment backend. mappy keeps the minimap2 index resident for the whole run, minimap2 launches a subprocess per fastq.",
+        default = "mappy")
+    parser.add_argument('--stream_sigs',
+        action = 'store_true',
+        help = 'Extract SV signatures directly from the alignment stream instead of writing, sorting and indexing a bam per fastq.')
+    parser.add_argument('--keep_bam',
+        action = 'store_true',
+        help = 'Also write a sorted bam per fastq when --stream_sigs is enabled.')
     parser.add_argument('--platform', 
 		type = str, 
 		help = argparse.SUPPRESS,
@@ -79,51 +106,66 @@ def parseArgs(argv):
 		type = float, 
 		help = "stop sequency if the detected rate is higher than target_rate",
         default = 100.0)
+    parser.add_argument('--predictive_stop',
+		help = "Stop sequencing once the fitted detection rate curve gains less than --min_gain_per_gb per extra gigabase",
+		action="store_true")
+    parser.add_argument('--min_gain_per_gb', 
+		type = float, 
+		help = "Detection rate points per extra gigabase below which --predictive_stop stops sequencing",
+        default = 0.05)
     parser.add_argument('--batch_interval', 
 		type = int, 
 		help = "Real-time results are generated every batch_interval batches",
         default = 4)
+    parser.add_argument('--dedup_capacity', 
+		type = int, 
+		help = "Expected number of reads in the run, sizes the filter that drops reads whose ID was already aligned. 0 disables read deduplication",
+        default = 20000000)
+    parser.add_argument('--watch_dir', 
+		type = str, 
+		action = "append",
+		help = "Additional directory to watch for fastq files, can be repeated",
+        default = [])
+    parser.add_argument('--recursive',
+		action = "store_true",
+		help = "Also pick up fastq files in subdirectories of the watched directories")
+    parser.add_argument('--sample_pattern', 
+		type = str, 
+		action = "append",
+		help = "Regex naming the sample of a fastq from its path, e.g. 'barcode\\d+'. Each sample gets its own snapshots and stop decision. Can be repeated; files matching no pattern are ignored",
+        default = [])
+    parser.add_argument('--file_workers', 
+		type = int, 
+		help = "Number of fastq files aligned and extracted concurrently. All workers share the --threads budget.",
+        default = 1)
+    parser.add_argument('--queue_size', 
+		type = int, 
+		help = "Maximum number of aligned fastq files waiting for signature extraction",
+        default = 2)
     args = parser.parse_args(argv)
     return args
 
 
-def clean_fastq_inplace(filepath):
-    with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    cleaned = []
-    i = 0
-    while i < len(lines):
-        if lines[i].startswith('@') and i + 3 < len(lines):
-            header = lines[i].strip()
-            seq = lines[i + 1].strip()
-            plus = lines[i + 2].strip()
-            qual = lines[i + 3].strip()
-            if plus.startswith('+') and len(seq) == len(qual):
-                cleaned.extend([header + '\n', seq + '\n', plus + '\n', qual + '\n'])
-                i += 4
-            else:
-                i += 1  # skip to next potential read
-        else:
-            i += 1
-    with gzip.open(filepath, 'wt', encoding='utf-8') as f:
-        f.writelines(cleaned)
-
-
-def handle_fault_one(fq_path, bam_path):
-    path_1 = bam_path
-    path_2 = f"{bam_path}.bai"
-    path_3 = f"{bam_path}.coverage.chr.stat.gz"
-    path_4 = f'{bam_path}.coverage.chr.stat'
-    if os.path.exists(path_1) and os.path.isfile(path_1):
-        os.remove(path_1)
-    if os.path.exists(path_2) and os.path.isfile(path_2):
-        os.remove(path_2)
-    if os.path.exists(path_3) and os.path.isfile(path_3):
-        os.remove(path_3)
-    if os.path.exists(path_4) and os.path.isfile(path_4):
-        os.remove(path_4)        
-    clean_fastq_inplace(fq_path)
+def remove_bam_files(bam_path):
+    for path in [bam_path, f"{bam_path}.bai"]:
+        if os.path.exists(path) and os.path.isfile(path):
+            os.remove(path)
+
+
+def handle_fault_one(bam_path):
+    # the input was validated record by record before alignment, a failure only leaves incomplete output to delete
+    remove_bam_files(bam_path)
+
+
+def clean_task_outputs(work_dir, task, sample, read_filter):
+    """Remove the partial bam and signatures of a fastq that did not finish."""
+    name = batch_name(task)
+    sample_work_dir = sample_dir(work_dir, sample)
+    delete_signature_files(f"{sample_work_dir}cutesv_work_dir/signatures", name)
+    remove_bam_files(sample_work_dir + "bam/" + name + ".bam")
+    # the read IDs of the file are recorded again once it is realigned
+    if read_filter is not None:
+        read_filter.forget(name)
 
 
 def handle_fault_two(signatures_file,bam_name):
@@ -134,17 +176,112 @@ def handle_fault_three():
     return
 
 
-def minimap2_step(work_dir, fq_path, mmi_path, platform, bam_path, thread, pandepth_path):
-    while True:
+def quarantine_path(work_dir, fq_path):
+    return f"{work_dir}quarantine/{os.path.basename(fq_path)}.bad"
+
+
+def batch_name(task):
+    # bam, signature batch and read ID file name of a fastq; files in
+    # subdirectories keep their path so equal file names do not collide
+    return os.path.splitext(task)[0].strip("/").replace("/", "__")
+
+
+def sample_dir(work_dir, sample):
+    """Work dir of one sample pipeline; the default sample "" is work_dir itself."""
+    return work_dir if sample == "" else f"{work_dir}samples/{sample}/"
+
+
+def sample_vcf_dir(output_vcf, sample):
+    return output_vcf if sample == "" else os.path.join(output_vcf, sample, "")
+
+
+def sample_stopped(work_dir, sample):
+    # a single sample stops through stop_event; with several samples every sample publishes its own stop.json
+    return sample != "" and os.path.exists(f"{sample_dir(work_dir, sample)}stop.json")
+
+
+class SampleRouter():
+    """
+    Maps a fastq path to its journal key and sample. The key is the path
+    relative to fastq_dir, or the absolute path for other watched dirs.
+    Without patterns every file belongs to the default sample ""; with
+    patterns, the first regex that matches the key names the sample (its
+    first group, or the whole match) and files matching none are ignored.
+    """
+
+    def __init__(self, fastq_dir, patterns, work_dir, output_vcf):
+        self.fastq_dir = os.path.abspath(fastq_dir)
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.work_dir = work_dir
+        self.output_vcf = output_vcf
+        self.samples = set()
+
+    def route(self, path):
+        path = os.path.abspath(path)
+        task = path[len(self.fastq_dir) + 1:] if path.startswith(self.fastq_dir + os.sep) else path
+        sample = ""
+        if len(self.patterns) != 0:
+            sample = None
+            for pattern in self.patterns:
+                match = pattern.search(task)
+                if match:
+                    sample = match.group(1) if pattern.groups else match.group(0)
+                    break
+            if sample is None:
+                return None, None
+        if sample not in self.samples:
+            self.init_sample(sample)
+        return task, sample
+
+    def init_sample(self, sample):
+        sample_work_dir = sample_dir(self.work_dir, sample)
+        os.makedirs(f"{sample_work_dir}bam", exist_ok=True)
+        os.makedirs(f"{sample_work_dir}cutesv_work_dir/signatures", exist_ok=True)
+        os.makedirs(sample_vcf_dir(self.output_vcf, sample), exist_ok=True)
+        self.samples.add(sample)
+
+
+def open_reads(task_dir, fq_path, read_filter, name):
+    """
+    Validated records of a fastq, as (FastqValidator, reads to align). With
+    a read_filter, reads whose ID was aligned before are dropped.
+    """
+    fastq = FastqValidator(fq_path, quarantine_path(task_dir, fq_path))
+    if read_filter is None:
+        return fastq, fastq
+    return fastq, read_filter.unique(fastq, name)
+
+
+def commit_reads(reads, read_filter):
+    """Record the aligned read IDs, returns the number of duplicates dropped."""
+    if read_filter is None:
+        return 0
+    reads.commit()
+    return reads.duplicates
+
+
+def minimap2_step(work_dir, fq_path, aligner, bam_name, bam_path, thread, timings, read_filter):
+    """
+    Align, sort and index one fastq. Returns the FastqValidator of the
+    successful attempt, for its read counts, and the number of duplicate
+    reads skipped, or None after MAX_RETRIES.
+    """
+    for attempt in range(MAX_RETRIES):
         try:
-            command = f'minimap2 -t {thread} -ax {platform} {mmi_path} {fq_path} | samtools sort -o {bam_path};'
-            command_add = f'samtools index {bam_path};{pandepth_path} -i {bam_path} -o {bam_path}.coverage -t 16;gzip -d {bam_path}.coverage.chr.stat.gz'
-            subprocess.run(command + command_add, shell=True, check=True)
-            break
-        
+            fastq, reads = open_reads(work_dir, fq_path, read_filter, bam_name)
+            for step, seconds in aligner.align_to_bam(reads, bam_path, thread).items():
+                timings[step] = timings.get(step, 0.0) + seconds
+            command_add = f'samtools index {bam_path}'
+            with timed(timings, "index"):
+                subprocess.run(command_add, shell=True, check=True)
+            return fastq, commit_reads(reads, read_filter)
         except subprocess.CalledProcessError as e:
-            logging.info(f"命令执行失败，错误码: {e.returncode}")
-            handle_fault_one(fq_path,bam_path)
+            logging.info(f"Command failed with exit code {e.returncode}")
+            handle_fault_one(bam_path)
+        except AlignmentError as e:
+            logging.info(f"Alignment failed: {e}")
+            handle_fault_one(bam_path)
+    return None
 
 
 def generate_mmi(reference_path, mmi_path):
@@ -152,37 +289,91 @@ def generate_mmi(reference_path, mmi_path):
     try:
         subprocess.run(command, shell=True, check=True)
     except subprocess.CalledProcessError as e:
-        logging.info(f"命令执行失败，错误码: {e.returncode}")
+        logging.info(f"Command failed with exit code {e.returncode}")
 
 
-def cutesv_extract_sigs(work_dir, fa_path, bam_path, bam_name, thread, task_dir):
-    while True:
+def run_command(command, timeout):
+    """
+    subprocess.run with check=True whose timeout also kills the children
+    of the command, e.g. the worker pool of cuteSV, not only the shell.
+    """
+    proc = subprocess.Popen(command, shell=True, start_new_session=True)
+    try:
+        proc.wait(timeout=timeout)
+    except BaseException:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, command)
+
+
+def cutesv_extract_sigs(work_dir, fa_path, bam_path, bam_name, thread, task_dir, timings):
+    """
+    Run `cuteSV --mode 1` on one bam, returns its aligned bases, or None
+    after MAX_RETRIES failed runs. Mode 1 checkpoints every task window, so
+    a retry only extracts the windows the failed run did not finish.
+    """
+    for attempt in range(MAX_RETRIES):
         command = f'cuteSV --input {bam_path} --reference {fa_path} --work_dir {work_dir} --bam_name {bam_name} --threads {thread} --mode 1'
         try:
-            subprocess.run(command, shell=True, check=True)
+            with timed(timings, "extract"):
+                run_command(command, EXTRACT_TIMEOUT)
             break
         except subprocess.CalledProcessError as e:
-            signatures_file = f"{work_dir}/signatures"
-            handle_fault_two(signatures_file,bam_name)
-    with open(f'{bam_path}.coverage.chr.stat', 'r') as file:
-        last_line = file.readlines()[-1]
-
-    # 提取 MeanDepth
-    mean_depth_str = last_line.split('\t')[-1]  # 通过制表符分割，获取最后一列
-    mean_depth = float(mean_depth_str.split(': ')[-1])  # 去除 'MeanDepth: '，保留数值并转为浮点数
-    with open(f'{task_dir}coverage_list.txt', 'a') as file:
-        file.write(f"{mean_depth}\n")
-
-
-def cutesv_combine_cluster(work_dir, vcf_output, thread, reference, high_freq_file, sv_freq, recall_file, user_defined, pctsize, ref_dist):
-    file_path = f'{work_dir}coverage_list.txt'
-    total_sum = 0.0
-    with open(file_path, 'r') as file:
-        for line in file:   
-            try:
-                total_sum += float(line.strip())  
-            except ValueError:
-                print(f"无法转换这一行: {line.strip()}")
+            logging.info(f"Signature extraction of {bam_name} failed with exit code {e.returncode}")
+        except subprocess.TimeoutExpired:
+            logging.info(f"Signature extraction of {bam_name} ran for more than {EXTRACT_TIMEOUT} seconds and was killed")
+    else:
+        handle_fault_two(f"{work_dir}signatures", bam_name)
+        return None
+    # mode 1 counts the coverage while extracting, the bam is not scanned again
+    with timed(timings, "coverage"):
+        coverage = batch_coverage(work_dir, bam_name)
+        depth = mean_depth(work_dir, coverage)
+        with open(f'{task_dir}coverage_list.txt', 'a') as file:
+            file.write(f"{depth}\n")
+    return sum(coverage.values())
+
+
+def stream_extract_sigs(work_dir, fq_path, aligner, bam_name, bam_path, keep_bam, task_dir, sig_args, thread, timings, read_filter):
+    """
+    Align one fastq and collect its signatures from the alignment stream.
+    Returns the FastqValidator of the successful attempt and the number of
+    duplicate reads skipped, or None.
+    """
+    for attempt in range(MAX_RETRIES):
+        try:
+            fastq, reads = open_reads(task_dir, fq_path, read_filter, bam_name)
+            # alignment and extraction interleave in one pipeline, so they are timed together
+            with timed(timings, "align_extract"):
+                header, records = aligner.stream(reads, thread)
+                coverage = stream_pipe(records, header, sig_args.min_size, sig_args.min_mapq, sig_args.max_split_parts, 
+                                       sig_args.min_read_len, work_dir, bam_name, sig_args.min_siglength, 
+                                       sig_args.merge_del_threshold, sig_args.merge_ins_threshold, sig_args.max_size,
+                                       bam_path if keep_bam else None)
+            break
+        except (AlignmentError, OSError, ValueError) as e:
+            logging.info(f"Alignment or signature extraction failed: {e}")
+            delete_signature_files(f"{work_dir}signatures", bam_name)
+            handle_fault_one(bam_path)
+    else:
+        return None
+    with timed(timings, "coverage"):
+        depth = mean_depth(work_dir, coverage)
+        with open(f'{task_dir}coverage_list.txt', 'a') as file:
+            file.write(f"{depth}\n")
+    return fastq, commit_reads(reads, read_filter)
+
+
+def cutesv_combine_cluster(work_dir, vcf_output, thread, reference, high_freq_file, sv_freq, recall_file, user_defined, pctsize, ref_dist, journal, sample, timings=None):
+    if timings is None:
+        timings = dict()
+    cutesv_work_dir = work_dir + "cutesv_work_dir/"
+    # cumulative depth: aligned bases of all complete batches / reference length
+    with timed(timings, "coverage"):
+        coverage = update_coverage_summary(cutesv_work_dir)["bases"]
+        total_sum = mean_depth(cutesv_work_dir, coverage) if len(coverage) != 0 else 0.0
     if total_sum <= 0.1: #深度太低直接返回
         if high_freq_file == "":
             return None
@@ -196,173 +387,400 @@ def cutesv_combine_cluster(work_dir, vcf_output, thread, reference, high_freq_fi
         min_support = 4
     else:
         min_support = 5
-    cutesv_work_dir = work_dir + "cutesv_work_dir"
     detect_rate = 0
     vcf_path = f'{vcf_output}{total_sum:.1f}_output.vcf'
-    command = f'cuteSV --retain_work_dir --write_old_sigs --genotype --output {vcf_path} --reference {reference} --work_dir {cutesv_work_dir} --threads {thread} --min_support {min_support} --mode 2'
+    command = f'cuteSV --retain_work_dir --genotype --output {vcf_path} --reference {reference} --work_dir {cutesv_work_dir} --threads {thread} --min_support {min_support} --stable_id --mode 2'
     while True:
         try:
-            subprocess.run(command, shell=True, check=True)
+            with timed(timings, "cluster"):
+                subprocess.run(command, shell=True, check=True)
             break
         except subprocess.CalledProcessError as e:
             handle_fault_three()
+    # publish only the changes since the previous snapshot, downstream need not diff the whole vcf
+    with timed(timings, "delta"):
+        # numbered by snapshot: a later snapshot at the same depth must not overwrite the delta
+        snapshot = journal.next_snapshot(sample)
+        changes = write_delta(vcf_path, f'{vcf_output}{snapshot:04d}_{total_sum:.1f}_delta.vcf', f'{work_dir}snapshot_calls.pickle')
+    logging.info(f"[cluster] {total_sum:.1f}x snapshot: {changes['NEW']} new, {changes['UPDATED']} updated, {changes['RETRACTED']} retracted calls")
     if high_freq_file != "":
         length_lower_ratio = pctsize
         length_upper_ratio = 1 + (1 - pctsize)
-        if user_defined is True:
-            detect_rate = compare_vcf_highfreq_mapping(vcf_path,high_freq_file,recall_file,sv_freq,1, ref_dist, length_lower_ratio, length_upper_ratio)
-        else:
-            detect_rate = compare_vcf_highfreq_mapping(vcf_path,high_freq_file,recall_file,sv_freq,2, ref_dist, length_lower_ratio, length_upper_ratio)
+        with timed(timings, "evaluate"):
+            if user_defined is True:
+                detect_rate, stats = update_vcf_highfreq_mapping(vcf_path,high_freq_file,recall_file,sv_freq,1, ref_dist, length_lower_ratio, length_upper_ratio, work_dir)
+            else:
+                detect_rate, stats = update_vcf_highfreq_mapping(vcf_path,high_freq_file,recall_file,sv_freq,2, ref_dist, length_lower_ratio, length_upper_ratio, work_dir)
+        # depth,rate,detected targets,calls,calls added and removed since the previous snapshot,aligned bases,time
         with open(f'{work_dir}depth_performance_rate.txt', 'a') as file:
-            file.write(f"{total_sum},{detect_rate}\n")
+            file.write(f"{total_sum},{detect_rate},{stats['detected']},{stats['calls']},{stats['added']},{stats['removed']},{sum(coverage.values())},{time.time():.0f}\n")
         return detect_rate
     else:
         return None
 
 
-def worker(task_queue, fa_path, work_dir, fq_dir, platform, mmi_path, per_thread, shared_value, 
-           batch_interval, high_freq_file, output_vcf, user_defined, pctsize, ref_dist, sv_freq, 
-           recall_file, target_rate, pandepth_path):
-    counter = 0
-    do_flag = False
-    while True:
-        task = task_queue.get()
-        counter += 1
-        if counter == batch_interval:
-            counter = 0
-            do_flag = True
-        if task is None:
-            # 接收到终止信号，退出
-            break
-        with open(f'{work_dir}debug.txt','w') as f:
-            f.write(task)
-        name, ext = os.path.splitext(task)
-        fq_path = fq_dir + task
-        bam_path = work_dir + "bam/" + name + ".bam"
-        cutesv_work_dir = work_dir + "cutesv_work_dir/"
-        minimap2_step(work_dir, fq_path, mmi_path, platform, bam_path, per_thread, pandepth_path)
-        cutesv_extract_sigs(cutesv_work_dir, fa_path, bam_path, name, per_thread, work_dir)
-        if do_flag == True:
-            if high_freq_file != "":
-                detect_rate = cutesv_combine_cluster(work_dir, output_vcf, per_thread, fa_path, high_freq_file, sv_freq, recall_file, user_defined, pctsize, ref_dist)
-                if detect_rate >= target_rate:
-                    shared_value.value = True  # 设置停止标志
-            else:
-                cutesv_combine_cluster(work_dir, output_vcf, per_thread, fa_path, high_freq_file, sv_freq, recall_file, user_defined, pctsize, ref_dist)
-            do_flag = False
-        result = f"{task}"
-        with open(f"{work_dir}finished.txt", 'a', encoding='utf-8') as file:
-            file.write(result + '\n')
+def publish_stop(work_dir, reason, detect_rate=None):
+    """
+    Write work_dir/stop.json for sequencer control scripts: reason is
+    "target_rate" when the target detection rate was reached (sequencing
+    can stop), "saturated" when more sequencing is projected to gain too
+    little, "all_samples" once every sample has stopped, or
+    "monitor_fade" when no new fastq arrived in time.
+    """
+    stop_path = f"{work_dir}stop.json"
+    with open(stop_path + ".tmp", "w") as f:
+        json.dump({"reason": reason, "time": time.time(), "detect_rate": detect_rate}, f)
+    os.replace(stop_path + ".tmp", stop_path)
+    logging.info(f"Stop published: {reason}")
 
 
-def arrange_task(fastq_dir, output_txt, finished_path):
-    dir_path = Path(fastq_dir)
+def queue_depth(task_queue):
+    try:
+        return task_queue.qsize()
+    except NotImplementedError:
+        # qsize() is not available on macOS
+        return -1
 
-    if not dir_path.exists():
-        logging.info(f"Error:dir {fastq_dir} is not exist。")
-        return
 
-    if not dir_path.is_dir():
-        logging.info(f"Error:dir {fastq_dir} is not a directory")
-        return
+def report_queue_depth(work_dir, stage, queues):
+    depths = "\t".join(f"{name}={queue_depth(q)}" for name, q in queues)
+    logging.info(f"[{stage}] queue depth: {depths}")
+    with open(f'{work_dir}queue_depth.txt', 'a') as file:
+        file.write(f"{time.time():.0f}\t{stage}\t{depths}\n")
 
-    # 使用 glob 方法筛选 .fastq 文件，忽略大小写
-    fastq_files = [f.name for f in dir_path.iterdir() if f.is_file() and (f.suffix.lower() == '.fastq' or f.suffix.lower() == '.fq' or f.suffix.lower() == '.gz')]
-    unfinished_files = []
-    if not fastq_files:
-        return
 
-    try:
-        # 将文件名写入输出文本文件
-        with open(output_txt, 'w') as fout, open(finished_path,'r') as fin:
-            finish_names = [line.strip() for line in fin if line.strip()]
-            for filename in fastq_files:
-                if filename not in finish_names:
-                    unfinished_files.append(filename)
-                fout.write(filename + '\n')
-        # logging.info(f"成功将 {len(fastq_files)} 个 .fastq 文件名写入 {output_txt}。")
-    except IOError as e:
-        logging.info(f"写入文件时发生错误：{e}")
-    return unfinished_files
-
-
-def is_file_complete(file_path, check_interval=2, retries=1):
-    """通过检测文件大小是否稳定来判断文件是否写入完成。
-    
-    :param file_path: 文件路径
-    :param check_interval: 每次检查之间的等待时间（秒）
-    :param retries: 连续检测相同大小的次数，达到该次数则认为文件写入完成
-    :return: True 表示文件稳定，否则 False
+def align_stage(task_queue, extract_queue, queues, aligner, budget, stop_event, journal, read_filter, work_dir, fq_dir, stream_sigs, keep_bam):
     """
-    previous_size = -1
-    stable_count = 0
-
-    while stable_count < retries:
+    Stage 1: align every fastq. Blocks on the bounded extract queue when
+    extraction falls behind, so at most queue_size bams wait on disk.
+    With --stream_sigs the signatures are collected here while aligning.
+    Several align workers may run at once; each asks the thread budget
+    for its share before every file. Once stop_event is set, or the sample
+    of a file has stopped, the remaining files are skipped.
+    """
+    # cuteSV defaults for signature collection, same as `cuteSV --mode 1`
+    sig_args = parseCuteSVArgs(["--mode", "1"])
+    metrics = StageMetrics(work_dir, "align")
+    while True:
+        item = task_queue.get()
+        if item is None:
+            # end signal: pass it downstream and exit
+            extract_queue.put(None)
+            break
+        task, sample, queued_at = item
+        if stop_event.is_set() or sample_stopped(work_dir, sample):
+            continue
+        queue_wait = time.time() - queued_at
+        report_queue_depth(work_dir, "align", queues)
+        sample_work_dir = sample_dir(work_dir, sample)
+        name = batch_name(task)
+        fq_path = os.path.join(fq_dir, task)
+        bam_path = sample_work_dir + "bam/" + name + ".bam"
+        timings = dict()
+        with timed(timings, "thread_wait"):
+            thread = budget.acquire(ALIGN, queue_depth(task_queue) + 1)
+        logging.info(f"[align] {task} with {thread} threads ({budget.usage()})")
         try:
-            current_size = os.path.getsize(file_path)
-        except OSError:
-            # 文件可能暂时不可访问
-            current_size = -1
+            if stream_sigs:
+                aligned = stream_extract_sigs(sample_work_dir + "cutesv_work_dir/", fq_path, aligner, name, bam_path, keep_bam, sample_work_dir, sig_args, thread, timings, read_filter)
+            else:
+                aligned = minimap2_step(sample_work_dir, fq_path, aligner, name, bam_path, thread, timings, read_filter)
+        finally:
+            budget.release(ALIGN, thread)
+        if aligned is None:
+            logging.error(f"{task} failed {MAX_RETRIES} times and is skipped.")
+            with open(f"{work_dir}failed.txt", 'a', encoding='utf-8') as file:
+                file.write(task + '\n')
+            journal.mark([task], FAILED)
+            # a file given up no longer holds its read IDs
+            if read_filter is not None:
+                read_filter.forget(name)
+            continue
+        reads, duplicates = aligned
+        if duplicates != 0:
+            logging.info(f"[align] {task}: skipped {duplicates} reads aligned before")
+        journal.mark([task], ALIGNED)
+        metrics.record(task, queue_wait, timings, reads.records, reads.bases, threads=thread, quarantined=reads.quarantined, duplicates=duplicates, sample=sample)
+        extract_queue.put((task, sample, time.time()))
+
+
+def extract_stage(extract_queue, cluster_queue, queues, budget, stop_event, journal, fa_path, work_dir, stream_sigs):
+    """
+    Stage 2: run `cuteSV --mode 1` on each aligned bam and journal the file
+    as extracted.
+    """
+    metrics = StageMetrics(work_dir, "extract")
+    while True:
+        item = extract_queue.get()
+        if item is None:
+            cluster_queue.put(None)
+            break
+        task, sample, queued_at = item
+        if stop_event.is_set() or sample_stopped(work_dir, sample):
+            continue
+        report_queue_depth(work_dir, "extract", queues)
+        if not stream_sigs:
+            queue_wait = time.time() - queued_at
+            sample_work_dir = sample_dir(work_dir, sample)
+            name = batch_name(task)
+            bam_path = sample_work_dir + "bam/" + name + ".bam"
+            timings = dict()
+            with timed(timings, "thread_wait"):
+                thread = budget.acquire(EXTRACT, queue_depth(extract_queue) + 1)
+            logging.info(f"[extract] {task} with {thread} threads ({budget.usage()})")
+            try:
+                bases = cutesv_extract_sigs(sample_work_dir + "cutesv_work_dir/", fa_path, bam_path, name, thread, sample_work_dir, timings)
+            finally:
+                budget.release(EXTRACT, thread)
+            if bases is None:
+                logging.error(f"{task} failed {MAX_RETRIES} times and is skipped.")
+                with open(f"{work_dir}failed.txt", 'a', encoding='utf-8') as file:
+                    file.write(task + '\n')
+                journal.mark([task], FAILED)
+                continue
+            metrics.record(task, queue_wait, timings, 0, bases, threads=thread, sample=sample)
+        journal.mark([task], EXTRACTED)
+        cluster_queue.put((task, sample, time.time()))
+
+
+def sample_recall_file(work_dir, sample, recall_file):
+    return recall_file if sample == "" else f"{sample_dir(work_dir, sample)}recall_file.txt"
+
+
+def cluster_stage(cluster_queue, queues, budget, stop_event, journal, file_workers, work_dir, output_vcf, fa_path, batch_interval, 
+                  high_freq_file, user_defined, pctsize, ref_dist, sv_freq, recall_file, target_rate,
+                  predictive_stop, min_gain_per_gb):
+    """
+    Stage 3: build a snapshot of a sample every batch_interval extracted
+    files of that sample. Files that finish while a snapshot is running
+    are folded into the next one instead of triggering one snapshot each.
+    Exits once every extract worker has sent its end signal. With a target
+    set, every snapshot refreshes forecast.json; with predictive_stop, the
+    sample is stopped once the projected gain per extra gigabase falls
+    below min_gain_per_gb. Sequencing stops when every sample has stopped.
+    """
+    metrics = StageMetrics(work_dir, "cluster")
+    ended = 0
+    # files of every sample not in any snapshot yet, and the earliest time one of them was queued
+    pending = dict()
+    oldest_queued = dict()
+    while ended < file_workers:
+        item = cluster_queue.get()
+        while True:
+            if item is None:
+                ended += 1
+            else:
+                task, sample, queued_at = item
+                pending.setdefault(sample, list()).append(task)
+                oldest_queued.setdefault(sample, queued_at)
+            if ended == file_workers:
+                break
+            try:
+                item = cluster_queue.get_nowait()
+            except queue.Empty:
+                break
+        for sample in list(pending):
+            if len(pending[sample]) < batch_interval or stop_event.is_set() or sample_stopped(work_dir, sample):
+                continue
+            tasks = pending.pop(sample)
+            queue_wait = time.time() - oldest_queued.pop(sample)
+            report_queue_depth(work_dir, "cluster", queues)
+            timings = dict()
+            with timed(timings, "thread_wait"):
+                thread = budget.acquire(CLUSTER, 1)
+            try:
+                snapshot_sample(journal, stop_event, timings, thread, work_dir, sample, output_vcf, fa_path, high_freq_file, 
+                                user_defined, pctsize, ref_dist, sv_freq, recall_file, target_rate, predictive_stop, min_gain_per_gb)
+            finally:
+                budget.release(CLUSTER, thread)
+            journal.mark(tasks, CLUSTERED)
+            metrics.record(f"{len(tasks)} files", queue_wait, timings, threads=thread, files=len(tasks), sample=sample)
+
+
+def snapshot_sample(journal, stop_event, timings, thread, work_dir, sample, output_vcf, fa_path, high_freq_file, 
+                    user_defined, pctsize, ref_dist, sv_freq, recall_file, target_rate, predictive_stop, min_gain_per_gb):
+    sample_work_dir = sample_dir(work_dir, sample)
+    vcf_dir = sample_vcf_dir(output_vcf, sample)
+    sample_recall = sample_recall_file(work_dir, sample, recall_file)
+    if high_freq_file == "":
+        cutesv_combine_cluster(sample_work_dir, vcf_dir, thread, fa_path, high_freq_file, sv_freq, sample_recall, user_defined, pctsize, ref_dist, journal, sample, timings)
+        return
+    detect_rate = cutesv_combine_cluster(sample_work_dir, vcf_dir, thread, fa_path, high_freq_file, sv_freq, sample_recall, user_defined, pctsize, ref_dist, journal, sample, timings)
+    reason = None
+    if detect_rate >= target_rate:
+        reason = "target_rate"
+    else:
+        with timed(timings, "forecast"):
+            prediction = forecast(load_history(f'{sample_work_dir}depth_performance_rate.txt'), target_rate)
+        if prediction is not None:
+            write_forecast(sample_work_dir, prediction)
+            logging.info(f"[cluster] {sample} forecast: target depth {prediction['target_depth']}, eta {prediction['eta_seconds']} s, gain {prediction['gain_per_gb']:.4f} %/Gb")
+            if predictive_stop and prediction['gain_per_gb'] < min_gain_per_gb:
+                # more sequencing would gain less than the threshold, stop early
+                reason = "saturated"
+    if reason is None:
+        return
+    # publish the stop file before telling the main process and the other stages
+    publish_stop(sample_work_dir, reason, detect_rate)
+    if sample == "":
+        stop_event.set()
+    elif all(sample_stopped(work_dir, other) for other in journal.samples()):
+        publish_stop(work_dir, "all_samples")
+        stop_event.set()
 
-        if current_size == previous_size and current_size != -1:
-            stable_count += 1
-        else:
-            stable_count = 0
-            previous_size = current_size
 
-        time.sleep(check_interval)
-    return True
+def arrange_task(watch_dirs, recursive, router, journal):
+    """
+    Journal the fastq files already in the watched dirs as queued and return
+    the state of every file of the run, {name: (state, sample)}.
+    """
+    by_sample = dict()
+    for watch_dir in watch_dirs:
+        if not os.path.isdir(watch_dir):
+            logging.info(f"Error:dir {watch_dir} does not exist or is not a directory.")
+            continue
+        if recursive:
+            paths = (os.path.join(root, file_name) for root, dirs, files in os.walk(watch_dir) for file_name in files)
+        else:
+            with os.scandir(watch_dir) as entries:
+                paths = [entry.path for entry in entries if entry.is_file()]
+        for path in paths:
+            if not path.lower().endswith(FASTQ_EXTENSIONS):
+                continue
+            task, sample = router.route(path)
+            if task is not None:
+                by_sample.setdefault(sample, list()).append(task)
+    for sample, tasks in by_sample.items():
+        journal.add(tasks, sample)
+    return journal.states()
+
+
+def resume_tasks(work_dir, states, stream_sigs, read_filter):
+    """
+    Sort the files of a previous run by the stage they resume at: files
+    that were not aligned start over, aligned files go straight to
+    extraction and extracted files to the next snapshot. Returns lists of
+    (task, sample).
+    """
+    to_align, to_extract, to_cluster = list(), list(), list()
+    for task, (state, sample) in states.items():
+        if state == ALIGNED and not stream_sigs:
+            if os.path.exists(f"{sample_dir(work_dir, sample)}bam/{batch_name(task)}.bam.bai"):
+                # keep the alignment, mode 1 only extracts the windows not committed yet
+                to_extract.append((task, sample))
+                continue
+            state = QUEUED
+        if state == ALIGNED:
+            to_extract.append((task, sample))
+        elif state == EXTRACTED:
+            to_cluster.append((task, sample))
+        elif state in (QUEUED, FAILED):
+            # unfinished files start over
+            clean_task_outputs(work_dir, task, sample, read_filter)
+            to_align.append((task, sample))
+    return to_align, to_extract, to_cluster
+
+
+FASTQ_EXTENSIONS = ('.fq', '.fastq', '.fq.gz', '.fastq.gz')
 
 
 class FQFileHandler(FileSystemEventHandler):
-    def __init__(self, process_param1, process_param2):
-        """
-        :param process_param1: 主进程传入的参数1
-        :param process_param2: 主进程传入的参数2
-        """
+    """
+    Queue every new fastq once its writer is done with it. Close-after-write
+    (IN_CLOSE_WRITE) and rename events queue the file at once; files that
+    only report creation or modification are watched by a tracker thread
+    and queued after their size has not changed for stable_seconds, so the
+    observer thread never sleeps.
+    """
+    def __init__(self, task_queue, journal, router, queued=(), stable_seconds=2, poll_interval=0.5):
         super().__init__()
         self.last_event_time = time.time()  # 记录上次事件时间
-        self.task_queue = process_param1
-        self.task_list_path = process_param2
+        self.task_queue = task_queue
+        self.journal = journal
+        self.router = router
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.queued = set(queued)
+        # path -> (size, time of the last size change)
+        self.pending = dict()
+        self.stopped = threading.Event()
+        self.tracker = threading.Thread(target=self.track_pending, daemon=True)
+        self.tracker.start()
+
+    def enqueue(self, path):
+        with self.lock:
+            self.pending.pop(path, None)
+            task, sample = self.router.route(path)
+            if task is None or task in self.queued:
+                return
+            self.queued.add(task)
+            self.last_event_time = time.time()
+            self.journal.add([task], sample)
+            self.task_queue.put((task, sample, time.time()))
+
+    def watch(self, path):
+        with self.lock:
+            if path not in self.pending:
+                self.pending[path] = (-1, time.time())
 
     def on_created(self, event):
-        # 只处理文件，并且判断扩展名为 .fq
-        if not event.is_directory:
-            # 判断文件扩展名是否为 fq, fastq, fq.gz, fastq.gz
-            valid_extensions = ('.fq', '.fastq', '.fq.gz', '.fastq.gz')
-            if event.src_path.endswith(valid_extensions):
-                # 等待文件写入完成（检测文件大小是否稳定）
-                if is_file_complete(event.src_path):
-                    self.last_event_time = time.time()
-                    file_name = os.path.basename(event.src_path)
-                    self.task_queue.put(file_name)
-                    with open(self.task_list_path, 'a') as file:
-                        file.write(file_name + '\n')
-
+        if not event.is_directory and event.src_path.endswith(FASTQ_EXTENSIONS):
+            self.watch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory and event.src_path.endswith(FASTQ_EXTENSIONS):
+            self.watch(event.src_path)
+
+    def on_closed(self, event):
+        # the writer closed the file, it can be queued right away
+        if not event.is_directory and event.src_path.endswith(FASTQ_EXTENSIONS):
+            self.enqueue(event.src_path)
+
+    def on_moved(self, event):
+        # written to a temporary name and then renamed
+        if not event.is_directory and event.dest_path.endswith(FASTQ_EXTENSIONS):
+            self.enqueue(event.dest_path)
+
+    def track_pending(self):
+        while not self.stopped.wait(self.poll_interval):
+            now = time.time()
+            stable = list()
+            with self.lock:
+                for path, (size, changed) in list(self.pending.items()):
+                    try:
+                        current_size = os.path.getsize(path)
+                    except OSError:
+                        # 文件可能暂时不可访问
+                        current_size = -1
+                    if current_size != size:
+                        self.pending[path] = (current_size, now)
+                    elif current_size != -1 and now - changed >= self.stable_seconds:
+                        stable.append(path)
+            for path in stable:
+                self.enqueue(path)
+
+    def stop(self):
+        self.stopped.set()
+        self.tracker.join()
 
 
 def delete_signature_files(temp_dir, bam_name):
     """
-    在 temp_dir 目录下查找所有以 bam_name 开头，后面跟任意字符，
-    最后以 .pickle 结尾的文件，并删除这些文件。
-    
+    Delete the batch directory of bam_name under temp_dir
+    (temp_dir/bam_name/), i.e. every signature file the batch wrote.
+
     参数:
-    - temp_dir: 临时目录路径（字符串）。
-    - bam_name: 文件名前缀（字符串）。
+    - temp_dir: path of the signatures directory (str).
+    - bam_name: name of the batch (str).
     """
-    # 构造文件搜索模式
-    pattern = os.path.join(temp_dir, bam_name + "*" + ".pickle")
-    
-    # 查找匹配的文件列表
-    files = glob.glob(pattern)
-    
-    # 遍历并删除匹配的文件
-    for file_path in files:
+    batch_dir = os.path.join(temp_dir, bam_name)
+    if os.path.isdir(batch_dir):
         try:
-            os.remove(file_path)
-            logging.info(f"已删除文件: {file_path}")
+            shutil.rmtree(batch_dir)
+            logging.info(f"Removed directory: {batch_dir}")
         except Exception as e:
-            logging.error(f"删除文件 {file_path} 时出错: {e}")
+            logging.error(f"Failed to remove directory {batch_dir}: {e}")
 
 
 
@@ -381,7 +799,8 @@ def main_function():
         args.work_dir += '/'
     task_queue = multiprocessing.Queue()
     args.high_freq_file = args.target_set
-    if not os.path.exists(f'{args.work_dir}debug.txt'):
+    journal_path = f'{args.work_dir}journal.sqlite'
+    if not os.path.exists(journal_path) and not os.path.exists(f'{args.work_dir}debug.txt'):
         os.mkdir("%sbam"%args.work_dir)
         os.mkdir("%scutesv_work_dir"%args.work_dir)
         os.mkdir("%scutesv_work_dir/signatures"%args.work_dir)
@@ -390,91 +809,139 @@ def main_function():
             pass    
         with open(f'{args.work_dir}depth_performance_rate.txt', 'w') as file:
             pass  
-        with open(f'{args.work_dir}debug.txt','w') as f:
-            pass
-        with open(f'{args.work_dir}finished.txt','w') as f:
-            pass      
-    else:
-        with open(f'{args.work_dir}debug.txt','r') as f:
-            bam_name = f.readline()
-        signatures_file = f"{args.work_dir}cutesv_work_dir/signatures"
-        delete_signature_files(signatures_file, bam_name)
-        name, ext = os.path.splitext(bam_name)
-        bam_path = args.work_dir + "bam/" + name + ".bam"
-        path_1 = bam_path
-        path_2 = f"{bam_path}.bai"
-        path_3 = f"{bam_path}.coverage.chr.stat.gz"
-        path_4 = f'{bam_path}.coverage.chr.stat'
-        if os.path.exists(path_1) and os.path.isfile(path_1):
-            os.remove(path_1)
-        if os.path.exists(path_2) and os.path.isfile(path_2):
-            os.remove(path_2)
-        if os.path.exists(path_3) and os.path.isfile(path_3):
-            os.remove(path_3)
-        if os.path.exists(path_4) and os.path.isfile(path_4):
-            os.remove(path_4)
+    migrate = not os.path.exists(journal_path)
+    journal = TaskJournal(journal_path)
+    if migrate:
+        # work dir of an older version: import the task states from finished.txt and all_task.txt
+        journal.migrate(f'{args.work_dir}finished.txt', f'{args.work_dir}all_task.txt')
     mmi_path = args.mmi_path
     if mmi_path == '':
         mmi_path = f'{args.work_dir}ref.mmi'
         generate_mmi(args.reference, mmi_path)
-    pandepth_path = pkg_resources.resource_filename("online", "bin/pandepth")
-    shared_value = multiprocessing.Value("b",False)
+    stop_event = multiprocessing.Event()
+    stop_path = f'{args.work_dir}stop.json'
+    if os.path.exists(stop_path):
+        os.remove(stop_path)
+    for stop_path in glob.glob(f'{args.work_dir}samples/*/stop.json'):
+        os.remove(stop_path)
+    # stage metrics files left by the last run belong to processes that exited
+    for prom_path in glob.glob(f'{args.work_dir}metrics/*.prom'):
+        os.remove(prom_path)
     if args.recall_file == "":
         args.recall_file = f'{args.work_dir}recall_file.txt'
-    p = multiprocessing.Process(target=worker, args=(task_queue, 
-                                                        args.reference, 
-                                                        args.work_dir, 
-                                                        args.fastq_dir, 
-                                                        args.platform, 
-                                                        mmi_path, 
-                                                        args.threads, 
-                                                        shared_value, 
-                                                        args.batch_interval,
-                                                        args.high_freq_file,
-                                                        args.output_vcf,
-                                                        args.user_defined,
-                                                        args.pctsize,
-                                                        args.ref_dist,
-                                                        args.sv_freq, 
-                                                        args.recall_file,
-                                                        args.target_rate,
-                                                        pandepth_path))
-    p.daemon = True
-    p.start()
-
-    finished_path = args.work_dir + "/finished.txt"
-    task_list_path = args.work_dir + "/all_task.txt"
-    tasks = arrange_task(args.fastq_dir, task_list_path, finished_path)
-    
-    if tasks is not None:
-        for task in tasks:
-                task_queue.put(task)
-
     if not os.path.exists(args.fastq_dir):
         raise FileNotFoundError("[Errno 2] No such directory: '%s'"%args.fastq_dir)
-    event_handler = FQFileHandler(task_queue, task_list_path)
+    watch_dirs = [args.fastq_dir] + args.watch_dir
+    # when split by sample, barcodes are usually subdirectories, so watch recursively
+    recursive = args.recursive or len(args.sample_pattern) != 0
+    router = SampleRouter(args.fastq_dir, args.sample_pattern, args.work_dir, args.output_vcf)
+    states = arrange_task(watch_dirs, recursive, router, journal)
+    read_filter = ReadIdFilter(f"{args.work_dir}read_ids/", args.dedup_capacity) if args.dedup_capacity > 0 else None
+    # files that were in flight when the previous run stopped resume at their last finished stage
+    to_align, to_extract, to_cluster = resume_tasks(args.work_dir, states, args.stream_sigs, read_filter)
+    logging.info(f"Resuming: {len(to_align)} files to align, {len(to_extract)} to extract, {len(to_cluster)} to cluster, {len(states)} known.")
+
+    # the index is loaded once here; forked workers share it instead of each loading a copy
+    aligner = build_aligner(args.aligner, mmi_path, args.reference, args.platform, args.threads)
+    budget = ThreadBudget(args.threads, [args.file_workers, args.file_workers, 1])
+    extract_queue = multiprocessing.Queue(maxsize=max(args.queue_size, args.file_workers))
+    cluster_queue = multiprocessing.Queue()
+    queues = [("task", task_queue), ("extract", extract_queue), ("cluster", cluster_queue)]
+    # fork explicitly: the resident mappy index cannot be pickled for spawn
+    ctx = multiprocessing.get_context("fork")
+    stages = list()
+    for i in range(args.file_workers):
+        stages.append(ctx.Process(target=align_stage, args=(task_queue, 
+                                                            extract_queue, 
+                                                            queues, 
+                                                            aligner, 
+                                                            budget, 
+                                                            stop_event, 
+                                                            journal, 
+                                                            read_filter, 
+                                                            args.work_dir, 
+                                                            args.fastq_dir, 
+                                                            args.stream_sigs, 
+                                                            args.keep_bam)))
+        stages.append(ctx.Process(target=extract_stage, args=(extract_queue, 
+                                                              cluster_queue, 
+                                                              queues, 
+                                                              budget, 
+                                                              stop_event, 
+                                                              journal, 
+                                                              args.reference, 
+                                                              args.work_dir, 
+                                                              args.stream_sigs)))
+    stages.append(ctx.Process(target=cluster_stage, args=(cluster_queue, 
+                                                          queues, 
+                                                          budget, 
+                                                          stop_event, 
+                                                          journal, 
+                                                          args.file_workers, 
+                                                          args.work_dir, 
+                                                          args.output_vcf, 
+                                                          args.reference, 
+                                                          args.batch_interval,
+                                                          args.high_freq_file,
+                                                          args.user_defined,
+                                                          args.pctsize,
+                                                          args.ref_dist,
+                                                          args.sv_freq, 
+                                                          args.recall_file,
+                                                          args.target_rate,
+                                                          args.predictive_stop,
+                                                          args.min_gain_per_gb)))
+    for p in stages:
+        p.daemon = True
+        p.start()
+
+    for task, sample in to_align:
+        task_queue.put((task, sample, time.time()))
+    for task, sample in to_cluster:
+        cluster_queue.put((task, sample, time.time()))
+    # the extract queue is bounded, feed it without holding up the observer
+    resume_extract = threading.Thread(target=lambda: [extract_queue.put((task, sample, time.time())) for task, sample in to_extract], daemon=True)
+    resume_extract.start()
+
+    # one observer, aligner index and thread budget serve every watched dir and sample
+    event_handler = FQFileHandler(task_queue, journal, router, states.keys())
     observer = Observer()
-    observer.schedule(event_handler, args.fastq_dir, recursive=False)
+    for watch_dir in watch_dirs:
+        if os.path.isdir(watch_dir):
+            observer.schedule(event_handler, watch_dir, recursive=recursive)
     observer.start()
-    time_out = False
-    interval = 150
-    while True:  # 防止对空的sigs文件夹进行聚类
-        time.sleep(interval)  # 
-        if time_out == False:
-            if time.time() - event_handler.last_event_time > args.monitor_fade or shared_value == True:
-                time_out = True
-                with open(task_list_path,"a") as f:
-                    f.write(f"end observer at {time.time()}\n")
-                observer.stop()
-                observer.join()
-                task_queue.put(None)
-        if time_out and task_queue.empty():
+    # wait for the stop event until monitor_fade runs out; a new file postpones the timeout
+    while True:
+        remaining = args.monitor_fade - (time.time() - event_handler.last_event_time)
+        if remaining <= 0:
+            publish_stop(args.work_dir, "monitor_fade")
             break
-
-    p.join()
-    if shared_value != True:
-        cutesv_combine_cluster(args.work_dir, args.output_vcf, args.threads, args.reference,  
-                                args.high_freq_file, args.sv_freq, args.recall_file, args.user_defined, args.pctsize, args.ref_dist)
+        if stop_event.wait(timeout=remaining):
+            break
+    logging.info(f"Observer stopped at {time.time()}")
+    observer.stop()
+    observer.join()
+    event_handler.stop()
+    resume_extract.join()
+    for i in range(args.file_workers):
+        task_queue.put(None)
+
+    # the stages exit once they processed the files left in their queues (skipped after an early stop)
+    for p in stages:
+        p.join()
+    if not stop_event.is_set():
+        states = journal.states()
+        for sample in sorted(journal.samples()):
+            if sample_stopped(args.work_dir, sample):
+                continue
+            extracted = [task for task, (state, task_sample) in states.items() if state == EXTRACTED and task_sample == sample]
+            if len(extracted) == 0:
+                # the last snapshot already holds every file of the sample
+                continue
+            cutesv_combine_cluster(sample_dir(args.work_dir, sample), sample_vcf_dir(args.output_vcf, sample), args.threads, args.reference,  
+                                    args.high_freq_file, args.sv_freq, sample_recall_file(args.work_dir, sample, args.recall_file), 
+                                    args.user_defined, args.pctsize, args.ref_dist, journal, sample)
+            journal.mark(extracted, CLUSTERED)
 
 
 
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+
+import numpy as np
+
+# reads fingerprinted and checked against the filter at once
+CHUNK_READS = 4096
+
+
+def fingerprints(names):
+    """Two 64-bit hashes per read ID; the first one is also its exact fingerprint."""
+    digests = b"".join(hashlib.blake2b(name.encode(), digest_size=16).digest() for name in names)
+    pairs = np.frombuffer(digests, dtype=np.uint64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+class ReadIdFilter():
+    """
+    Read IDs already aligned in this run. A Bloom filter in read_ids/bloom.bits
+    answers most lookups; its positives are confirmed against the sorted
+    64-bit fingerprints of every aligned fastq, read_ids/<name>.npy. Both
+    are only extended once a fastq was aligned. While a fastq is being
+    aligned its read IDs are reserved chunk by chunk in
+    read_ids/<name>.inflight, checked and extended under one lock, so
+    concurrent align workers never keep the same read twice. A new attempt
+    drops the reservations of the failed one. Must be created before the
+    stage processes are started.
+    """
+
+    def __init__(self, directory, capacity, error_rate=0.01):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        params_path = directory + "bloom.json"
+        if os.path.exists(params_path):
+            with open(params_path, 'r') as f:
+                params = json.load(f)
+        else:
+            bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2 / 8) * 8
+            params = {"bits": bits, "hashes": max(1, round(bits / capacity * math.log(2)))}
+            with open(directory + "bloom.bits", 'wb') as f:
+                f.truncate(bits // 8)
+            with open(params_path, 'w') as f:
+                json.dump(params, f)
+        self.bits = params["bits"]
+        self.hashes = params["hashes"]
+        self.lock = multiprocessing.Lock()
+        self.pid = None
+        self.bloom = None
+        self.known = np.empty(0, dtype=np.uint64)
+        self.loaded = set()
+
+    def open(self):
+        # the memory map is not carried over fork()
+        if self.pid != os.getpid():
+            self.bloom = np.memmap(self.directory + "bloom.bits", dtype=np.uint8, mode='r+')
+            self.pid = os.getpid()
+        return self.bloom
+
+    def positions(self, h1, h2):
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        positions = (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.bits)
+        return positions >> np.uint64(3), (positions & np.uint64(7)).astype(np.uint8)
+
+    def maybe_seen(self, h1, h2):
+        byte, bit = self.positions(h1, h2)
+        return ((self.open()[byte] >> bit) & 1).all(axis=1)
+
+    def seen(self, fps, exclude):
+        """Exact check against the fingerprints of every aligned fastq except exclude."""
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".npy") and file_name not in self.loaded and file_name != exclude + ".npy":
+                self.known = np.union1d(self.known, np.load(self.directory + file_name))
+                self.loaded.add(file_name)
+        index = np.searchsorted(self.known, fps)
+        index[index == len(self.known)] = 0
+        return self.known[index] == fps if len(self.known) != 0 else np.zeros(len(fps), dtype=bool)
+
+    def inflight(self, exclude):
+        """Fingerprints reserved by the fastqs being aligned except exclude."""
+        parts = [np.fromfile(self.directory + file_name, dtype=np.uint64) for file_name in os.listdir(self.directory)
+                 if file_name.endswith(".inflight") and file_name != exclude + ".inflight"]
+        return np.concatenate(parts) if len(parts) != 0 else np.empty(0, dtype=np.uint64)
+
+    def claim(self, name, h1, h2):
+        """
+        Mask of the reads whose ID was neither aligned nor is reserved by
+        another fastq; their IDs are reserved for name.
+        """
+        with self.lock:
+            duplicate = self.maybe_seen(h1, h2)
+            if duplicate.any():
+                duplicate[duplicate] = self.seen(h1[duplicate], name)
+            duplicate |= np.isin(h1, self.inflight(name))
+            with open(f"{self.directory}{name}.inflight", 'ab') as f:
+                f.write(h1[~duplicate].tobytes())
+        return ~duplicate
+
+    def unique(self, reads, name):
+        return UniqueReads(self, reads, name)
+
+    def commit(self, name, h1, h2):
+        path = f"{self.directory}{name}.npy"
+        with open(path + ".tmp", 'wb') as f:
+            np.save(f, np.unique(h1))
+        byte, bit = self.positions(h1, h2)
+        bloom = self.open()
+        # the reservation is only dropped once the IDs can be found as aligned
+        with self.lock:
+            os.replace(path + ".tmp", path)
+            np.bitwise_or.at(bloom, byte.ravel(), (np.uint8(1) << bit).ravel())
+            bloom.flush()
+            self.release(name)
+
+    def release(self, name):
+        path = f"{self.directory}{name}.inflight"
+        if os.path.exists(path):
+            os.remove(path)
+
+    def forget(self, name):
+        """Drop the aligned and reserved IDs of a fastq that is aligned again or given up."""
+        with self.lock:
+            path = f"{self.directory}{name}.npy"
+            if os.path.exists(path):
+                os.remove(path)
+            self.release(name)
+
+
+class UniqueReads():
+    """
+    Yields the (name, seq, qual) records of reads whose ID was not aligned
+    before or is being aligned, in this fastq or another one. commit()
+    records the IDs once the fastq is aligned.
+    """
+
+    def __init__(self, read_filter, reads, name):
+        self.read_filter = read_filter
+        self.reads = reads
+        self.name = name
+        self.duplicates = 0
+        self.h1 = list()
+        self.h2 = list()
+
+    def __iter__(self):
+        with self.read_filter.lock:
+            self.read_filter.release(self.name)
+        own = set()
+        chunk = list()
+        for record in self.reads:
+            chunk.append(record)
+            if len(chunk) == CHUNK_READS:
+                yield from self.check(chunk, own)
+                chunk = list()
+        if len(chunk) != 0:
+            yield from self.check(chunk, own)
+
+    def check(self, chunk, own):
+        h1, h2 = fingerprints([record[0] for record in chunk])
+        duplicate = ~self.read_filter.claim(self.name, h1, h2)
+        keep = list()
+        for i, record in enumerate(chunk):
+            fp = int(h1[i])
+            if duplicate[i] or fp in own:
+                self.duplicates += 1
+                continue
+            own.add(fp)
+            keep.append(i)
+            yield record
+        self.h1.append(h1[keep])
+        self.h2.append(h2[keep])
+
+    def commit(self):
+        if len(self.h1) != 0:
+            self.read_filter.commit(self.name, np.concatenate(self.h1), np.concatenate(self.h2))
@@ -0,0 +1,59 @@
+import multiprocessing
+
+ALIGN = 0
+EXTRACT = 1
+CLUSTER = 2
+STAGE_NAMES = ["align", "extract", "cluster"]
+
+
+class ThreadBudget():
+    """
+    One global pool of threads shared by every stage process. Before a job
+    starts it asks for threads; the answer depends on how much work is
+    pending in each stage, so a growing alignment backlog pulls cores away
+    from extraction and the other way around. Must be created before the
+    stage processes are started.
+    """
+
+    def __init__(self, total, workers):
+        self.total = max(1, total)
+        # processes per stage, bounds how many jobs of a stage can run at once
+        self.workers = workers
+        self.cond = multiprocessing.Condition()
+        self.free = multiprocessing.Value('i', self.total, lock=False)
+        # jobs holding threads, jobs waiting for threads, and queued files per stage
+        self.active = multiprocessing.Array('i', len(STAGE_NAMES), lock=False)
+        self.waiting = multiprocessing.Array('i', len(STAGE_NAMES), lock=False)
+        self.backlog = multiprocessing.Array('i', len(STAGE_NAMES), lock=False)
+
+    def share(self, stage):
+        demand = [self.active[i] + self.waiting[i] + max(self.backlog[i], 0) for i in range(len(STAGE_NAMES))]
+        if demand[stage] == 0:
+            return 0
+        stage_threads = self.total * demand[stage] // sum(demand)
+        # split evenly over the jobs expected to run side by side in this stage,
+        # so the first file of a backlog does not take every free thread
+        jobs = min(max(self.backlog[stage], self.active[stage] + self.waiting[stage]), self.workers[stage])
+        return max(1, stage_threads // max(jobs, 1))
+
+    def acquire(self, stage, backlog=0):
+        with self.cond:
+            self.backlog[stage] = backlog
+            self.waiting[stage] += 1
+            while self.free.value == 0:
+                self.cond.wait()
+            threads = min(self.share(stage), self.free.value)
+            self.waiting[stage] -= 1
+            self.active[stage] += 1
+            self.free.value -= threads
+        return threads
+
+    def release(self, stage, threads):
+        with self.cond:
+            self.free.value += threads
+            self.active[stage] -= 1
+            self.cond.notify_all()
+
+    def usage(self):
+        with self.cond:
+            return "\t".join(f"{STAGE_NAMES[i]}={self.active[i]}" for i in range(len(STAGE_NAMES))) + f"\tfree={self.free.value}"
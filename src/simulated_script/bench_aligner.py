@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+End-to-end per-file wall time of the two alignment backends of cuteSV-OL.
+
+usage: bench_aligner.py <reference.fa> <ref.mmi> <out_dir> <fastq> [<fastq> ...] [--threads N]
+
+Each fastq is aligned, sorted and indexed into <out_dir>/<backend>/ with the
+minimap2 subprocess backend (index reloaded per file) and with the resident
+mappy backend (index loaded once, load time reported separately).
+"""
+import argparse
+import os
+import sys
+import time
+
+import pysam
+
+from online.aligner import Minimap2Aligner, MappyAligner, mappy
+from online.fastq import FastqValidator
+
+
+def run_backend(aligner, fastq_files, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    timings = []
+    for fq_path in fastq_files:
+        name = os.path.basename(fq_path).split('.')[0]
+        bam_path = os.path.join(out_dir, name + ".bam")
+        start = time.time()
+        aligner.align_to_bam(FastqValidator(fq_path, bam_path + ".bad"), bam_path)
+        pysam.index(bam_path)
+        timings.append((name, time.time() - start))
+    return timings
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="bench_aligner")
+    parser.add_argument("reference", type=str)
+    parser.add_argument("mmi_path", type=str)
+    parser.add_argument("out_dir", type=str)
+    parser.add_argument("fastq", type=str, nargs='+')
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--platform", type=str, default="map-ont")
+    args = parser.parse_args(argv)
+
+    results = {}
+    aligner = Minimap2Aligner(args.mmi_path, args.platform, args.threads)
+    results["minimap2"] = run_backend(aligner, args.fastq, os.path.join(args.out_dir, "minimap2"))
+    load_time = 0.0
+    if mappy is None:
+        print("mappy is not installed, only the minimap2 backend was measured.")
+    else:
+        start = time.time()
+        aligner = MappyAligner(args.mmi_path, args.reference, args.platform, args.threads)
+        load_time = time.time() - start
+        results["mappy"] = run_backend(aligner, args.fastq, os.path.join(args.out_dir, "mappy"))
+
+    backends = list(results.keys())
+    print("file\t" + "\t".join("%s(s)"%b for b in backends))
+    for i, fq_path in enumerate(args.fastq):
+        print(results[backends[0]][i][0] + "\t" + "\t".join("%.2f"%results[b][i][1] for b in backends))
+    for b in backends:
+        total = sum(t for _, t in results[b])
+        print("%s: total %.2f s, mean %.2f s per file"%(b, total, total / len(args.fastq)))
+    if "mappy" in results:
+        print("mappy index load (once per session): %.2f s"%(load_time))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
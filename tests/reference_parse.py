@@ -0,0 +1,623 @@
+"""
+Python signature extraction of cuteSV before it was compiled
+(read_sigs.parse_signatures), kept as the reference the compiled one is
+checked against. Only the cigar package and prove_func.pre_mal are
+replaced by the plain Python they stood for.
+"""
+
+import re
+
+# the op tables of prove_func, indexed by pysam CIGAR op code
+INDELOP = [op in (1, 2) for op in range(10)]
+REFCHANGEOP = [op in (0, 2, 3, 7, 8) for op in range(10)]
+
+dic_starnd = {1: '+', 2: '-'}
+RefChangeOp=set([0,2,7,8])
+signal = {1 << 2: 0, \
+            1 >> 1: 1, \
+            1 << 4: 2, \
+            1 << 11: 3, \
+            1 << 4 | 1 << 11: 4}
+'''
+    1 >> 1 means normal_foward read
+    1 << 2 means unmapped read
+    1 << 4 means reverse_complement read
+    1 << 11 means supplementary alignment read
+    1 << 4 | 1 << 11 means supplementary alignment with reverse_complement read
+'''
+def detect_flag(Flag):
+    back_sig = signal[Flag] if Flag in signal else 0
+    return back_sig
+
+def analysis_inv(ele_1, ele_2, read_name, candidate, SV_size):
+    if ele_1[5] == '+':
+        # +-
+        if ele_1[3] - ele_2[3] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_1[3] - ele_2[3]) >= ele_1[1]:
+                candidate.append(("++", 
+                                    ele_2[3], 
+                                    ele_1[3], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # head-to-head
+                # 5'->5'
+        if ele_2[3] - ele_1[3] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_2[3] - ele_1[3]) >= ele_1[1]:
+                candidate.append(("++", 
+                                    ele_1[3], 
+                                    ele_2[3], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # head-to-head
+                # 5'->5'
+    else:
+        # -+
+        if ele_2[2] - ele_1[2] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_2[2] - ele_1[2]) >= ele_1[1]:
+                candidate.append(("--", 
+                                    ele_1[2], 
+                                    ele_2[2], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # tail-to-tail
+                # 3'->3'
+        if ele_1[2] - ele_2[2] >= SV_size:
+            if ele_2[0] + 0.5 * (ele_1[2] - ele_2[2]) >= ele_1[1]:
+                candidate.append(("--", 
+                                    ele_2[2], 
+                                    ele_1[2], 
+                                    read_name,
+                                    "INV",
+                                    ele_1[4]))
+                # tail-to-tail
+                # 3'->3'
+
+
+def analysis_bnd(ele_1, ele_2, read_name, candidate):
+    '''
+    *********Description*********
+    *	TYPE A:		N[chr:pos[	*
+    *	TYPE B:		N]chr:pos]	*
+    *	TYPE C:		[chr:pos[N	*
+    *	TYPE D:		]chr:pos]N	*
+    *****************************
+    '''
+    if ele_2[0] - ele_1[1] <= 100:
+        if ele_1[5] == '+':
+            if ele_2[5] == '+':
+                # +&+
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('A', 
+                                        ele_1[3], 
+                                        ele_2[4], 
+                                        ele_2[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # N[chr:pos[
+                else:
+                    candidate.append(('D', 
+                                        ele_2[2], 
+                                        ele_1[4], 
+                                        ele_1[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # ]chr:pos]N
+            else:
+                # +&-
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('B', 
+                                        ele_1[3], 
+                                        ele_2[4], 
+                                        ele_2[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # N]chr:pos]
+                else:
+                    candidate.append(('B', 
+                                        ele_2[3], 
+                                        ele_1[4], 
+                                        ele_1[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # N]chr:pos]
+        else:
+            if ele_2[5] == '+':
+                # -&+
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('C', 
+                                        ele_1[2], 
+                                        ele_2[4], 
+                                        ele_2[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # [chr:pos[N
+                else:
+                    candidate.append(('C', 
+                                        ele_2[2], 
+                                        ele_1[4], 
+                                        ele_1[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # [chr:pos[N
+            else:
+                # -&-
+                if ele_1[4] < ele_2[4]:
+                    candidate.append(('D', 
+                                        ele_1[2], 
+                                        ele_2[4], 
+                                        ele_2[3], 
+                                        read_name,
+                                        "TRA",
+                                        ele_1[4]))
+                    # ]chr:pos]N
+                else:
+                    candidate.append(('A', 
+                                        ele_2[3], 
+                                        ele_1[4], 
+                                        ele_1[2], 
+                                        read_name,
+                                        "TRA",
+                                        ele_2[4]))
+                    # N[chr:pos[
+
+def analysis_split_read(split_read, SV_size, RLength, read_name, candidate, MaxSize, query):
+    '''
+    read_start	read_end	ref_start	ref_end	chr	strand
+    #0			#1			#2			#3		#4	#5
+    '''
+    SP_list = sorted(split_read, key = lambda x:x[0])
+    # print(read_name)
+    # for i in SP_list:
+    #     print(i)
+
+    # detect INS involoved in a translocation
+    trigger_INS_TRA = 0	
+
+    # Store Strands of INV
+
+    if len(SP_list) == 2:
+        ele_1 = SP_list[0]
+        ele_2 = SP_list[1]
+        if ele_1[4] == ele_2[4]:
+            if ele_1[5] != ele_2[5]:
+                analysis_inv(ele_1, 
+                                ele_2, 
+                                read_name, 
+                                candidate["INV"],
+                                SV_size)
+
+            else:
+                # dup & ins & del 
+                a = 0
+                if ele_1[5] == '-':
+                    ele_1 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
+                    ele_2 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
+                    query = query[::-1]
+
+                if ele_1[3] - ele_2[2] >= SV_size:
+                    # if ele_2[1] - ele_1[1] >= ele_1[3] - ele_2[2]:
+                    if ele_2[0] - ele_1[1] >= ele_1[3] - ele_2[2]:
+                        candidate["INS"].append(((ele_1[3]+ele_2[2])/2, 
+                                        ele_2[0]+ele_1[3]-ele_2[2]-ele_1[1], 
+                                        read_name,
+                                        str(query[ele_1[1]+int((ele_1[3]-ele_2[2])/2):ele_2[0]-int((ele_1[3]-ele_2[2])/2)]),
+                                        "INS",
+                                        ele_2[4]))
+                    else:
+                        candidate["DUP"].append((ele_2[2], 
+                                            ele_1[3], 
+                                            read_name,
+                                            "DUP",
+                                            ele_2[4]))
+
+                delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                    if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                        candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                            delta_length, 
+                                            read_name,
+                                            str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                            "INS",
+                                            ele_2[4]))
+                delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                    if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                        candidate["DEL"].append((ele_1[3], 
+                                            delta_length, 
+                                            read_name,
+                                            "DEL",
+                                            ele_2[4]))
+        else:
+            trigger_INS_TRA = 1
+            analysis_bnd(ele_1, ele_2, read_name, candidate["TRA"])
+
+    else:
+        # over three splits
+        for a in range(len(SP_list[1:-1])):
+            ele_1 = SP_list[a]
+            ele_2 = SP_list[a+1]
+            ele_3 = SP_list[a+2]
+
+            if ele_1[4] == ele_2[4]:
+                if ele_2[4] == ele_3[4]:
+                    if ele_1[5] == ele_3[5] and ele_1[5] != ele_2[5]:
+                        if ele_2[5] == '-':
+                            # +-+
+                            if ele_2[0] + 0.5 * (ele_3[2] - ele_1[3]) >= ele_1[1] and ele_3[0] + 0.5 * (ele_3[2] - ele_1[3]) >= ele_2[1]:
+                                # No overlaps in split reads
+
+                                if ele_2[2] >= ele_1[3] and ele_3[2] >= ele_2[3]:
+                                    candidate["INV"].append(("++", 
+                                                        ele_1[3], 
+                                                        ele_2[3], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # head-to-head
+                                    # 5'->5'
+                                    candidate["INV"].append(("--", 
+                                                        ele_2[2], 
+                                                        ele_3[2], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # tail-to-tail
+                                    # 3'->3'
+                        else:
+                            # -+-
+                            if ele_1[1] <= ele_2[0] + 0.5 * (ele_1[2] - ele_3[3]) and ele_3[0] + 0.5 * (ele_1[2] - ele_3[3]) >= ele_2[1]:
+                                # No overlaps in split reads
+
+                                if ele_2[2] - ele_3[3] >= -50 and ele_1[2] - ele_2[3] >= -50:
+                                    candidate["INV"].append(("++", 
+                                                        ele_3[3], 
+                                                        ele_2[3], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # head-to-head
+                                    # 5'->5'
+                                    candidate["INV"].append(("--", 
+                                                        ele_2[2], 
+                                                        ele_1[2], 
+                                                        read_name,
+                                                        "INV",
+                                                        ele_1[4]))
+                                    # tail-to-tail
+                                    # 3'->3'	
+
+                    if len(SP_list) - 3 == a:
+                        if ele_1[5] != ele_3[5]:
+                            if ele_2[5] == ele_1[5]:
+                                # ++-/--+
+                                analysis_inv(ele_2, 
+                                                ele_3, 
+                                                read_name, 
+                                                candidate["INV"], 
+                                                SV_size)
+                            else:
+                                # +--/-++
+                                analysis_inv(ele_1, 
+                                                ele_2, 
+                                                read_name, 
+                                                candidate["INV"], 
+                                                SV_size)
+
+                    if ele_1[5] == ele_3[5] and ele_1[5] == ele_2[5]:
+                        # dup & ins & del 
+                        if ele_1[5] == '-':
+                            ele_1 = [RLength-SP_list[a+2][1], RLength-SP_list[a+2][0]]+SP_list[a+2][2:]
+                            ele_2 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
+                            ele_3 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
+                            query = query[::-1]
+
+                        if ele_2[3] - ele_3[2] >= SV_size and ele_2[2] < ele_3[3]:
+                            candidate["DUP"].append((ele_3[2], 
+                                                ele_2[3], 
+                                                read_name,
+                                                "DUP",
+                                                ele_2[4]))
+
+                        if a == 0:
+                            if ele_1[3] - ele_2[2] >= SV_size:
+                                candidate["DUP"].append((ele_2[2], 
+                                                    ele_1[3], 
+                                                    read_name,
+                                                    "DUP",
+                                                    ele_2[4]))
+
+                        delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                if ele_3[2] >= ele_2[3]:
+                                    candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                                        delta_length, 
+                                                        read_name,
+                                                        str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                                        "INS",
+                                                        ele_2[4]))
+                        delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                if ele_3[2] >= ele_2[3]:
+                                    candidate["DEL"].append((ele_1[3], 
+                                                        delta_length, 
+                                                        read_name,
+                                                        "DEL",
+                                                        ele_2[4]))
+                        
+                        if len(SP_list) - 3 == a:
+                            ele_1 = ele_2
+                            ele_2 = ele_3
+
+                            delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                            if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                                if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                    candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                                        delta_length, 
+                                                        read_name,
+                                                        str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                                        "INS",
+                                                        ele_2[4]))
+
+                            delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                            if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3] >= SV_size:
+                                if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                    candidate["DEL"].append((ele_1[3], 
+                                                        delta_length, 
+                                                        read_name,
+                                                        "DEL",
+                                                        ele_2[4]))
+
+                    if len(SP_list) - 3 == a and ele_1[5] != ele_2[5] and ele_2[5] == ele_3[5]:
+                        ele_1 = ele_2
+                        ele_2 = ele_3
+                        ele_3 = None
+                    if ele_3 == None or (ele_1[5] == ele_2[5] and ele_2[5] != ele_3[5]):
+                        if ele_1[5] == '-':
+                            ele_1 = [RLength-SP_list[a+1][1], RLength-SP_list[a+1][0]]+SP_list[a+1][2:]
+                            ele_2 = [RLength-SP_list[a][1], RLength-SP_list[a][0]]+SP_list[a][2:]
+                            query = query[::-1]
+                        delta_length = ele_2[0] + ele_1[3] - ele_2[2] - ele_1[1]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[2] - ele_1[3] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                candidate["INS"].append(((ele_2[2]+ele_1[3])/2, 
+                                                    delta_length, 
+                                                    read_name,
+                                                    str(query[ele_1[1]+int((ele_2[2]-ele_1[3])/2):ele_2[0]-int((ele_2[2]-ele_1[3])/2)]),
+                                                    "INS",
+                                                    ele_2[4]))
+
+                        delta_length = ele_2[2] - ele_2[0] + ele_1[1] - ele_1[3]
+                        if ele_1[3] - ele_2[2] < max(SV_size, delta_length/5) and delta_length >= SV_size:
+                            if ele_2[0] - ele_1[1] <= max(100, delta_length/5) and (delta_length <= MaxSize or MaxSize == -1):
+                                candidate["DEL"].append((ele_1[3], 
+                                                    delta_length, 
+                                                    read_name,
+                                                    "DEL",
+                                                    ele_2[4]))
+
+            else:
+                trigger_INS_TRA = 1
+                analysis_bnd(ele_1, ele_2, read_name, candidate["TRA"])
+
+                if len(SP_list) - 3 == a:
+                    if ele_2[4] != ele_3[4]:
+                        analysis_bnd(ele_2, ele_3, read_name, candidate["TRA"])
+
+    if len(SP_list) >= 3 and trigger_INS_TRA == 1:
+        if SP_list[0][4] == SP_list[-1][4]:
+            if SP_list[0][5] != SP_list[-1][5]:
+                pass
+            else:
+                if SP_list[0][5] == '+':
+                    ele_1 = SP_list[0]
+                    ele_2 = SP_list[-1]
+                else:
+                    ele_1 = [RLength-SP_list[-1][1], RLength-SP_list[-1][0]]+SP_list[-1][2:]
+                    ele_2 = [RLength-SP_list[0][1],RLength-SP_list[0][0]]+SP_list[0][2:]
+                    query = query[::-1]
+                dis_ref = ele_2[2] - ele_1[3]
+                dis_read = ele_2[0] - ele_1[1]
+                if dis_ref < 100 and dis_read - dis_ref >= SV_size and (dis_read - dis_ref <= MaxSize or MaxSize == -1):
+                    candidate["INS"].append((min(ele_2[2], ele_1[3]), 
+                                        dis_read - dis_ref, 
+                                        read_name,
+                                        str(query[ele_1[1]+int(dis_ref/2):ele_2[0]-int(dis_ref/2)]),
+                                        "INS",
+                                        ele_2[4]))	
+
+                if dis_ref <= -SV_size:
+                    candidate["DUP"].append((ele_2[2], 
+                                        ele_1[3], 
+                                        read_name,
+                                        "DUP",
+                                        ele_2[4]))
+
+def acquire_clip_pos(deal_cigar):
+    seq = [(int(length), op) for length, op in re.findall(r"(\d+)([MIDNSHP=X])", deal_cigar)]
+    if seq[0][1] == 'S':
+        first_pos = seq[0][0]
+    else:
+        first_pos = 0
+    if seq[-1][1] == 'S':
+        last_pos = seq[-1][0]
+    else:
+        last_pos = 0
+
+    bias = 0
+    for i in seq:
+        if i[1] == 'M' or i[1] == 'D' or i[1] == '=' or i[1] == 'X':
+            bias += i[0]
+    return [first_pos, last_pos, bias]
+
+def organize_split_signal(primary_info, Supplementary_info, total_L, SV_size, 
+    min_mapq, max_split_parts, read_name, candidate, MaxSize, query):
+    split_read = list()
+    if len(primary_info) > 0:
+        split_read.append(primary_info)
+        min_mapq = 0
+    for i in Supplementary_info:
+        seq = i.split(',')
+        local_chr = seq[0]
+        local_start = int(seq[1])
+        local_cigar = seq[3]
+        local_strand = seq[2]
+        local_mapq = int(seq[4])
+        if local_mapq >= min_mapq:
+            local_set = acquire_clip_pos(local_cigar)
+            if local_strand == '+':
+                 split_read.append([local_set[0], total_L-local_set[1], local_start, 
+                     local_start+local_set[2], local_chr, local_strand])
+            else:
+                try:
+                    split_read.append([local_set[1], total_L-local_set[0], local_start, 
+                        local_start+local_set[2], local_chr, local_strand])
+                except:
+                    pass
+    if len(split_read) <= max_split_parts or max_split_parts == -1:
+        analysis_split_read(split_read, SV_size, total_L, read_name, candidate, MaxSize, query)
+
+def generate_combine_sigs(sigs, Chr_name, read_name, svtype, candidate, merge_dis):
+    if len(sigs) == 0:
+        pass
+    elif len(sigs) == 1:
+        if svtype == 'INS':
+            candidate.append((sigs[0][0], 
+                                            sigs[0][1], 
+                                            read_name,
+                                            sigs[0][2],
+                                            svtype,
+                                            Chr_name))
+        else:
+            candidate.append((sigs[0][0], 
+                                            sigs[0][1], 
+                                            read_name,
+                                            svtype,
+                                            Chr_name))
+    else:
+        temp_sig = sigs[0]
+        if svtype == "INS":
+            temp_sig += [sigs[0][0]]
+            for i in sigs[1:]:
+                if i[0] - temp_sig[3] <= merge_dis:
+                    temp_sig[1] += i[1]
+                    temp_sig[2] += i[2]
+                    temp_sig[3] = i[0]
+                else:
+                    candidate.append((temp_sig[0], 
+                                                        temp_sig[1], 
+                                                        read_name,
+                                                        temp_sig[2],
+                                                        svtype,
+                                                        Chr_name))
+                    temp_sig = i
+                    temp_sig.append(i[0])
+            candidate.append((temp_sig[0], 
+                                                temp_sig[1], 
+                                                read_name,
+                                                temp_sig[2],
+                                                svtype,
+                                                Chr_name))
+        else:
+            temp_sig += [sum(sigs[0])]
+            # merge_dis_bias = max([i[1]] for i in sigs)
+            for i in sigs[1:]:
+                if i[0] - temp_sig[2] <= merge_dis:
+                    temp_sig[1] += i[1]
+                    temp_sig[2] = sum(i)
+                else: 
+                    candidate.append((temp_sig[0], 
+                                                        temp_sig[1], 
+                                                        read_name,
+                                                        svtype,
+                                                        Chr_name))
+                    temp_sig = i
+                    temp_sig.append(i[0])
+            candidate.append((temp_sig[0], 
+                                                temp_sig[1], 
+                                                read_name,
+                                                svtype,
+                                                Chr_name))
+
+def parse_read(read, candidate, Chr_name, SV_size, min_mapq, max_split_parts, min_read_len, min_siglength, merge_del_threshold, merge_ins_threshold, MaxSize):
+    if read.query_length < min_read_len:
+        return []
+    Combine_sig_in_same_read_ins = list()
+    Combine_sig_in_same_read_del = list()
+
+    #new start
+    process_signal = detect_flag(read.flag)
+    if read.mapq >= min_mapq:
+        pos_start = read.reference_start # 0-based
+        pos_end = read.reference_end
+        sig_start=pos_start
+        softclip_left = 0
+        softclip_right = 0
+        hardclip_left = 0
+        hardclip_right = 0
+        # shift_ins_read = 0
+        if read.cigar[0][0] == 4:
+            softclip_left = read.cigar[0][1]
+        elif read.cigar[0][0] == 5:
+            hardclip_left = read.cigar[0][1]
+        
+        # prove_func.pre_mal
+        shift_ins_read=-hardclip_left
+        for op, oplen in read.cigartuples:
+            # calculate offset of an ins sig in read
+            if op != 2:#might be fixed later
+                shift_ins_read += oplen
+            if oplen >= min_siglength and INDELOP[op]:
+                if op==2:
+                    Combine_sig_in_same_read_del.append([sig_start, oplen])
+                    sig_start += oplen
+                else:
+                    Combine_sig_in_same_read_ins.append([sig_start, oplen,
+                        str(read.query_sequence[shift_ins_read-oplen:shift_ins_read])])
+            else:
+                # if op in RefChangeOp:
+                if REFCHANGEOP[op]:
+                    sig_start += oplen
+
+        if read.cigar[-1][0] == 4:
+            softclip_right = read.cigar[-1][1]
+        elif read.cigar[-1][0] == 5:
+            hardclip_right = read.cigar[-1][1]
+
+        if hardclip_left != 0:
+            softclip_left = hardclip_left
+        if hardclip_right != 0:
+            softclip_right = hardclip_right
+
+    # ************Combine signals in same read********************
+    generate_combine_sigs(Combine_sig_in_same_read_ins, Chr_name, read.query_name, "INS", candidate["INS"], merge_ins_threshold)
+    generate_combine_sigs(Combine_sig_in_same_read_del, Chr_name, read.query_name, "DEL", candidate["DEL"], merge_del_threshold)
+
+    if process_signal == 1 or process_signal == 2: # 0 / 16
+        Tags = read.get_tags()
+        if read.mapq >= min_mapq:
+            if process_signal == 1:
+                primary_info = [softclip_left, read.query_length-softclip_right, pos_start, 
+                pos_end, Chr_name, dic_starnd[process_signal]]
+            else:
+                primary_info = [softclip_right, read.query_length-softclip_left, pos_start, 
+                pos_end, Chr_name, dic_starnd[process_signal]]
+        else:
+            primary_info = []
+
+        for i in Tags:
+            if i[0] == 'SA':
+                Supplementary_info = i[1].split(';')[:-1]
+                organize_split_signal(primary_info, Supplementary_info, read.query_length, 
+                    SV_size, min_mapq, max_split_parts, read.query_name, candidate, MaxSize, read.query_sequence)
+    return candidate
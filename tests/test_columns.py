@@ -0,0 +1,70 @@
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cuteSV.cuteSV_columns import PackedSeqs, concat, decode, encode, pack, pack_seqs, read_segments, take, unpack_seqs
+
+EDGE_SEQS = ["", "N", "NNNN", "NNNNNNN", "A", "ACG", "ACGT", "ACGTA", "NACGT", "ACGTN", "NNACGTACGNN",
+             "ACNNNNGT", "NNNNACGTACGTNNNN", "ACGTRYKMN", "", "GATTACA", "NANANANA", "TTTTTTTTN"]
+
+
+def random_seqs(rng, count):
+    seqs = list()
+    for i in range(count):
+        seq = rng.choices("ACGT", k=rng.randrange(0, 60))
+        for j in range(rng.randrange(3)):
+            start = rng.randrange(len(seq) + 1)
+            seq[start:start + rng.randrange(1, 10)] = rng.choice("NNNR") * rng.randrange(1, 10)
+        seqs.append("".join(seq))
+    return seqs
+
+
+def ins_sigs(seqs, read="r"):
+    return [(1000 + 10 * i + (0.5 if i % 3 == 0 else 0), len(seq), "%s%d" % (read, i % 5), seq, "INS", "chr%d" % (i % 2 + 1))
+            for i, seq in enumerate(seqs)]
+
+
+def test_pack_unpack_round_trip():
+    rng = random.Random(5)
+    for seqs in (EDGE_SEQS, ["NNNNN"], [""], [], random_seqs(rng, 500)):
+        offsets, lengths, fps, blob = pack_seqs(seqs)
+        assert unpack_seqs(blob, offsets, lengths) == seqs
+        # equal sequences share their fingerprint
+        for seq, fp in zip(seqs, fps.tolist()):
+            assert fp == pack_seqs([seq])[2][0]
+
+
+def test_fetch_and_prefix():
+    offsets, lengths, fps, blob = pack_seqs(EDGE_SEQS)
+    segment = {"columns": {"seq": offsets, "seq.len": lengths}, "blobs": {"seq": blob}}
+    seqs = PackedSeqs(segment)
+    for row, seq in enumerate(EDGE_SEQS):
+        assert seqs.fetch(row) == seq
+        assert seqs.length(row) == len(seq)
+        for end in (0, 1, 3, 5, 100):
+            assert seqs.fetch(row, end) == seq[:end]
+
+
+def test_write_read_gather(tmp_path):
+    rng = random.Random(9)
+    parts = [EDGE_SEQS, random_seqs(rng, 200), ["NNNN", ""], random_seqs(rng, 50)]
+    path = str(tmp_path / "0INS.cols")
+    with open(path, "ab") as f:
+        for i, seqs in enumerate(parts):
+            f.write(pack(encode("INS", ins_sigs(seqs, "p%d_" % i))))
+    segments = read_segments(path)
+    assert [decode(segment) for segment in segments] == [ins_sigs(seqs, "p%d_" % i) for i, seqs in enumerate(parts)]
+    merged = concat("INS", segments)
+    expected = [sig for i, seqs in enumerate(parts) for sig in ins_sigs(seqs, "p%d_" % i)]
+    assert decode(merged) == expected
+    # a subset in another order keeps its sequences, also once compacted and written again
+    rows = np.array(rng.sample(range(len(expected)), 120))
+    subset = take(merged, rows)
+    assert decode(subset) == [expected[row] for row in rows.tolist()]
+    with open(str(tmp_path / "1INS.cols"), "wb") as f:
+        f.write(pack(subset))
+    assert decode(read_segments(str(tmp_path / "1INS.cols"))[0]) == [expected[row] for row in rows.tolist()]
@@ -0,0 +1,41 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cuteSV.cuteSV import BATCH_COMPLETE, update_coverage_summary
+
+
+def write_pickles(path, parts):
+    with open(path, "wb") as f:
+        for part in parts:
+            pickle.dump(part, f)
+
+
+def test_legacy_batches_count_their_reads(tmp_path):
+    temp_dir = f"{tmp_path}/"
+    sigs_dir = tmp_path / "signatures"
+    sigs_dir.mkdir()
+    # flat layout of older versions: <bam_name><pid>reads.pickle, no coverage
+    write_pickles(sigs_dir / "fq0101reads.pickle", [[(100, 1100, 1, "r1", "chr1"), (0, 500, 0, "r2", "chr2")],
+                                                    [(2000, 2300, 1, "r3", "chr1")]])
+    write_pickles(sigs_dir / "fq0101DEL.pickle", [[]])
+    batch_dir = sigs_dir / "fq02"
+    batch_dir.mkdir()
+    write_pickles(batch_dir / "202coverage.pickle", [{}, {"chr1": 5000}])
+    (batch_dir / BATCH_COMPLETE).touch()
+
+    summary = update_coverage_summary(temp_dir)
+    assert summary["bases"] == {"chr1": 1000 + 300 + 5000, "chr2": 500}
+    # batches are only counted once
+    assert update_coverage_summary(temp_dir)["bases"] == summary["bases"]
+
+
+def test_incomplete_batches_are_not_counted(tmp_path):
+    batch_dir = tmp_path / "signatures" / "fq03"
+    batch_dir.mkdir(parents=True)
+    write_pickles(batch_dir / "303coverage.pickle", [{"chr1": 700}])
+    assert update_coverage_summary(f"{tmp_path}/")["bases"] == {}
+    (batch_dir / BATCH_COMPLETE).touch()
+    assert update_coverage_summary(f"{tmp_path}/")["bases"] == {"chr1": 700}
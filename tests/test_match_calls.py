@@ -0,0 +1,90 @@
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from online.compare_model import build_target_index, match_calls
+
+
+def loop_match_calls(calls, target_index, pos_tolerance, length_lower_ratio, length_upper_ratio):
+    # the per-call bisect loop match_calls replaced
+    type_names = target_index["types"]
+    targets = target_index["chroms"]
+    matches = []
+    for call_idx, (chrom, input_id, pos, svtype, svlen) in enumerate(calls):
+        abs_svlen = abs(svlen)
+        if chrom in targets and svtype in type_names:
+            target = targets[chrom]
+            code = type_names.index(svtype)
+            left_index = np.searchsorted(target["pos"], pos - pos_tolerance, side='left')
+            right_index = np.searchsorted(target["pos"], pos + pos_tolerance, side='right')
+            for i in range(left_index, right_index):
+                if target["type"][i] != code:
+                    continue
+                candidate_abs_svlen = target["abs_svlen"][i]
+                lower_bound = length_lower_ratio * candidate_abs_svlen
+                upper_bound = length_upper_ratio * candidate_abs_svlen
+                if lower_bound <= abs_svlen <= upper_bound:
+                    matches.append((call_idx, chrom, i))
+    return matches
+
+
+def target_index(records):
+    highfreq = {}
+    for chrom, pos, svid, svtype, svlen in records:
+        highfreq.setdefault(chrom, []).append((pos, svid, svtype, svlen))
+    for chrom in highfreq:
+        highfreq[chrom].sort(key=lambda x: x[0])
+    return build_target_index(highfreq)
+
+
+def check(calls, index, tolerance=1000, lower=0.9, upper=1.1):
+    expected = loop_match_calls(calls, index, tolerance, lower, upper)
+    assert match_calls(calls, index, tolerance, lower, upper) == expected
+    return expected
+
+
+def test_boundaries():
+    index = target_index([("chr1", 5000, "t1", "DEL", -100), ("chr1", 5000, "t2", "INS", 100),
+                          ("chr1", 7000, "t3", "DEL", -1000), ("chr2", 100, "t4", "INV", 5000)])
+    calls = [
+        ("chr1", "c0", 4000, "DEL", -100),   # window starts at the target
+        ("chr1", "c1", 6000, "DEL", -90),    # window ends at the target, shortest length
+        ("chr1", "c2", 3999, "DEL", -100),   # one base too far
+        ("chr1", "c3", 5000, "DEL", -89),    # too short
+        ("chr1", "c4", 5000, "DEL", -111),   # too long
+        ("chr1", "c5", 5000, "INS", 110),    # other type at the same position
+        ("chr1", "c6", 6000, "DEL", -900),   # in reach of both DELs, matches the longer one
+        ("chr1", "c7", 5000, "DUP", 100),    # type without targets
+        ("chr3", "c8", 5000, "DEL", -100),   # chromosome without targets
+        ("chr2", "c9", 900, "INV", 5000),
+    ]
+    assert check(calls, index) == [(0, "chr1", 0), (1, "chr1", 0), (5, "chr1", 1), (6, "chr1", 2), (9, "chr2", 0)]
+
+
+def test_empty_inputs():
+    index = target_index([("chr1", 5000, "t1", "DEL", -100)])
+    assert check([], index) == []
+    assert check([("chr1", "c0", 5000, "DEL", -100)], target_index([])) == []
+    assert check([("chr1", "c0", 9000, "DEL", -100)], index) == []
+
+
+def test_random_calls_match_loop():
+    rng = random.Random(3)
+    types = ["DEL", "INS", "DUP", "INV", "BND"]
+    records = [(rng.choice(["chr1", "chr2", "chr3"]), rng.randrange(100000), "t%d" % i, rng.choice(types[:4]),
+                rng.choice([-1, 1]) * rng.randrange(0, 2000)) for i in range(2000)]
+    index = target_index(records)
+    # many calls on the targets themselves, so boundaries are hit too
+    calls = []
+    for i in range(3000):
+        chrom, pos, svid, svtype, svlen = rng.choice(records)
+        calls.append((rng.choice([chrom, "chr4"]) if rng.random() < 0.1 else chrom, "c%d" % i,
+                      pos + rng.choice([0, 1000, -1000, 1001, rng.randrange(-1500, 1500)]),
+                      rng.choice(types) if rng.random() < 0.3 else svtype,
+                      int(svlen * rng.choice([1, 0.9, 1.1, rng.uniform(0.8, 1.2)]))))
+    for tolerance, lower, upper in ((1000, 0.9, 1.1), (0, 0.7, 1.3), (500, 1.0, 1.0)):
+        assert len(check(calls, index, tolerance, lower, upper)) != 0
@@ -0,0 +1,162 @@
+import glob
+import os
+import random
+import sys
+
+import pysam
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import cuteSV.cuteSV as cutesv
+from cuteSV.cuteSV_columns import decode, read_segments
+from cuteSV.read_sigs import parse_signatures
+from reference_parse import parse_read
+
+SVTYPES = ["DEL", "INS", "DUP", "INV", "TRA"]
+CHROMS = [("chr1", 1000000), ("chr2", 1000000)]
+# SV_size, max_split_parts, min_read_len, min_siglength, merge_del, merge_ins, MaxSize
+PARAMS = (30, 7, 500, 30, 0, 500, 100000)
+FLAGS = [0, 0, 16, 16, 256, 272, 2048, 2064, 1024, 4]
+
+
+def random_seq(rng, length):
+    seq = rng.choices("ACGT", k=length)
+    # runs of N, at the ends of inserts too
+    for i in range(rng.randrange(3)):
+        start = rng.randrange(length + 1)
+        end = min(length, start + rng.randrange(1, 40))
+        seq[start:end] = "N" * (end - start)
+    return "".join(seq)
+
+
+def random_cigar(rng):
+    cigar = list()
+    if rng.random() < 0.6:
+        cigar.append((rng.choice([4, 5]), rng.randrange(1, 2000)))
+    cigar.append((0, rng.randrange(1, 500)))
+    for i in range(rng.randrange(12)):
+        op = rng.choice([0, 1, 1, 2, 2, 3, 7, 8])
+        cigar.append((op, rng.choice([rng.randrange(1, 30), rng.randrange(25, 800)])))
+        cigar.append((rng.choice([0, 7]), rng.randrange(1, 300)))
+    if rng.random() < 0.6:
+        cigar.append((rng.choice([4, 5]), rng.randrange(1, 2000)))
+    return cigar
+
+
+def random_sa(rng, query_length):
+    parts = list()
+    for i in range(rng.randrange(1, 5)):
+        chrom = rng.choice(CHROMS)[0]
+        left = rng.randrange(query_length)
+        matched = rng.randrange(1, query_length - left + 1)
+        right = query_length - left - matched
+        clip = rng.choice("SH")
+        middle = "%dM" % matched
+        if matched > 100 and rng.random() < 0.5:
+            middle = "%dM%dD%dM" % (matched // 2, rng.randrange(1, 500), matched - matched // 2)
+        cigar = ("%d%s" % (left, clip) if left else "") + middle + ("%d%s" % (right, clip) if right else "")
+        parts.append("%s,%d,%s,%s,%d,0;" % (chrom, rng.randrange(1, 900000), rng.choice("+-"), cigar, rng.randrange(61)))
+    return "".join(parts)
+
+
+def random_read(rng, header, index):
+    read = pysam.AlignedSegment(header)
+    read.query_name = "read%d" % index
+    read.flag = rng.choice(FLAGS)
+    if read.flag & 4:
+        read.reference_id = -1
+        read.reference_start = -1
+        read.mapping_quality = 0
+        read.query_sequence = random_seq(rng, rng.randrange(100, 3000))
+        return read
+    cigar = random_cigar(rng)
+    read.reference_id = rng.randrange(len(CHROMS))
+    read.reference_start = rng.randrange(100000)
+    read.mapping_quality = rng.randrange(61)
+    read.cigartuples = cigar
+    query_length = sum(length for op, length in cigar if op in (0, 1, 4, 7, 8))
+    read.query_sequence = random_seq(rng, query_length)
+    if rng.random() < 0.7 and query_length > 0:
+        read.set_tag("SA", random_sa(rng, query_length))
+    return read
+
+
+def random_reads(seed, count):
+    rng = random.Random(seed)
+    header = pysam.AlignmentHeader.from_dict({"SQ": [{"SN": name, "LN": length} for name, length in CHROMS]})
+    return header, [random_read(rng, header, i) for i in range(count)]
+
+
+def new_candidate():
+    return {sv_type: list() for sv_type in SVTYPES}
+
+
+def test_parse_signatures_matches_parse_read():
+    header, reads = random_reads(7, 3000)
+    SV_size, max_split_parts, min_read_len, min_siglength, merge_del, merge_ins, MaxSize = PARAMS
+    for min_mapq in (1, 20):
+        expected = new_candidate()
+        found = new_candidate()
+        for read in reads:
+            chrom = read.reference_name if read.reference_id >= 0 else "chr1"
+            parse_read(read, expected, chrom, SV_size, min_mapq, max_split_parts, min_read_len,
+                       min_siglength, merge_del, merge_ins, MaxSize)
+            parse_signatures(read, found, chrom, SV_size, min_mapq, max_split_parts, min_read_len,
+                             min_siglength, merge_del, merge_ins, MaxSize)
+        for sv_type in SVTYPES:
+            assert len(expected[sv_type]) != 0, sv_type
+            assert found[sv_type] == expected[sv_type], sv_type
+
+
+def reference_window(samfile, task, min_mapq):
+    # the read loop of single_pipe before parse_signatures
+    SV_size, max_split_parts, min_read_len, min_siglength, merge_del, merge_ins, MaxSize = PARAMS
+    candidate = new_candidate()
+    reads_info_list = list()
+    for read in samfile.fetch(task[0], task[1], task[2]):
+        if read.flag == 256 or read.flag == 272:
+            continue
+        if read.reference_start >= task[1]:
+            parse_read(read, candidate, task[0], SV_size, min_mapq, max_split_parts,
+                       min_read_len, min_siglength, merge_del, merge_ins, MaxSize)
+            if read.mapq >= min_mapq:
+                is_primary = 0
+                if read.flag in [0, 16]:
+                    is_primary = 1
+                reads_info_list.append((read.reference_start, read.reference_end, is_primary, read.query_name, task[0]))
+    candidate["reads"] = reads_info_list
+    return candidate
+
+
+def test_single_pipe_matches_reference(tmp_path):
+    header, reads = random_reads(11, 1500)
+    unsorted_path = str(tmp_path / "reads.unsorted.bam")
+    bam_path = str(tmp_path / "reads.bam")
+    with pysam.AlignmentFile(unsorted_path, "wb", header=header) as f:
+        for read in reads:
+            if not read.flag & 4:
+                f.write(read)
+    pysam.sort("-o", bam_path, unsorted_path)
+    pysam.index(bam_path)
+    temp_dir = f"{tmp_path}/"
+    cutesv.init_batch_dir(temp_dir, "b0")
+    tasks = [("chr1", 0, 50000), ("chr1", 50000, 200000), ("chr2", 0, 200000)]
+    min_mapq = 20
+    SV_size, max_split_parts, min_read_len, min_siglength, merge_del, merge_ins, MaxSize = PARAMS
+    cutesv.init_reading_process(bam_path, None)
+    try:
+        expected = {sv_type: list() for sv_type in SVTYPES + ["reads"]}
+        for task in tasks:
+            cutesv.single_pipe(bam_path, SV_size, min_mapq, max_split_parts, min_read_len, temp_dir, "b0", task,
+                               min_siglength, merge_del, merge_ins, MaxSize, None)
+            for sv_type, sigs in reference_window(cutesv.samfile, task, min_mapq).items():
+                expected[sv_type] += sigs
+    finally:
+        cutesv.cleanup()
+    for sv_type in SVTYPES + ["reads"]:
+        found = list()
+        for path in glob.glob("%ssignatures/b0/*%s.cols" % (temp_dir, sv_type)):
+            for segment in read_segments(path):
+                found += decode(segment)
+        assert found == expected[sv_type], sv_type
@@ -0,0 +1,66 @@
+import os
+import random
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cuteSV.cuteSV_columns import encode, pack
+from cuteSV.cuteSV_readnames import update_read_names
+from cuteSV.cuteSV_store import load_sigs, update_store
+
+BATCHES = 12
+
+
+def random_sigs(rng, sv_type, count):
+    sigs = list()
+    for i in range(count):
+        # few distinct values, so batches share signatures and sort keys tie
+        chrom = rng.choice(["chr1", "chr2"])
+        pos = rng.randrange(200)
+        length = rng.choice([50, 60, 70])
+        read = "read%d" % rng.randrange(30)
+        if sv_type == "INS":
+            seq = rng.choice(["ACGT", "ACGTN", "NNNN", "GATTACA"])
+            sigs.append((pos + rng.choice([0, 0, 0.5]), length, read, seq, "INS", chrom))
+        else:
+            sigs.append((pos, length, read, "DEL", chrom))
+    return sigs
+
+
+def write_batches(tmp_path, sv_type):
+    rng = random.Random(sv_type)
+    files = list()
+    for batch in range(BATCHES):
+        batch_dir = tmp_path / "signatures" / ("b%d" % batch)
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        path = batch_dir / ("100%s.cols" % sv_type)
+        with open(path, "ab") as f:
+            # a batch holds one segment per window, of very different sizes
+            for window in range(rng.randrange(1, 4)):
+                f.write(pack(encode(sv_type, random_sigs(rng, sv_type, rng.choice([5, 40, 300])))))
+        files.append(str(path))
+    return files
+
+
+def load_store(temp_dir, sv_type, index):
+    return {chrom: load_sigs(temp_dir, sv_type, chrom, {sv_type: index}) for chrom in index}
+
+
+def test_runs_match_one_sorted_write(tmp_path):
+    temp_dir = f"{tmp_path}/"
+    for sv_type in ("DEL", "INS"):
+        files = write_batches(tmp_path, sv_type)
+        # the same read IDs for both stores
+        update_read_names(temp_dir, files)
+        for batch in range(1, BATCHES + 1):
+            index, counts, digest = update_store(temp_dir, sv_type, files[:batch])
+        # runs of similar size were compacted
+        assert all(1 <= len(runs) < BATCHES for runs in index.values())
+        incremental = load_store(temp_dir, sv_type, index)
+
+        shutil.rmtree(f"{temp_dir}store/{sv_type}")
+        index, counts, digest = update_store(temp_dir, sv_type, files)
+        assert all(len(runs) == 1 for runs in index.values())
+        assert incremental == load_store(temp_dir, sv_type, index)
+        assert counts == {chrom: len(sigs) for chrom, sigs in incremental.items()}